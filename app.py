@@ -1,61 +1,122 @@
-import os
-from datetime import datetime, timedelta
 from flask import Flask, redirect, url_for
 from flask_login import current_user
-from backend.extensions import db, login_manager
+from werkzeug.middleware.proxy_fix import ProxyFix
+from backend.config import load_config
+from backend.extensions import db, login_manager, apply_sqlite_pragmas
+from backend.analytics import rollup_refresher
+from backend.archive import reservation_archiver
+from backend.assets import static_assets
+from backend.availability import availability_index
+from backend.events import slot_events
+from backend.expiry import expiry_scheduler
+from backend.facilities import facility_router
+from backend.intervals import interval_index
+from backend.metrics import request_metrics
+from backend.ratelimit import rate_limiter
+from backend.hashing import password_hasher
+from backend.tickets import ticket_codec, ticket_revocations
+from backend.utils import qr_cache
 
 
-def create_app(config_name='development'):
+def create_app(config_name=None):
     """Application factory pattern"""
     app = Flask(__name__)
     
-    # Configuration
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
-        'DATABASE_URL', 
-        'sqlite:///parking.db'
-    )
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
-    # Session configuration
-    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
-    app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', 'False') == 'True'
-    app.config['SESSION_COOKIE_HTTPONLY'] = True
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-    app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=7)
+    # Configuration: development / testing / production profile + env overrides
+    load_config(app, config_name)
+    
+    # Client address and scheme from the trusted proxies' X-Forwarded-* headers
+    hops = app.config['PROXY_FIX_HOPS']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
     
     # Initialize extensions with app
     db.init_app(app)
+    
+    # Timing hooks go first so every other before_request hook is measured
+    request_metrics.init_app(app)
+    
+    # Pick the request's facility (?facility= / X-Facility) before anything queries
+    facility_router.init_app(app)
+    
+    # Shed excess logins and reservation writes before any hook or view touches the DB
+    rate_limiter.init_app(app)
+    
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
+    qr_cache.init_app(app)
+    password_hasher.init_app(app)
+    slot_events.init_app(app)
+    
+    # Fingerprinted static files from `flask assets build` (asset_url in templates)
+    static_assets.init_app(app)
+    
+    # Signed QR tickets and the set of checked-out ones gates must refuse
+    ticket_codec.init_app(app)
+    ticket_revocations.init_app(app)
+    
+    # Load slot availability and booked windows into memory (lazily, on first use)
+    availability_index.init_app(app)
+    interval_index.init_app(app)
+    
+    # Optional background sweep of completed reservations into history
+    reservation_archiver.init_app(app)
+    
+    # Optional in-process release of overdue reservations (leader-elected)
+    expiry_scheduler.init_app(app)
     
     # Create app context for initialization
     with app.app_context():
-        # Import models
-        from backend.models import User, ParkingSlot, Reservation
+        # Connection tuning (WAL etc.) happens on connect, not here
+        for engine in db.engines.values():
+            apply_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+            request_metrics.instrument_engine(engine)
         
-        # Create tables
-        db.create_all()
+        # Fast start skips all DB I/O; run `flask db bootstrap` at deploy time instead
+        if app.config['DB_BOOTSTRAP_ON_START']:
+            from backend.migrations import bootstrap
+            bootstrap()
         
-        # Seed parking slots if empty
-        if ParkingSlot.query.count() == 0:
-            for i in range(1, 11):
-                slot = ParkingSlot(slot_number=f"A-{i:02d}")
-                db.session.add(slot)
-            db.session.commit()
+        # User loader for Flask-Login: session / cache first, DB on a miss
+        from backend.identity import identity_cache
+        identity_cache.init_app(app)
         
-        # User loader for Flask-Login
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            return identity_cache.load(int(user_id))
+    
+    # Occupancy rollups refreshed in the background (after bootstrap), never on a report request
+    rollup_refresher.init_app(app)
+    
+    # Cache and worker counters exported as gauges on /metrics
+    for name, component in (('availability', availability_index), ('intervals', interval_index),
+                            ('qr_cache', qr_cache), ('identity_cache', identity_cache),
+                            ('password_hasher', password_hasher), ('slot_events', slot_events),
+                            ('archiver', reservation_archiver), ('expiry', expiry_scheduler),
+                            ('analytics', rollup_refresher),
+                            ('tickets', ticket_revocations), ('facilities', facility_router),
+                            ('ratelimit', rate_limiter)):
+        request_metrics.register(name, component.stats)
     
     # Register blueprints
     from backend.auth import auth_bp
     from backend.routes import slots_bp, reservations_bp
+    from backend.api import api_bp
+    from backend.gate import gate_bp
     app.register_blueprint(auth_bp)
     app.register_blueprint(slots_bp)
     app.register_blueprint(reservations_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(gate_bp)
+    
+    # CLI commands
+    from backend.cli import db_cli, slots_cli, reservations_cli, analytics_cli, assets_cli
+    app.cli.add_command(db_cli)
+    app.cli.add_command(slots_cli)
+    app.cli.add_command(reservations_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(assets_cli)
     
     # Root route handler
     @app.route('/')
@@ -82,4 +143,4 @@ def create_app(config_name='development'):
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
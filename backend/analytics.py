@@ -0,0 +1,478 @@
+"""Occupancy analytics over reservation history, vectorized with NumPy"""
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import String, delete, insert, or_, select, type_coerce
+from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, FacilityLocal, use_facility
+from backend.leases import acquire_lease, make_holder_id
+from backend.models import OccupancyRollup, ParkingSlot, Reservation, ReservationHistory
+
+
+DEFAULT_CHUNK_SIZE = 50000
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Rollup zone keys besides the slot zones themselves
+ALL_ZONES = '*'
+UNZONED = ''
+
+
+# Reservation intervals as columns; times are int64 seconds from the window start
+IntervalChunk = namedtuple('IntervalChunk', ['slot_ids', 'starts', 'ends', 'completed'])
+
+# One rollup row (same fields as OccupancyRollup, minus computed_at)
+RollupRow = namedtuple('RollupRow', [
+    'day', 'zone', 'hour', 'capacity', 'occupied_seconds', 'peak_occupancy',
+    'arrivals', 'dwell_seconds', 'dwell_count'
+])
+
+
+def _as_datetime(day):
+    return datetime(day.year, day.month, day.day)
+
+
+def iter_interval_chunks(start, end, chunk_size=DEFAULT_CHUNK_SIZE, now=None):
+    """
+    Stream reservations overlapping [start, end) as columnar chunks
+    
+    Reads reservation_history and then the hot reservation table with
+    server-side batching, so memory stays bounded by chunk_size rows of
+    Python objects. Reservations that are still active end at `now`; booked
+    windows cover [start_at, end_at), cut short by an earlier checkout.
+    
+    Yields:
+        IntervalChunk of NumPy arrays; starts/ends are unclipped and may
+        fall outside the window
+    """
+    now = now or datetime.utcnow()
+    origin = np.datetime64(start, 's')
+    open_end = (np.datetime64(now, 's') - origin).astype(np.int64)
+    conn = db.session.connection()
+    # SQLite stores DATETIME as ISO text; NumPy parses that far faster than
+    # building datetime objects row by row
+    raw_text = conn.dialect.name == 'sqlite'
+    
+    def seconds(values):
+        times = np.array(values, dtype='datetime64[us]').astype('datetime64[s]')
+        return times, (times - origin).astype(np.int64)
+    
+    for model in (ReservationHistory, Reservation):
+        columns = [model.reserved_at, model.checked_out_at, model.start_at, model.end_at]
+        if raw_text:
+            columns = [type_coerce(column, String) for column in columns]
+        query = (
+            select(model.slot_id, *columns)
+            .where(model.reserved_at < end,
+                   or_(model.checked_out_at.is_(None), model.checked_out_at > start))
+            .execution_options(stream_results=True, max_row_buffer=chunk_size)
+        )
+        for rows in conn.execute(query).partitions(chunk_size):
+            slot_ids, reserved, checked_out, window_start, window_end = zip(*rows)
+            checked_out, checked_out_seconds = seconds(checked_out)
+            window_end, window_end_seconds = seconds(window_end)
+            left = ~np.isnat(checked_out)
+            windowed = ~np.isnat(window_end)
+            
+            # Immediate claims run until checkout (or now); booked windows run
+            # until their end unless checked out or cancelled earlier
+            ends = np.where(left, checked_out_seconds, open_end)
+            ends = np.where(windowed, np.where(left, np.minimum(ends, window_end_seconds), window_end_seconds), ends)
+            starts = np.where(windowed, seconds(window_start)[1], seconds(reserved)[1])
+            yield IntervalChunk(
+                np.array(slot_ids, dtype=np.int64),
+                starts,
+                ends,
+                left | (windowed & (window_end_seconds <= open_end)),
+            )
+
+
+def _zone_map():
+    """
+    Map slot ids to zone codes
+    
+    Returns:
+        (zone code per slot id, -1 for unknown ids; zone names; slots per zone)
+    """
+    rows = db.session.execute(select(ParkingSlot.id, ParkingSlot.zone)).all()
+    names = sorted({zone or UNZONED for _, zone in rows})
+    codes = {name: i for i, name in enumerate(names)}
+    by_slot = np.full(max((row[0] for row in rows), default=0) + 1, -1, dtype=np.int64)
+    capacity = np.zeros(len(names), dtype=np.int64)
+    for slot_id, zone in rows:
+        code = codes[zone or UNZONED]
+        by_slot[slot_id] = code
+        capacity[code] += 1
+    return by_slot, names, capacity
+
+
+def _split_hours(starts, ends):
+    """
+    Cut [start, end) intervals at hour boundaries
+    
+    Returns:
+        (interval index, hour bin, seconds in that bin) for every piece
+    """
+    first = starts // HOUR
+    counts = (ends - 1) // HOUR - first + 1
+    index = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    bins = first[index] + offsets
+    seconds = np.minimum(ends[index], (bins + 1) * HOUR) - np.maximum(starts[index], bins * HOUR)
+    return index, bins, seconds
+
+
+def _hourly_peaks(starts, ends, n_hours):
+    """
+    Peak concurrent reservations per hour bin by sweep line
+    
+    Each interval is a +1 event at its start and a -1 event at its end; the
+    running sum over the time-sorted events is the occupancy curve.
+    """
+    peaks = np.zeros(n_hours, dtype=np.int64)
+    if not len(starts):
+        return peaks
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones(len(starts), np.int64), -np.ones(len(ends), np.int64)])
+    # Ends sort before starts at the same instant: back-to-back bookings never overlap
+    order = np.lexsort((deltas, times))
+    times = times[order]
+    levels = np.cumsum(deltas[order])
+    
+    inside = times < n_hours * HOUR
+    np.maximum.at(peaks, times[inside] // HOUR, levels[inside])
+    
+    # Occupancy carried into each hour from events before it
+    before = np.searchsorted(times, np.arange(n_hours) * HOUR, side='left') - 1
+    carried = np.where(before >= 0, levels[np.maximum(before, 0)], 0)
+    return np.maximum(peaks, carried)
+
+
+def compute_rollups(start_day, end_day, chunk_size=DEFAULT_CHUNK_SIZE, now=None):
+    """
+    Compute hourly rollups for the days in [start_day, end_day)
+    
+    Occupied seconds, arrivals and dwell totals are accumulated per chunk
+    with bincount; peaks need the whole event set, so clipped intervals are
+    kept (three int64 columns) for the final sweep.
+    
+    Returns:
+        List of RollupRow, one per (day, zone, hour) including the ALL_ZONES rows
+    """
+    start, end = _as_datetime(start_day), _as_datetime(end_day)
+    n_hours = (end_day - start_day).days * 24
+    span = n_hours * HOUR
+    by_slot, names, capacity = _zone_map()
+    n_zones = len(names)
+    size = n_zones * n_hours
+    
+    occupied = np.zeros(size)
+    arrivals = np.zeros(size, dtype=np.int64)
+    dwell_seconds = np.zeros(size)
+    dwell_count = np.zeros(size, dtype=np.int64)
+    kept_zones, kept_starts, kept_ends = [], [], []
+    
+    for chunk in iter_interval_chunks(start, end, chunk_size, now):
+        known = chunk.slot_ids < len(by_slot)
+        zones = np.full(len(chunk.slot_ids), -1, dtype=np.int64)
+        zones[known] = by_slot[chunk.slot_ids[known]]
+        starts = np.clip(chunk.starts, 0, span)
+        ends = np.clip(chunk.ends, 0, span)
+        valid = (zones >= 0) & (ends > starts)
+        zones, starts, ends = zones[valid], starts[valid], ends[valid]
+        raw_starts, raw_ends, completed = chunk.starts[valid], chunk.ends[valid], chunk.completed[valid]
+        
+        index, bins, seconds = _split_hours(starts, ends)
+        occupied += np.bincount(zones[index] * n_hours + bins, weights=seconds, minlength=size)
+        
+        # Arrivals and dwell are attributed to the hour the booking started
+        arrived = raw_starts == starts
+        keys = zones[arrived] * n_hours + starts[arrived] // HOUR
+        arrivals += np.bincount(keys, minlength=size)
+        finished = completed[arrived]
+        dwell = (raw_ends - raw_starts)[arrived]
+        dwell_seconds += np.bincount(keys[finished], weights=dwell[finished], minlength=size)
+        dwell_count += np.bincount(keys[finished], minlength=size)
+        
+        kept_zones.append(zones)
+        kept_starts.append(starts)
+        kept_ends.append(ends)
+    
+    zones = np.concatenate(kept_zones) if kept_zones else np.zeros(0, np.int64)
+    starts = np.concatenate(kept_starts) if kept_starts else np.zeros(0, np.int64)
+    ends = np.concatenate(kept_ends) if kept_ends else np.zeros(0, np.int64)
+    
+    # Per-zone matrices plus a whole-facility row at the end
+    shape = (n_zones, n_hours)
+    occupied, arrivals = occupied.reshape(shape), arrivals.reshape(shape)
+    dwell_seconds, dwell_count = dwell_seconds.reshape(shape), dwell_count.reshape(shape)
+    peaks = np.stack([_hourly_peaks(starts[zones == z], ends[zones == z], n_hours) for z in range(n_zones)]
+                     + [_hourly_peaks(starts, ends, n_hours)])
+    
+    keys = names + [ALL_ZONES]
+    capacity = np.append(capacity, capacity.sum())
+    occupied = np.vstack([occupied, occupied.sum(axis=0)])
+    arrivals = np.vstack([arrivals, arrivals.sum(axis=0)])
+    dwell_seconds = np.vstack([dwell_seconds, dwell_seconds.sum(axis=0)])
+    dwell_count = np.vstack([dwell_count, dwell_count.sum(axis=0)])
+    
+    rows = []
+    for z, zone in enumerate(keys):
+        for h in range(n_hours):
+            rows.append(RollupRow(
+                start_day + timedelta(days=h // 24), zone, h % 24, int(capacity[z]),
+                float(occupied[z, h]), int(peaks[z, h]), int(arrivals[z, h]),
+                float(dwell_seconds[z, h]), int(dwell_count[z, h])
+            ))
+    return rows
+
+
+def _missing_runs(days):
+    """Group sorted dates into [start, end) runs of consecutive days"""
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] == day:
+            runs[-1][1] = day + timedelta(days=1)
+        else:
+            runs.append([day, day + timedelta(days=1)])
+    return runs
+
+
+def refresh_rollups(start_day, end_day, force=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fill the occupancy_rollup table for the days in [start_day, end_day)
+    
+    Days after today are left out. Without force, a day is skipped once it
+    was computed after it ended; today (and a day last computed while it
+    was still today) is recomputed on every call. Consecutive days are
+    computed in one pass over the intervals.
+    
+    Returns:
+        Number of days (re)computed
+    """
+    now = datetime.utcnow()
+    end_day = min(end_day, now.date() + timedelta(days=1))
+    if start_day >= end_day:
+        return 0
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days)]
+    if not force:
+        computed = db.session.execute(
+            select(OccupancyRollup.day, OccupancyRollup.computed_at)
+            .where(OccupancyRollup.zone == ALL_ZONES, OccupancyRollup.hour == 0,
+                   OccupancyRollup.day >= start_day, OccupancyRollup.day < end_day)
+        ).all()
+        final = {day for day, at in computed if at >= _as_datetime(day + timedelta(days=1))}
+        days = [day for day in days if day not in final]
+    
+    for run_start, run_end in _missing_runs(days):
+        rows = compute_rollups(run_start, run_end, chunk_size, now)
+        db.session.execute(
+            delete(OccupancyRollup)
+            .where(OccupancyRollup.day >= run_start, OccupancyRollup.day < run_end)
+        )
+        db.session.execute(insert(OccupancyRollup), [dict(row._asdict(), computed_at=now) for row in rows])
+        db.session.commit()
+    return len(days)
+
+
+def load_rollups(start_day, end_day, zone=None):
+    """
+    Stored rollup rows for [start_day, end_day)
+    
+    Nothing is computed here: days the refresher has not reached yet are
+    simply missing, and today is as of the last refresh.
+    """
+    query = (
+        select(*(getattr(OccupancyRollup, field) for field in RollupRow._fields))
+        .where(OccupancyRollup.day >= start_day, OccupancyRollup.day < end_day)
+        .order_by(OccupancyRollup.day, OccupancyRollup.zone, OccupancyRollup.hour)
+    )
+    if zone is not None:
+        query = query.where(OccupancyRollup.zone == zone)
+    return [RollupRow(*row) for row in db.session.execute(query)]
+
+
+def _summarize(rows):
+    """Fold rollup rows into utilization / peak / dwell figures"""
+    capacity_seconds = sum(row.capacity for row in rows) * HOUR
+    occupied = sum(row.occupied_seconds for row in rows)
+    dwell_count = sum(row.dwell_count for row in rows)
+    return {
+        'utilization': round(occupied / capacity_seconds, 4) if capacity_seconds else 0.0,
+        'occupied_hours': round(occupied / HOUR, 2),
+        'peak_occupancy': max((row.peak_occupancy for row in rows), default=0),
+        'arrivals': sum(row.arrivals for row in rows),
+        'avg_dwell_minutes': round(sum(row.dwell_seconds for row in rows) / dwell_count / 60, 1)
+                             if dwell_count else None,
+    }
+
+
+def occupancy_report(start_day, end_day, zone=None, granularity='day'):
+    """
+    Utilization, peak occupancy and dwell time per zone
+    
+    Args:
+        start_day, end_day: Date range [start_day, end_day)
+        zone: Limit to one zone ('' = unzoned, '*' = whole facility)
+        granularity: 'day', 'hour' (per day and hour) or 'hour_of_day'
+                     (the 24-hour profile across the whole range)
+    
+    Returns:
+        Dict with per-zone totals and the requested series
+    """
+    if granularity not in ('day', 'hour', 'hour_of_day'):
+        raise ValueError(f'Unknown granularity {granularity!r}')
+    rows = load_rollups(start_day, end_day, zone)
+    
+    by_zone, series = {}, {}
+    for row in rows:
+        by_zone.setdefault(row.zone, []).append(row)
+        if granularity == 'day':
+            key = (row.zone, row.day.isoformat())
+        elif granularity == 'hour':
+            key = (row.zone, row.day.isoformat(), row.hour)
+        else:
+            key = (row.zone, row.hour)
+        series.setdefault(key, []).append(row)
+    
+    fields = {'day': ('zone', 'day'), 'hour': ('zone', 'day', 'hour'),
+              'hour_of_day': ('zone', 'hour')}[granularity]
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'granularity': granularity,
+        'zones': {name: _summarize(zone_rows) for name, zone_rows in by_zone.items()},
+        'series': [dict(zip(fields, key), **_summarize(key_rows)) for key, key_rows in series.items()],
+    }
+
+
+def slot_utilization(start_day, end_day, limit=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fraction of [start_day, end_day) each slot spent reserved, busiest first
+    
+    Computed straight from the interval stream (not cached).
+    
+    Returns:
+        List of (slot_number, utilization) tuples
+    """
+    start, end = _as_datetime(start_day), _as_datetime(end_day)
+    span = int((end - start).total_seconds())
+    slots = db.session.execute(select(ParkingSlot.id, ParkingSlot.slot_number)).all()
+    if not slots or span <= 0:
+        return []
+    size = max(slot_id for slot_id, _ in slots) + 1
+    busy = np.zeros(size)
+    for chunk in iter_interval_chunks(start, end, chunk_size):
+        seconds = np.clip(chunk.ends, 0, span) - np.clip(chunk.starts, 0, span)
+        known = (chunk.slot_ids < size) & (seconds > 0)
+        busy += np.bincount(chunk.slot_ids[known], weights=seconds[known], minlength=size)
+    
+    ids = np.array([slot_id for slot_id, _ in slots])
+    numbers = dict(slots)
+    ranked = ids[np.argsort(-busy[ids], kind='stable')]
+    if limit:
+        ranked = ranked[:limit]
+    return [(numbers[int(slot_id)], round(float(busy[slot_id]) / span, 4)) for slot_id in ranked]
+
+
+class RollupRefresher:
+    """
+    Keeps occupancy_rollup current so reports only ever read stored rows
+    
+    Every ANALYTICS_REFRESH_INTERVAL seconds (0 = only via `flask analytics
+    rollup`, which deployments also run once to fill the table before the
+    first pass) the thread fills in missing days of the last
+    ANALYTICS_MAX_DAYS and recomputes today. One process per facility does
+    the scheduled work (lease row); within a process the lock lets one
+    recompute run at a time, and a refresh that finds another in progress
+    is skipped.
+    """
+    
+    LEASE_NAME = 'analytics-rollup'
+    
+    def __init__(self):
+        self.facility = DEFAULT_FACILITY
+        self.interval = 0
+        self.days = 366
+        self.holder = make_holder_id()
+        self.runs = 0
+        self.skipped = 0
+        self.computed = 0
+        self.last_seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def init_app(self, app):
+        self.interval = app.config.get('ANALYTICS_REFRESH_INTERVAL', 0)
+        self.days = app.config.get('ANALYTICS_MAX_DAYS', self.days)
+        if self.interval and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(app,),
+                                            name=f'rollup-refresher-{self.facility}', daemon=True)
+            self._thread.start()
+    
+    def refresh(self, start_day=None, end_day=None, force=False):
+        """
+        refresh_rollups unless a refresh is already running in this process
+        
+        Args:
+            start_day, end_day: Date range [start_day, end_day); default the
+                                last ANALYTICS_MAX_DAYS days up to and including today
+        
+        Returns:
+            Number of days (re)computed, or None if skipped
+        """
+        if not self._lock.acquire(blocking=False):
+            self.skipped += 1
+            return None
+        try:
+            end_day = end_day or datetime.utcnow().date() + timedelta(days=1)
+            start_day = start_day or end_day - timedelta(days=self.days)
+            started = time.perf_counter()
+            computed = refresh_rollups(start_day, end_day, force=force)
+            self.last_seconds = time.perf_counter() - started
+            self.computed += computed
+            self.runs += 1
+            return computed
+        finally:
+            self._lock.release()
+    
+    def _run(self, app):
+        while not self._stop.wait(self.interval):
+            with app.app_context(), use_facility(self.facility):
+                try:
+                    if acquire_lease(self.LEASE_NAME, self.holder, self.interval * 2):
+                        self.refresh()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Rollup refresh error: {str(e)}')
+                finally:
+                    db.session.remove()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'computed_days': self.computed,
+            'last_seconds': round(self.last_seconds, 3),
+        }
+
+
+rollup_refresher = FacilityLocal(RollupRefresher)
+
+
+def parse_day(value, default=None):
+    """YYYY-MM-DD -> date (ValueError on bad input)"""
+    if not value:
+        return default
+    return date.fromisoformat(value)
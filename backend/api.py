@@ -0,0 +1,269 @@
+"""Versioned JSON API for the mobile clients"""
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, jsonify, request, current_app
+from flask_login import current_user
+from backend.events import slot_events
+from backend.extensions import db
+from backend.models import MAX_ID, Reservation
+from backend.queries import (
+    SlotFilter, get_slot_page, get_slot_totals, get_free_slots_between,
+    get_reservation_row, get_user_reservations_everywhere, parse_slot_cursor
+)
+from backend.reservation_service import (
+    reserve_slot, reserve_any_slot, reserve_window, checkout, validate_window,
+    SlotNotFoundError, SlotUnavailableError, ReservationContentionError, ReservationClosedError,
+    InvalidWindowError
+)
+from backend.tickets import issue_ticket
+from backend.utils import qr_cache, parse_timestamp
+
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@api_bp.before_request
+def require_login():
+    """API clients get a 401 instead of the HTML login redirect"""
+    if not current_user.is_authenticated:
+        return _error('Authentication required', 401)
+
+
+def _error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+def _conditional(payload, status=200):
+    """JSON response with an ETag, answered with 304 when the client is current"""
+    response = jsonify(payload)
+    response.status_code = status
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def _slot_filter(available_only=False):
+    return SlotFilter(
+        zone=request.args.get('zone') or None,
+        level=request.args.get('level') or None,
+        prefix=request.args.get('prefix') or None,
+        available_only=available_only or request.args.get('available') == '1'
+    )
+
+
+def _serialize_reservation(row, include_image=False):
+    """Build the reservation document from a ReservationRow tuple"""
+    data = {
+        'id': row.id,
+        'slot_id': row.slot_id,
+        'slot_number': row.slot_number,
+        'reserved_at': row.reserved_at.isoformat(),
+        'qr_payload': row.qr_code_data,
+        'status': row.status,
+        'start_at': row.start_at.isoformat() if row.start_at else None,
+        'end_at': row.end_at.isoformat() if row.end_at else None,
+        'facility': row.facility,
+    }
+    if include_image and row.qr_code_data:
+        data['qr_image'] = qr_cache.get_or_render(row.qr_code_data)
+    return data
+
+
+# ==================== SLOTS ====================
+
+@api_bp.route('/slots')
+def list_slots():
+    """One keyset page of slots (?after, ?limit, ?zone, ?level, ?prefix, ?available=1)"""
+    limit = request.args.get('limit', current_app.config['SLOTS_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['SLOTS_MAX_PAGE_SIZE']))
+    try:
+        after = parse_slot_cursor(request.args.get('after'))
+    except ValueError as e:
+        return _error(str(e), 400)
+    page = get_slot_page(current_user.id, _slot_filter(), after=after, limit=limit)
+    return _conditional({
+        'slots': [slot._asdict() for slot in page.slots],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@api_bp.route('/slots/availability')
+def availability():
+    """Total / available / reserved counts"""
+    return _conditional(get_slot_totals(_slot_filter())._asdict())
+
+
+@api_bp.route('/slots/free')
+def free_slots():
+    """Slots with nothing booked between ?start and ?end (ISO 8601; ?zone, ?level, ?prefix, ?limit)"""
+    try:
+        start, end = validate_window(parse_timestamp(request.args.get('start')),
+                                     parse_timestamp(request.args.get('end')))
+    except (ValueError, InvalidWindowError) as e:
+        return _error(str(e), 400)
+    limit = request.args.get('limit', current_app.config['SLOTS_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['SLOTS_MAX_PAGE_SIZE']))
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slots': get_free_slots_between(_slot_filter(), start, end, limit),
+    })
+
+
+@api_bp.route('/slots/events')
+def slot_event_stream():
+    """
+    Server-Sent Events stream of slot availability changes
+    
+    Reconnecting clients resume from the Last-Event-ID header (or ?since=N),
+    on any worker; a `reset` event means they missed too much and should
+    refetch /slots. A worker already holding SLOT_EVENTS_MAX_SUBSCRIBERS
+    streams answers 503. EventSource does not retry after that, so the
+    slots page polls /slots instead.
+    """
+    if slot_events.is_full:
+        response = _error('Too many live streams on this worker', 503)
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    last_seq = request.headers.get('Last-Event-ID', type=int)
+    if last_seq is None:
+        last_seq = request.args.get('since', type=int)
+    
+    response = Response(slot_events.stream(last_seq), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ==================== RESERVATIONS ====================
+
+@api_bp.route('/reservations', methods=['GET'])
+def my_reservations():
+    """
+    The current user's reservations in every facility, newest first
+    
+    ?before=<next_cursor>&limit=N; the cursor is the last id with a single
+    facility and an opaque string with several.
+    """
+    limit = request.args.get('limit', current_app.config['RESERVATIONS_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['RESERVATIONS_MAX_PAGE_SIZE']))
+    page = get_user_reservations_everywhere(current_user.id, cursor=request.args.get('before'), limit=limit)
+    return _conditional({
+        'reservations': [_serialize_reservation(row) for row in page.rows],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@api_bp.route('/reservations', methods=['POST'])
+def create_reservation():
+    """Reserve a slot: {"slot_id": N}, {"any": true}, or a window {"slot_id": N, "start_at": ISO, "end_at": ISO}"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return _error('Request body must be a JSON object', 400)
+    slot_id = data.get('slot_id')
+    reserve_any = bool(data.get('any'))
+    
+    # bool is an int subclass: reject true/false rather than booking slot 1/0
+    valid_id = isinstance(slot_id, int) and not isinstance(slot_id, bool) and 0 < slot_id <= MAX_ID
+    if not reserve_any and not valid_id:
+        return _error('slot_id must be a positive integer, or pass "any": true', 400)
+    try:
+        start_at = parse_timestamp(data.get('start_at'))
+        end_at = parse_timestamp(data.get('end_at'))
+    except ValueError:
+        return _error('start_at and end_at must be ISO 8601 timestamps', 400)
+    
+    try:
+        if reserve_any:
+            reservation = reserve_any_slot(current_user.id)
+        elif start_at or end_at:
+            reservation = reserve_window(slot_id, current_user.id, start_at, end_at)
+        else:
+            reservation = reserve_slot(slot_id, current_user.id)
+        
+        reservation.qr_code_data = issue_ticket(reservation)
+        db.session.commit()
+    except InvalidWindowError as e:
+        return _error(str(e), 400)
+    except SlotNotFoundError:
+        return _error('Slot not found', 404)
+    except SlotUnavailableError as e:
+        return _error(str(e), 409)
+    except ReservationContentionError:
+        return _error('The system is busy. Please try again.', 503)
+    
+    row = get_reservation_row(reservation.id)
+    return jsonify(_serialize_reservation(row)), 201
+
+
+@api_bp.route('/reservations/<int:reservation_id>')
+def view_reservation(reservation_id):
+    """One reservation; ?qr=png also returns the rendered QR image"""
+    row = get_reservation_row(reservation_id) if reservation_id <= MAX_ID else None
+    if row is None or row.user_id != current_user.id:
+        return _error('Reservation not found', 404)
+    return _conditional(_serialize_reservation(row, include_image=request.args.get('qr') == 'png'))
+
+
+@api_bp.route('/reservations/<int:reservation_id>/checkout', methods=['POST'])
+def checkout_reservation(reservation_id):
+    """Check out a reservation and release its slot"""
+    reservation = db.session.get(Reservation, reservation_id) if reservation_id <= MAX_ID else None
+    if reservation is None or reservation.user_id != current_user.id:
+        return _error('Reservation not found', 404)
+    
+    slot_id = reservation.slot_id
+    qr_payload = reservation.qr_code_data
+    try:
+        checkout(reservation)
+    except ReservationClosedError as e:
+        return _error(str(e), 409)
+    qr_cache.invalidate(qr_payload)
+    return jsonify({'id': reservation_id, 'slot_id': slot_id, 'checked_out': True})
+
+
+# ==================== ANALYTICS ====================
+
+def _report_range():
+    """?start/?end as dates; defaults to the last 7 days including today"""
+    from backend.analytics import parse_day
+    today = datetime.utcnow().date()
+    end = parse_day(request.args.get('end'), today + timedelta(days=1))
+    start = parse_day(request.args.get('start'), end - timedelta(days=7))
+    if start >= end:
+        raise ValueError('start must be before end')
+    if (end - start).days > current_app.config['ANALYTICS_MAX_DAYS']:
+        raise ValueError(f'Range is limited to {current_app.config["ANALYTICS_MAX_DAYS"]} days')
+    return start, end
+
+
+@api_bp.route('/analytics/occupancy')
+def occupancy():
+    """Utilization, peak occupancy and dwell time (?start, ?end, ?zone, ?granularity=day|hour|hour_of_day)"""
+    from backend.analytics import occupancy_report
+    try:
+        start, end = _report_range()
+        report = occupancy_report(start, end, zone=request.args.get('zone'),
+                                  granularity=request.args.get('granularity', 'day'))
+    except ValueError as e:
+        return _error(str(e), 400)
+    return _conditional(report)
+
+
+@api_bp.route('/analytics/slots')
+def slot_usage():
+    """Per-slot utilization over the range, busiest first (?start, ?end, ?limit)"""
+    from backend.analytics import slot_utilization
+    try:
+        start, end = _report_range()
+    except ValueError as e:
+        return _error(str(e), 400)
+    limit = max(1, min(request.args.get('limit', 100, type=int), current_app.config['SLOTS_MAX_PAGE_SIZE']))
+    return _conditional({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slots': [{'slot_number': number, 'utilization': value}
+                  for number, value in slot_utilization(start, end, limit)],
+    })
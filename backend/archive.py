@@ -0,0 +1,150 @@
+"""Move completed reservations from the hot table into reservation_history"""
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, FacilityLocal, use_facility
+from backend.models import Reservation, ReservationHistory, CLOSED_STATUSES
+
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_batch(batch_size=DEFAULT_BATCH_SIZE, cutoff=None):
+    """
+    Copy one batch of completed reservations to history and delete them
+    
+    Rows are taken oldest checkout first (ix_reservation_status_checked_out)
+    and the copy and delete commit together, so a row is never in both
+    tables or in neither.
+    
+    Args:
+        batch_size: Maximum rows moved by this call
+        cutoff: Only rows checked out before this datetime (default: all)
+    
+    Returns:
+        Number of rows archived
+    """
+    query = (
+        select(Reservation.id)
+        .where(Reservation.status.in_(CLOSED_STATUSES))
+        .order_by(Reservation.checked_out_at, Reservation.id)
+        .limit(batch_size)
+    )
+    if cutoff is not None:
+        query = query.where(Reservation.checked_out_at < cutoff)
+    ids = db.session.execute(query).scalars().all()
+    if not ids:
+        return 0
+    
+    now = datetime.utcnow()
+    db.session.execute(
+        insert(ReservationHistory).from_select(
+            ['id', 'user_id', 'slot_id', 'reserved_at', 'checked_out_at', 'start_at', 'end_at',
+             'status', 'archived_at', 'facility'],
+            select(Reservation.id, Reservation.user_id, Reservation.slot_id,
+                   db.func.coalesce(Reservation.reserved_at, Reservation.checked_out_at),
+                   db.func.coalesce(Reservation.checked_out_at, now),
+                   Reservation.start_at, Reservation.end_at,
+                   Reservation.status, literal(now), Reservation.facility)
+            .where(Reservation.id.in_(ids))
+        )
+    )
+    db.session.execute(
+        delete(Reservation)
+        .where(Reservation.id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(ids)
+
+
+def archive_completed(batch_size=DEFAULT_BATCH_SIZE, older_than=None, max_batches=None):
+    """
+    Archive completed reservations in batches until none are left
+    
+    Each batch is its own short transaction so reservation writes are never
+    blocked behind one large sweep.
+    
+    Args:
+        batch_size: Rows per batch/commit
+        older_than: timedelta; keep rows checked out more recently than this
+        max_batches: Stop after this many batches (default: no limit)
+    
+    Returns:
+        Total number of rows archived
+    """
+    cutoff = datetime.utcnow() - older_than if older_than else None
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        try:
+            moved = archive_batch(batch_size, cutoff)
+        except IntegrityError as e:
+            # A row already in history means another sweeper got there first
+            db.session.rollback()
+            current_app.logger.error(f'Archive batch failed: {str(e)}')
+            break
+        if not moved:
+            break
+        total += moved
+        batches += 1
+    return total
+
+
+class ReservationArchiver:
+    """
+    Background thread that runs archive_completed every ARCHIVE_INTERVAL seconds
+    
+    Off by default (interval 0); deployments can run `flask reservations
+    archive` from cron instead.
+    """
+    
+    def __init__(self):
+        self.facility = DEFAULT_FACILITY
+        self.interval = 0
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.older_than = None
+        self.archived = 0
+        self.runs = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def init_app(self, app):
+        self.interval = app.config.get('ARCHIVE_INTERVAL', 0)
+        self.batch_size = app.config.get('ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.older_than = timedelta(seconds=app.config.get('ARCHIVE_AFTER', 0)) or None
+        if self.interval and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(app,),
+                                            name=f'reservation-archiver-{self.facility}', daemon=True)
+            self._thread.start()
+    
+    def _run(self, app):
+        while not self._stop.wait(self.interval):
+            with app.app_context(), use_facility(self.facility):
+                try:
+                    self.archived += archive_completed(self.batch_size, self.older_than)
+                    self.runs += 1
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Archive sweep error: {str(e)}')
+                finally:
+                    db.session.remove()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'archived': self.archived,
+        }
+
+
+reservation_archiver = FacilityLocal(ReservationArchiver)
@@ -0,0 +1,160 @@
+"""Fingerprinted, precompressed static assets with long-lived caching"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always built
+    brotli = None
+
+
+# Built assets live in <static>/dist and are served from /assets/<hashed name>
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.ico')
+
+# Smaller files are not worth a compressed variant
+MIN_COMPRESS_SIZE = 256
+
+# Hex digits of the content hash put in file names
+HASH_LENGTH = 12
+
+ONE_YEAR = 365 * 24 * 3600
+
+# Content-Encoding -> suffix of the precompressed variant, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _hashed_name(name, data):
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def build_assets(static_folder, clean=False):
+    """
+    Fingerprint every file under static_folder into <static>/dist
+    
+    Each file is copied to name.<hash>.ext with .gz (and .br when brotli is
+    installed) variants next to it, and manifest.json maps the logical name
+    to the hashed one. Builds are reproducible (gzip mtime is zeroed), and
+    files from earlier builds are kept unless clean is set, so workers still
+    running the previous manifest can serve their URLs during a rolling deploy.
+    
+    Returns:
+        The manifest dict: {logical name: {'file', 'size', 'encodings': {encoding: size}}}
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if clean and os.path.isdir(dist):
+        for root, _, files in os.walk(dist):
+            for name in files:
+                os.remove(os.path.join(root, name))
+    os.makedirs(dist, exist_ok=True)
+    
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder):
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        dirs.sort()
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            hashed = _hashed_name(logical, data)
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write_atomic(target, data)
+            
+            encodings = {}
+            if logical.lower().endswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_SIZE:
+                variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variants['br'] = brotli.compress(data, quality=11)
+                for encoding, suffix in ENCODINGS:
+                    compressed = variants.get(encoding)
+                    if compressed is not None and len(compressed) < len(data):
+                        _write_atomic(target + suffix, compressed)
+                        encodings[encoding] = len(compressed)
+            manifest[logical] = {'file': hashed, 'size': len(data), 'encodings': encodings}
+    
+    _write_atomic(os.path.join(dist, MANIFEST_NAME),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class StaticAssets:
+    """
+    Manifest lookup for templates plus the /assets route
+    
+    asset_url('style.css') returns /assets/style.<hash>.css when a build
+    exists, else the plain /static URL (so development works without a
+    build). Hashed files never change, so they are served with a one-year
+    immutable Cache-Control and the best precompressed variant the client
+    accepts; repeat visits do not even revalidate.
+    """
+    
+    def __init__(self):
+        self.dist = None
+        self._urls = {}
+        self._files = {}
+    
+    def init_app(self, app):
+        """Load <static>/dist/manifest.json if present and register asset_url and /assets"""
+        self.dist = os.path.join(app.static_folder, DIST_DIR)
+        self.load()
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+    
+    def load(self):
+        """Read the manifest; without one every asset falls back to /static"""
+        try:
+            with open(os.path.join(self.dist, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        self._urls = {logical: entry['file'] for logical, entry in manifest.items()}
+        self._files = {
+            entry['file']: (mimetypes.guess_type(logical)[0] or 'application/octet-stream',
+                            tuple(encoding for encoding, _ in ENCODINGS if encoding in entry['encodings']))
+            for logical, entry in manifest.items()
+        }
+    
+    def asset_url(self, filename):
+        hashed = self._urls.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=hashed)
+    
+    def serve(self, filename):
+        entry = self._files.get(filename)
+        if entry is None:
+            abort(404)
+        mimetype, encodings = entry
+        accepted = request.accept_encodings
+        path = os.path.join(self.dist, filename)
+        encoding = next((e for e in encodings if accepted[e]), None)
+        if encoding is not None:
+            path += dict(ENCODINGS)[encoding]
+        
+        response = send_file(path, mimetype=mimetype, max_age=ONE_YEAR, conditional=True)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+static_assets = StaticAssets()
@@ -1,7 +1,10 @@
+from concurrent.futures import TimeoutError as HashingTimeoutError
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_user, logout_user, current_user, login_required
 from sqlalchemy.exc import IntegrityError
 from backend.extensions import db
+from backend.hashing import HashingBusyError
+from backend.identity import remember_identity, forget_identity
 from backend.models import User
 from backend.utils import validate_email, validate_password
 
@@ -56,6 +59,10 @@ def register():
             db.session.rollback()
             flash('Email already registered. Please log in.', 'error')
             return redirect(url_for('auth.login'))
+        except (HashingBusyError, HashingTimeoutError):
+            db.session.rollback()
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return redirect(url_for('auth.register'))
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f'Registration error: {str(e)}')
@@ -78,8 +85,24 @@ def login():
         # Find user by email
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        try:
+            authenticated = user is not None and user.check_password(password)
+        except (HashingBusyError, HashingTimeoutError):
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        
+        if authenticated:
+            # Upgrade hashes made with older algorithm/cost settings
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.warning(f'Password rehash failed: {str(e)}')
+            
             login_user(user)
+            remember_identity(user)
             flash(f'Welcome, {user.email}!', 'success')
             next_page = request.args.get('next')
             if next_page and next_page.startswith('/'):
@@ -95,6 +118,7 @@ def login():
 @login_required
 def logout():
     """User logout - requires login"""
+    forget_identity(current_user.id)
     logout_user()
     flash('You have been logged out.', 'success')
     return redirect(url_for('auth.index'))
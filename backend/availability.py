@@ -0,0 +1,165 @@
+"""In-memory slot availability index with write-through from the reservation paths"""
+import threading
+import time
+from flask import request
+from sqlalchemy import select
+from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, FacilityLocal, current_facility
+from backend.models import ParkingSlot
+
+
+# Per-slot states, one byte per slot id
+NO_SLOT = 0
+FREE = 1
+RESERVED = 2
+
+_FREE_BYTE = bytes([FREE])
+
+
+class AvailabilityIndex:
+    """
+    Availability bitmap keyed by slot id
+    
+    Answers "is slot X free", "how many are free" and "first N free" without
+    touching the database. The reservation service writes through to it on
+    every claim and checkout; the database stays authoritative, and a periodic
+    reconcile pass repairs drift caused by other workers or manual edits.
+    """
+    
+    def __init__(self):
+        self.facility = DEFAULT_FACILITY
+        self._states = bytearray()
+        self._free = 0
+        self._total = 0
+        self._lock = threading.Lock()
+        self.reconcile_interval = 30
+        self.last_reconciled = None
+        self.repairs = 0
+    
+    def init_app(self, app):
+        """
+        Schedule loading and reconcile passes (AVAILABILITY_RECONCILE_INTERVAL)
+        
+        No database I/O happens here; the index is built on first use, by
+        the first request routed to this index's facility.
+        """
+        self.reconcile_interval = app.config.get('AVAILABILITY_RECONCILE_INTERVAL', self.reconcile_interval)
+        self._states = bytearray()
+        self._free = self._total = 0
+        self.last_reconciled = None
+        
+        @app.before_request
+        def _reconcile_availability():
+            if request.endpoint in ('static', 'assets') or current_facility() != self.facility:
+                return
+            if self.last_reconciled is None:
+                self.load()
+            elif self.reconcile_interval and self.is_stale():
+                self.reconcile()
+    
+    def _snapshot(self):
+        """Read (id, is_available) for every slot from the database"""
+        rows = db.session.execute(select(ParkingSlot.id, ParkingSlot.is_available)).all()
+        states = bytearray(max((row[0] for row in rows), default=0) + 1)
+        for slot_id, is_available in rows:
+            states[slot_id] = FREE if is_available else RESERVED
+        return states
+    
+    def load(self):
+        """Rebuild the index from the database"""
+        states = self._snapshot()
+        with self._lock:
+            self._states = states
+            self._free = states.count(FREE)
+            self._total = len(states) - states.count(NO_SLOT)
+            self.last_reconciled = time.monotonic()
+    
+    def _ensure_loaded(self):
+        if self.last_reconciled is None:
+            self.load()
+    
+    def is_stale(self):
+        return (self.last_reconciled is None or
+                time.monotonic() - self.last_reconciled >= self.reconcile_interval)
+    
+    def reconcile(self):
+        """
+        Compare the index against the database and repair any drift
+        
+        Returns:
+            Number of slot entries that had to be corrected
+        """
+        states = self._snapshot()
+        with self._lock:
+            size = max(len(states), len(self._states))
+            current = self._states + bytearray(size - len(self._states))
+            fresh = states + bytearray(size - len(states))
+            drift = sum(a != b for a, b in zip(current, fresh))
+            self._states = states
+            self._free = states.count(FREE)
+            self._total = len(states) - states.count(NO_SLOT)
+            self.last_reconciled = time.monotonic()
+            self.repairs += drift
+        return drift
+    
+    def _set(self, slot_id, state):
+        """
+        Update a loaded slot's state
+        
+        Ids the last load or reconcile did not see are ignored rather than
+        added: they may come straight from a client, and slots provisioned
+        since then are picked up by the next reconcile.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if slot_id < 0 or slot_id >= len(self._states):
+                return
+            previous = self._states[slot_id]
+            if previous == NO_SLOT or previous == state:
+                return
+            self._states[slot_id] = state
+            self._free += (state == FREE) - (previous == FREE)
+    
+    def mark_reserved(self, slot_id):
+        self._set(slot_id, RESERVED)
+    
+    def mark_free(self, slot_id):
+        self._set(slot_id, FREE)
+    
+    def is_free(self, slot_id):
+        """True/False for a known slot, None if the slot id is unknown"""
+        self._ensure_loaded()
+        if slot_id < 0 or slot_id >= len(self._states):
+            return None
+        state = self._states[slot_id]
+        return None if state == NO_SLOT else state == FREE
+    
+    def count_free(self):
+        self._ensure_loaded()
+        return self._free
+    
+    def count_total(self):
+        self._ensure_loaded()
+        return self._total
+    
+    def first_free(self, n):
+        """Ids of up to n free slots in id order"""
+        self._ensure_loaded()
+        found = []
+        with self._lock:
+            pos = self._states.find(_FREE_BYTE)
+            while pos != -1 and len(found) < n:
+                found.append(pos)
+                pos = self._states.find(_FREE_BYTE, pos + 1)
+        return found
+    
+    def stats(self):
+        return {
+            'total': self._total,
+            'free': self._free,
+            'repairs': self.repairs,
+        }
+
+
+# One index per facility (slot ids repeat across facility databases)
+availability_index = FacilityLocal(AvailabilityIndex)
@@ -0,0 +1,233 @@
+"""Flask CLI commands (run with `flask --app app <group> <command>`)"""
+import functools
+import os
+import json
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from backend.archive import archive_completed
+from backend.assets import build_assets, brotli
+from backend.expiry import expiry_scheduler, release_overdue
+from backend.extensions import db, facility_engine
+from backend.facilities import DEFAULT_FACILITY, facility_names, use_facility
+from backend.migrations import MIGRATIONS, bootstrap, current_version, upgrade
+from backend.provisioning import READERS, DEFAULT_CHUNK_SIZE, upsert_slots
+
+
+db_cli = AppGroup('db', help='Manage the database schema.')
+slots_cli = AppGroup('slots', help='Manage parking slot inventory.')
+reservations_cli = AppGroup('reservations', help='Maintain reservation data.')
+analytics_cli = AppGroup('analytics', help='Occupancy reports over reservation history.')
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+def facility_option(every_by_default=False):
+    """
+    Add --facility NAME and run the command against that facility's database
+    
+    Without --facility the command runs for the default facility, or once
+    per configured facility when every_by_default is set (maintenance jobs).
+    """
+    def decorate(fn):
+        @click.option('--facility', default=None,
+                      help='Facility to run against (default: '
+                           f'{"every facility" if every_by_default else DEFAULT_FACILITY}).')
+        @functools.wraps(fn)
+        def command(facility, **kwargs):
+            names = facility_names()
+            if facility is not None and facility not in names:
+                raise click.BadParameter(f'Unknown facility {facility!r}; expected one of {names}',
+                                         param_hint='--facility')
+            targets = [facility] if facility else names if every_by_default else [DEFAULT_FACILITY]
+            for name in targets:
+                if len(targets) > 1:
+                    click.echo(f'[{name}]')
+                # Ids repeat across facilities, so each one gets a fresh session
+                db.session.remove()
+                with use_facility(name):
+                    fn(**kwargs)
+            db.session.remove()
+        return command
+    return decorate
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, help='Stop at this schema version.')
+@facility_option(every_by_default=True)
+def db_upgrade(target):
+    """Apply pending schema migrations."""
+    applied = upgrade(target)
+    click.echo(f'Applied migrations: {applied}' if applied else 'Schema is up to date')
+
+
+@db_cli.command('version')
+@facility_option(every_by_default=True)
+def db_version():
+    """Show the current and latest schema version."""
+    with facility_engine().begin() as conn:
+        version = current_version(conn)
+    latest = max(v for v, _, _ in MIGRATIONS)
+    click.echo(f'Schema version {version} (latest {latest})')
+
+
+@db_cli.command('bootstrap')
+def db_bootstrap():
+    """Apply migrations and seed demo slots into an empty database."""
+    applied, seeded = bootstrap()
+    click.echo(f'Applied migrations: {applied or "none"}; seeded {seeded} slots')
+
+
+@slots_cli.command('import')
+@click.argument('layout', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(sorted(READERS)),
+              help='Layout format (default: from the file extension).')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+              help='Rows per bulk upsert/commit.')
+@facility_option()
+def import_slots(layout, fmt, chunk_size):
+    """Create or update slots from a CSV, JSON or JSON Lines LAYOUT file.
+    
+    Records need a slot_number and may carry zone and level. Existing slots
+    (matched on slot_number) keep their availability; re-running is safe.
+    """
+    fmt = fmt or os.path.splitext(layout)[1].lstrip('.').lower()
+    if fmt not in READERS:
+        raise click.UsageError(f'Cannot infer layout format from {layout!r}; pass --format')
+    
+    started = time.perf_counter()
+    
+    def report(processed):
+        elapsed = time.perf_counter() - started
+        click.echo(f'  {processed} slots ({processed / elapsed:,.0f}/s)')
+    
+    with open(layout, newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+        try:
+            processed = upsert_slots(READERS[fmt](f), chunk_size=chunk_size, on_chunk=report)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    
+    elapsed = time.perf_counter() - started
+    click.echo(f'Imported {processed} slots in {elapsed:.2f}s '
+               f'({processed / elapsed if elapsed else processed:,.0f} slots/s)')
+
+
+@reservations_cli.command('archive')
+@click.option('--older-than', type=int,
+              help='Only archive rows checked out at least this many seconds ago '
+                   '(default: ARCHIVE_AFTER).')
+@click.option('--batch-size', type=int, help='Rows per batch/commit (default: ARCHIVE_BATCH_SIZE).')
+@facility_option(every_by_default=True)
+def archive_reservations(older_than, batch_size):
+    """Move checked-out reservations into the reservation_history table."""
+    if older_than is None:
+        older_than = current_app.config['ARCHIVE_AFTER']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    
+    started = time.perf_counter()
+    archived = archive_completed(batch_size, timedelta(seconds=older_than))
+    click.echo(f'Archived {archived} reservations in {time.perf_counter() - started:.2f}s')
+
+
+@reservations_cli.command('expire')
+@click.option('--batch-size', type=int, help='Rows per transaction (default: EXPIRY_BATCH_SIZE).')
+@facility_option(every_by_default=True)
+def expire_reservations(batch_size):
+    """Release every overdue reservation once and exit."""
+    started = time.perf_counter()
+    released = release_overdue(batch_size or current_app.config['EXPIRY_BATCH_SIZE'])
+    elapsed = time.perf_counter() - started
+    click.echo(f'Expired {released} reservations in {elapsed:.2f}s')
+
+
+@reservations_cli.command('expire-worker')
+@click.option('--stats-interval', default=60, show_default=True,
+              help='Seconds between scheduler stats lines (0 = quiet).')
+def expire_worker(stats_interval):
+    """Run the expiry scheduler in the foreground until interrupted.
+    
+    Safe to run on several hosts: a lease row (per facility) elects one
+    active worker and the others take over if it stops renewing.
+    """
+    app = current_app._get_current_object()
+    for name, scheduler in expiry_scheduler.items():
+        scheduler.start(app)
+        click.echo(f'Expiry worker {scheduler.holder} started for {name}')
+    try:
+        while True:
+            time.sleep(stats_interval or 3600)
+            if stats_interval:
+                click.echo(json.dumps(expiry_scheduler.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, scheduler in expiry_scheduler.items():
+            scheduler.stop()
+        click.echo('Expiry worker stopped')
+
+
+def _day_range(start, end, days):
+    """Resolve --start/--end/--days into a [start, end) date range"""
+    end = end.date() if end else datetime.utcnow().date() + timedelta(days=1)
+    start = start.date() if start else end - timedelta(days=days)
+    if start >= end:
+        raise click.UsageError('--start must be before --end')
+    return start, end
+
+
+@analytics_cli.command('rollup')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day (default: --days before --end).')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Day after the last one (default: tomorrow).')
+@click.option('--days', default=30, show_default=True, help='Range length when --start is omitted.')
+@click.option('--force', is_flag=True, help='Recompute days that are already cached.')
+@facility_option(every_by_default=True)
+def analytics_rollup(start, end, days, force):
+    """Compute and store daily occupancy rollups (today is recomputed each run)."""
+    from backend.analytics import rollup_refresher
+    start, end = _day_range(start, end, days)
+    started = time.perf_counter()
+    computed = rollup_refresher.refresh(start, end, force=force)
+    if computed is None:
+        click.echo('A rollup refresh is already running; skipped')
+        return
+    click.echo(f'Computed {computed} days in {time.perf_counter() - started:.2f}s')
+
+
+@analytics_cli.command('report')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day (default: --days before --end).')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Day after the last one (default: tomorrow).')
+@click.option('--days', default=7, show_default=True, help='Range length when --start is omitted.')
+@click.option('--zone', help="Only this zone ('*' = whole facility).")
+@click.option('--granularity', type=click.Choice(['day', 'hour', 'hour_of_day']), default='day', show_default=True)
+@click.option('--json', 'as_json', is_flag=True, help='Print the raw report document.')
+@facility_option()
+def analytics_report(start, end, days, zone, granularity, as_json):
+    """Print utilization, peak occupancy and average dwell time."""
+    from backend.analytics import occupancy_report
+    start, end = _day_range(start, end, days)
+    report = occupancy_report(start, end, zone=zone, granularity=granularity)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+    
+    click.echo(f'{"zone":<8} {"utilization":>11} {"peak":>6} {"arrivals":>9} {"avg dwell (min)":>16}')
+    for name, summary in sorted(report['zones'].items()):
+        dwell = summary['avg_dwell_minutes']
+        click.echo(f'{name or "-":<8} {summary["utilization"]:>11.1%} {summary["peak_occupancy"]:>6} '
+                   f'{summary["arrivals"]:>9} {"-" if dwell is None else dwell:>16}')
+
+
+@assets_cli.command('build')
+@click.option('--clean', is_flag=True, help='Delete earlier builds first.')
+def assets_build(clean):
+    """Hash, precompress and write static/dist with its manifest.
+    
+    Run at deploy time; workers pick the manifest up when they start.
+    """
+    manifest = build_assets(current_app.static_folder, clean=clean)
+    for logical, entry in sorted(manifest.items()):
+        variants = ', '.join(f'{encoding} {size}' for encoding, size in entry['encodings'].items())
+        click.echo(f"{logical} -> {entry['file']} ({entry['size']} bytes{'; ' + variants if variants else ''})")
+    if brotli is None:
+        click.echo('brotli is not installed; only gzip variants were built')
@@ -0,0 +1,330 @@
+"""Configuration profiles, selected by name in create_app"""
+import os
+from datetime import timedelta
+from backend.facilities import DEFAULT_FACILITY, FACILITY_NAME
+from backend.hashing import DEFAULT_METHOD
+
+
+class Config:
+    """Defaults shared by every profile"""
+    DEBUG = False
+    TESTING = False
+    
+    SECRET_KEY = 'dev-secret-key-change-in-production'
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///parking.db'
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Apply migrations and seed on every start (development convenience)
+    DB_BOOTSTRAP_ON_START = True
+    
+    # SQLAlchemy connection pool (ignored for in-memory SQLite)
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_TIMEOUT = 30
+    
+    # Applied to every new SQLite connection
+    SQLITE_PRAGMAS = {}
+    
+    # Extra facilities (parking lots), name -> database URI. Each keeps its
+    # slots and reservations in its own database; the default facility
+    # ('main') and the shared user table use SQLALCHEMY_DATABASE_URI.
+    # Cross-facility reads run on up to FACILITY_FANOUT_WORKERS threads
+    # (0 = one per facility)
+    FACILITY_BINDS = {}
+    FACILITY_FANOUT_WORKERS = 0
+    
+    # Reverse proxies (or tunnels such as cloudflared) in front of the app
+    # that set X-Forwarded-For/-Proto; 0 trusts no forwarding headers and
+    # uses the socket address, which behind a proxy is the proxy's own
+    PROXY_FIX_HOPS = 0
+    
+    # Session configuration
+    PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
+    SESSION_COOKIE_SECURE = False
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    REMEMBER_COOKIE_DURATION = timedelta(days=7)
+    
+    # Password hashing: Werkzeug method string, process pool size (0 = inline),
+    # queued jobs allowed before callers wait, and the wait/job timeout in seconds
+    PASSWORD_HASH_METHOD = DEFAULT_METHOD
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_MAX_PENDING = 64
+    PASSWORD_HASH_TIMEOUT = 10
+    
+    # Logged-in user identity cache; IDENTITY_IN_SESSION also keeps id/email
+    # in the signed session so most requests resolve the user without the DB
+    IDENTITY_CACHE_SIZE = 10000
+    IDENTITY_CACHE_TTL = 300
+    IDENTITY_IN_SESSION = False
+    
+    # QR image cache: in-memory LRU size and optional on-disk store
+    QR_CACHE_SIZE = 512
+    QR_CACHE_DIR = None
+    
+    # Slot listing page size (keyset pagination)
+    SLOTS_PAGE_SIZE = 100
+    SLOTS_MAX_PAGE_SIZE = 500
+    
+    # Time-windowed bookings: longest window (hours) and how far ahead (days)
+    RESERVATION_MAX_WINDOW_HOURS = 24
+    RESERVATION_HORIZON_DAYS = 30
+    
+    # Immediate claims are released automatically after this many hours
+    RESERVATION_TTL_HOURS = 24
+    
+    # Expiry scheduler: run it in-process (otherwise `flask reservations
+    # expire-worker`), rows per release transaction, how far ahead (seconds)
+    # deadlines are queued, and the leader lease length (seconds)
+    EXPIRY_SCHEDULER = False
+    EXPIRY_BATCH_SIZE = 500
+    EXPIRY_LOOKAHEAD = 60
+    EXPIRY_LEASE_TTL = 30
+    
+    # My Reservations page size
+    RESERVATIONS_PAGE_SIZE = 50
+    RESERVATIONS_MAX_PAGE_SIZE = 200
+    
+    # Seconds between availability index reconcile passes (0 disables)
+    AVAILABILITY_RECONCILE_INTERVAL = 30
+    
+    # Live slot events: replay buffer size, keepalive interval (seconds),
+    # seconds between reads of the shared event log while streams are open,
+    # and open streams allowed per process (0 = no cap; gunicorn.conf.py
+    # allows threaded workers one each, and pages past the cap poll instead)
+    SLOT_EVENTS_HISTORY = 1024
+    SLOT_EVENTS_HEARTBEAT = 15
+    SLOT_EVENTS_POLL_INTERVAL = 0.5
+    SLOT_EVENTS_MAX_SUBSCRIBERS = 0
+    
+    # Completed reservations move to reservation_history: seconds between
+    # in-process sweeps (0 = only via `flask reservations archive`), rows per
+    # batch, and how long (seconds) checked-out rows stay in the hot table
+    ARCHIVE_INTERVAL = 0
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_AFTER = 3600
+    
+    # Longest date range (days) an analytics report may cover; reports read
+    # stored rollups, which an in-process thread refreshes (today included)
+    # every ANALYTICS_REFRESH_INTERVAL seconds (0 = only via `flask analytics rollup`)
+    ANALYTICS_MAX_DAYS = 366
+    ANALYTICS_REFRESH_INTERVAL = 300
+    
+    # Request/SQL/template timing exported on /metrics (Prometheus text);
+    # METRICS_TOKEN requires `Authorization: Bearer <token>` to read it
+    # (and is mandatory in production while metrics are enabled).
+    # METRICS_PROFILE_RATE is the fraction of requests run under cProfile,
+    # dumped to METRICS_PROFILE_DIR (default: <instance>/profiles)
+    METRICS_ENABLED = True
+    METRICS_TOKEN = None
+    METRICS_PROFILE_RATE = 0.0
+    METRICS_PROFILE_DIR = None
+    
+    # Gate check-in: bearer key for /gate/* (None = open; mandatory in production), tokens per batch
+    # call, seconds between reads of checkouts done by other workers, and
+    # how many seconds before a booked window starts its ticket opens the gate
+    GATE_API_KEY = None
+    GATE_BATCH_MAX = 500
+    TICKET_REVOCATION_REFRESH = 10
+    TICKET_START_GRACE = 900
+    
+    # Admission control for writes (POST etc.): RATE_LIMITS gives each user
+    # (or IP when logged out) `requests` per `seconds` on an endpoint;
+    # CONCURRENCY_LIMITS caps requests in flight per endpoint and process.
+    # Excess requests get 429 + Retry-After. RATE_LIMIT_BACKEND is an import
+    # path of a shared token-bucket store (default: in-process buckets,
+    # which split the limits over RATE_LIMIT_WORKERS processes; gunicorn.conf.py
+    # sets it to the worker count)
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_BACKEND = None
+    RATE_LIMIT_WORKERS = 1
+    RATE_LIMITS = {
+        'auth.login': (10, 60),
+        'auth.register': (5, 300),
+        'reservations.create_reservation': (30, 60),
+        'api.create_reservation': (30, 60),
+    }
+    CONCURRENCY_LIMITS = {
+        'auth.login': 16,
+        'auth.register': 8,
+        'reservations.create_reservation': 32,
+        'api.create_reservation': 32,
+    }
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    AVAILABILITY_RECONCILE_INTERVAL = 0
+    ANALYTICS_REFRESH_INTERVAL = 0
+    RATE_LIMIT_ENABLED = False
+
+
+class ProductionConfig(Config):
+    # Settings that must come from the environment; see check_production_config
+    REQUIRE_SECRETS = True
+    
+    IDENTITY_IN_SESSION = True
+    PASSWORD_HASH_WORKERS = 2
+    
+    # Run `flask db bootstrap` at deploy time; workers start without DB I/O
+    DB_BOOTSTRAP_ON_START = False
+    
+    # WAL lets readers proceed while a reservation write is in flight
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+    }
+
+
+config = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
+
+
+# config key -> (environment variable, parser)
+ENV_OVERRIDES = {
+    'SECRET_KEY': ('SECRET_KEY', str),
+    'SQLALCHEMY_DATABASE_URI': ('DATABASE_URL', str),
+    'FACILITY_BINDS': ('FACILITY_DATABASES', lambda v: parse_facility_binds(v)),
+    'FACILITY_FANOUT_WORKERS': ('FACILITY_FANOUT_WORKERS', int),
+    'DB_BOOTSTRAP_ON_START': ('DB_BOOTSTRAP_ON_START', lambda v: v == 'True'),
+    'DB_POOL_SIZE': ('DB_POOL_SIZE', int),
+    'DB_MAX_OVERFLOW': ('DB_MAX_OVERFLOW', int),
+    'DB_POOL_RECYCLE': ('DB_POOL_RECYCLE', int),
+    'DB_POOL_TIMEOUT': ('DB_POOL_TIMEOUT', int),
+    'SESSION_COOKIE_SECURE': ('SESSION_COOKIE_SECURE', lambda v: v == 'True'),
+    'PASSWORD_HASH_METHOD': ('PASSWORD_HASH_METHOD', str),
+    'PASSWORD_HASH_WORKERS': ('PASSWORD_HASH_WORKERS', int),
+    'PASSWORD_HASH_MAX_PENDING': ('PASSWORD_HASH_MAX_PENDING', int),
+    'PASSWORD_HASH_TIMEOUT': ('PASSWORD_HASH_TIMEOUT', int),
+    'IDENTITY_CACHE_SIZE': ('IDENTITY_CACHE_SIZE', int),
+    'IDENTITY_CACHE_TTL': ('IDENTITY_CACHE_TTL', int),
+    'IDENTITY_IN_SESSION': ('IDENTITY_IN_SESSION', lambda v: v == 'True'),
+    'QR_CACHE_SIZE': ('QR_CACHE_SIZE', int),
+    'QR_CACHE_DIR': ('QR_CACHE_DIR', str),
+    'SLOTS_PAGE_SIZE': ('SLOTS_PAGE_SIZE', int),
+    'RESERVATION_MAX_WINDOW_HOURS': ('RESERVATION_MAX_WINDOW_HOURS', int),
+    'RESERVATION_HORIZON_DAYS': ('RESERVATION_HORIZON_DAYS', int),
+    'RESERVATION_TTL_HOURS': ('RESERVATION_TTL_HOURS', int),
+    'EXPIRY_SCHEDULER': ('EXPIRY_SCHEDULER', lambda v: v == 'True'),
+    'EXPIRY_BATCH_SIZE': ('EXPIRY_BATCH_SIZE', int),
+    'EXPIRY_LOOKAHEAD': ('EXPIRY_LOOKAHEAD', int),
+    'EXPIRY_LEASE_TTL': ('EXPIRY_LEASE_TTL', int),
+    'AVAILABILITY_RECONCILE_INTERVAL': ('AVAILABILITY_RECONCILE_INTERVAL', int),
+    'SLOT_EVENTS_HISTORY': ('SLOT_EVENTS_HISTORY', int),
+    'SLOT_EVENTS_HEARTBEAT': ('SLOT_EVENTS_HEARTBEAT', int),
+    'SLOT_EVENTS_POLL_INTERVAL': ('SLOT_EVENTS_POLL_INTERVAL', float),
+    'SLOT_EVENTS_MAX_SUBSCRIBERS': ('SLOT_EVENTS_MAX_SUBSCRIBERS', int),
+    'ARCHIVE_INTERVAL': ('ARCHIVE_INTERVAL', int),
+    'ARCHIVE_BATCH_SIZE': ('ARCHIVE_BATCH_SIZE', int),
+    'ARCHIVE_AFTER': ('ARCHIVE_AFTER', int),
+    'ANALYTICS_MAX_DAYS': ('ANALYTICS_MAX_DAYS', int),
+    'ANALYTICS_REFRESH_INTERVAL': ('ANALYTICS_REFRESH_INTERVAL', int),
+    'METRICS_ENABLED': ('METRICS_ENABLED', lambda v: v == 'True'),
+    'METRICS_TOKEN': ('METRICS_TOKEN', str),
+    'METRICS_PROFILE_RATE': ('METRICS_PROFILE_RATE', float),
+    'METRICS_PROFILE_DIR': ('METRICS_PROFILE_DIR', str),
+    'GATE_API_KEY': ('GATE_API_KEY', str),
+    'GATE_BATCH_MAX': ('GATE_BATCH_MAX', int),
+    'TICKET_REVOCATION_REFRESH': ('TICKET_REVOCATION_REFRESH', int),
+    'TICKET_START_GRACE': ('TICKET_START_GRACE', int),
+    'RATE_LIMIT_ENABLED': ('RATE_LIMIT_ENABLED', lambda v: v == 'True'),
+    'RATE_LIMIT_BACKEND': ('RATE_LIMIT_BACKEND', str),
+    'RATE_LIMIT_WORKERS': ('RATE_LIMIT_WORKERS', int),
+    'PROXY_FIX_HOPS': ('PROXY_FIX_HOPS', int),
+}
+
+
+def load_config(app, config_name=None):
+    """
+    Load a profile, then let environment variables override it
+    
+    The profile name comes from the argument, else APP_CONFIG, else
+    'development'.
+    """
+    config_name = config_name or os.environ.get('APP_CONFIG', 'development')
+    if config_name not in config:
+        raise ValueError(f'Unknown config {config_name!r}; expected one of {sorted(config)}')
+    app.config.from_object(config[config_name])
+    
+    for key, (env_name, parse) in ENV_OVERRIDES.items():
+        value = os.environ.get(env_name)
+        if value is not None:
+            app.config[key] = parse(value)
+    
+    if app.config.get('REQUIRE_SECRETS'):
+        check_production_config(app.config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = facility_binds(app.config)
+    return config_name
+
+
+def check_production_config(cfg):
+    """
+    Refuse to start a production profile with settings that expose the service
+    
+    Raises:
+        ValueError: a required setting is missing
+    """
+    if not cfg.get('SECRET_KEY') or cfg['SECRET_KEY'] == Config.SECRET_KEY:
+        # Sessions and gate tickets are signed with it
+        raise ValueError('SECRET_KEY must be set to a private value in production')
+    if cfg.get('METRICS_ENABLED') and not cfg.get('METRICS_TOKEN'):
+        raise ValueError('METRICS_TOKEN must be set when METRICS_ENABLED is on in production')
+    if not cfg.get('GATE_API_KEY'):
+        # Without it anyone can scan tickets against /gate/*
+        raise ValueError('GATE_API_KEY must be set in production')
+
+
+def parse_facility_binds(value):
+    """'north=sqlite:///north.db,south=postgresql://...' -> {'north': ..., 'south': ...}"""
+    binds = {}
+    for item in value.split(','):
+        if item.strip():
+            name, _, uri = item.partition('=')
+            binds[name.strip()] = uri.strip()
+    return binds
+
+
+def facility_binds(cfg):
+    """
+    SQLALCHEMY_BINDS for the configured facilities, one engine each
+    
+    Raises:
+        ValueError: a facility name is invalid or reuses the default one
+    """
+    binds = {}
+    for name, uri in (cfg.get('FACILITY_BINDS') or {}).items():
+        if name == DEFAULT_FACILITY or not FACILITY_NAME.match(name):
+            raise ValueError(f'Invalid facility name {name!r}')
+        binds[name] = {'url': uri, **engine_options(cfg, uri)}
+    return binds
+
+
+def engine_options(cfg, uri=None):
+    """SQLAlchemy create_engine() options for the configured (or the given) database"""
+    uri = uri or cfg['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri):
+        # Flask-SQLAlchemy uses a single static connection for in-memory SQLite
+        return {}
+    
+    options = {
+        'pool_size': cfg['DB_POOL_SIZE'],
+        'max_overflow': cfg['DB_MAX_OVERFLOW'],
+        'pool_recycle': cfg['DB_POOL_RECYCLE'],
+        'pool_timeout': cfg['DB_POOL_TIMEOUT'],
+    }
+    if not uri.startswith('sqlite'):
+        options['pool_pre_ping'] = True
+    return options
@@ -0,0 +1,264 @@
+"""Live slot availability events, streamed to clients over Server-Sent Events"""
+import json
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+from backend.extensions import db, facility_engine
+from backend.facilities import FacilityLocal, use_facility
+from backend.models import SlotEventLog
+
+
+SlotEvent = namedtuple('SlotEvent', ['seq', 'slot_id', 'available'])
+
+# Session.info key: brokers with events in the session's open transaction
+_PENDING = 'slot_event_brokers'
+
+
+class SlotEventBroker:
+    """
+    Fan-out of slot state changes, shared by every worker through the database
+    
+    Every claim, checkout and expiry writes a row to slot_event_log in the
+    same transaction as the change, so an event exists exactly when the
+    change was committed, whichever process made it. The row id is the
+    sequence number clients see and resume from with Last-Event-ID, so a
+    reconnect may land on any worker. Each process keeps a bounded ring
+    buffer of recent events, filled by one indexed read of the new rows per
+    SLOT_EVENTS_POLL_INTERVAL while it has subscribers (at once after a
+    commit in this process). Clients that fell behind the buffer are told
+    to reload the full slot list instead.
+    
+    There is no polling thread: an idle subscriber whose wait runs out does
+    the read for everyone and wakes the others. Sequence numbers are
+    assumed to commit in order, which holds for SQLite's single writer.
+    Every open stream holds a worker thread (or a greenlet, under a gevent
+    worker), so production serves the stream from gevent workers; see
+    SLOT_EVENTS_MAX_SUBSCRIBERS for the threaded workers.
+    """
+    
+    def __init__(self, history=1024, heartbeat=15, poll_interval=0.5):
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        # Events with seq <= floor are not in the buffer (None until the first read)
+        self._floor = None
+        self._cond = threading.Condition()
+        self._app = None
+        self._polling = False
+        self._dirty = False
+        self._last_poll = 0.0
+        self._since_prune = 0
+        self.heartbeat = heartbeat
+        self.poll_interval = poll_interval
+        self.max_subscribers = 0
+        self.subscribers = 0
+        self.published = 0
+        self.polls = 0
+    
+    def init_app(self, app):
+        """Configure from SLOT_EVENTS_HISTORY / _HEARTBEAT / _POLL_INTERVAL / _MAX_SUBSCRIBERS"""
+        with self._cond:
+            self._app = app
+            self._events = deque(maxlen=app.config.get('SLOT_EVENTS_HISTORY', self._events.maxlen))
+            self._seq = 0
+            self._floor = None
+            self._last_poll = 0.0
+        self.heartbeat = app.config.get('SLOT_EVENTS_HEARTBEAT', self.heartbeat)
+        self.poll_interval = app.config.get('SLOT_EVENTS_POLL_INTERVAL', self.poll_interval)
+        self.max_subscribers = app.config.get('SLOT_EVENTS_MAX_SUBSCRIBERS', self.max_subscribers)
+    
+    @property
+    def seq(self):
+        return self._seq
+    
+    @property
+    def is_full(self):
+        """True if this process already holds SLOT_EVENTS_MAX_SUBSCRIBERS streams (0 = no cap)"""
+        return bool(self.max_subscribers) and self.subscribers >= self.max_subscribers
+    
+    def publish(self, slot_id, available):
+        """Record a slot state change in the current transaction; subscribers see it once committed"""
+        self.publish_many([slot_id], available)
+    
+    def publish_many(self, slot_ids, available):
+        """
+        Record the same change for several slots in the current transaction
+        
+        Every SLOT_EVENTS_HISTORY events the log is trimmed to the newest
+        SLOT_EVENTS_HISTORY rows, which is all any buffer can replay.
+        """
+        if not slot_ids:
+            return
+        now = datetime.utcnow()
+        db.session.execute(insert(SlotEventLog), [
+            {'slot_id': slot_id, 'available': bool(available), 'created_at': now} for slot_id in slot_ids
+        ])
+        self._since_prune += len(slot_ids)
+        if self._since_prune >= self._events.maxlen:
+            self._since_prune = 0
+            newest = select(func.max(SlotEventLog.seq)).scalar_subquery()
+            db.session.execute(delete(SlotEventLog).where(SlotEventLog.seq <= newest - self._events.maxlen))
+        db.session.info.setdefault(_PENDING, set()).add(self)
+        self.published += len(slot_ids)
+    
+    def notify(self):
+        """Have a waiting subscriber read the log now (after a commit in this process)"""
+        with self._cond:
+            self._dirty = True
+            self._cond.notify_all()
+    
+    def poll(self):
+        """
+        Read events committed since the last read, by any process, into the buffer
+        
+        Skipped while another thread is reading, and within poll_interval of
+        the last read unless this process committed events since.
+        """
+        with self._cond:
+            due = (self._floor is None or self._dirty
+                   or time.monotonic() - self._last_poll >= self.poll_interval)
+            if self._polling or not due:
+                return
+            self._polling = True
+            self._dirty = False
+            after = self._seq
+        rows = []
+        try:
+            rows = self._read(after)
+        except Exception as e:
+            self._app.logger.warning(f'Slot event poll failed: {str(e)}')
+        finally:
+            with self._cond:
+                self._add(rows)
+                self._polling = False
+                self._last_poll = time.monotonic()
+                self.polls += 1
+                self._cond.notify_all()
+    
+    def _read(self, after):
+        """The newest buffer-full of rows with seq > after, oldest first (seq index range scan)"""
+        table = SlotEventLog.__table__
+        with self._app.app_context(), use_facility(self.facility):
+            with facility_engine().connect() as conn:
+                rows = conn.execute(
+                    select(table.c.seq, table.c.slot_id, table.c.available)
+                    .where(table.c.seq > after)
+                    .order_by(table.c.seq.desc())
+                    .limit(self._events.maxlen)
+                ).all()
+        return [SlotEvent(seq, slot_id, bool(available)) for seq, slot_id, available in reversed(rows)]
+    
+    def _add(self, rows):
+        if self._floor is None or len(rows) == self._events.maxlen:
+            # First read, or more happened than fits: start the buffer over
+            self._events.clear()
+            self._floor = rows[0].seq - 1 if rows else self._seq
+        for row in rows:
+            if len(self._events) == self._events.maxlen:
+                self._floor = self._events[0].seq
+            self._events.append(row)
+        if rows:
+            self._seq = rows[-1].seq
+    
+    def events_since(self, seq):
+        """
+        Buffered events newer than seq
+        
+        Returns:
+            List of SlotEvent, or None if seq is older than the retained history
+        """
+        with self._cond:
+            return self._events_since(seq)
+    
+    def _events_since(self, seq):
+        if seq >= self._seq:
+            return []
+        if self._floor is None or seq < self._floor:
+            return None
+        # Ids may have gaps, so walk back from the newest event
+        newer = []
+        for e in reversed(self._events):
+            if e.seq <= seq:
+                break
+            newer.append(e)
+        return newer[::-1]
+    
+    def wait(self, seq, timeout):
+        """Block until there are events newer than seq or the timeout passes, reading the log when due"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                events = self._events_since(seq)
+                if events is None or events:
+                    return events
+                now = time.monotonic()
+                if now >= deadline:
+                    return []
+                poll_in = 0.0 if self._dirty else self._last_poll + self.poll_interval - now
+                if self._polling or poll_in > 0:
+                    self._cond.wait(deadline - now if self._polling else min(deadline - now, poll_in))
+                    continue
+            self.poll()
+    
+    def stream(self, last_seq=None):
+        """
+        Generate the SSE wire format for one subscriber
+        
+        Without a last_seq the client gets a `hello` carrying the current
+        sequence number, which it should pair with a fresh slot list.
+        """
+        with self._cond:
+            self.subscribers += 1
+        try:
+            yield 'retry: 3000\n\n'
+            self.poll()
+            if last_seq is None or last_seq > self._seq:
+                last_seq = self._seq
+                yield _format('hello', last_seq, {'seq': last_seq})
+            
+            while True:
+                events = self.wait(last_seq, self.heartbeat)
+                if events is None:
+                    # Too far behind to replay; client must reload its snapshot
+                    last_seq = self._seq
+                    yield _format('reset', last_seq, {'seq': last_seq})
+                elif not events:
+                    yield ': keepalive\n\n'
+                else:
+                    yield ''.join(
+                        _format('slot', e.seq, {'seq': e.seq, 'slot_id': e.slot_id, 'available': e.available})
+                        for e in events
+                    )
+                    last_seq = events[-1].seq
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+    
+    def stats(self):
+        return {
+            'seq': self._seq,
+            'subscribers': self.subscribers,
+            'published': self.published,
+            'polls': self.polls,
+        }
+
+
+def _format(event, seq, data):
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_subscribers(session):
+    for broker in session.info.pop(_PENDING, ()):
+        broker.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+# Each facility has its own stream; slot ids are only unique within a facility
+slot_events = FacilityLocal(SlotEventBroker)
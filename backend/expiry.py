@@ -0,0 +1,297 @@
+"""Release reservations whose deadline passed without a checkout"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, select, update
+from backend.availability import availability_index
+from backend.events import slot_events
+from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, FacilityLocal, use_facility
+from backend.intervals import interval_index
+from backend.leases import acquire_lease, make_holder_id, release_lease
+from backend.models import (
+    ParkingSlot, Reservation, RESERVATION_ACTIVE, RESERVATION_EXPIRED, OPEN_STATUSES
+)
+
+
+LEASE_NAME = 'reservation-expiry'
+DEFAULT_BATCH_SIZE = 500
+
+# Rows read per heap refill
+REFILL_LIMIT = 10000
+
+
+def release_expired(reservation_ids, now=None):
+    """
+    Expire the given reservations if they are still open and overdue, in one transaction
+    
+    The status UPDATE is conditional, so a reservation checked out in the
+    meantime is left alone; a slot is only marked available again if no
+    other active reservation holds it by then.
+    
+    Returns:
+        Number of reservations expired
+    """
+    now = now or datetime.utcnow()
+    due = and_(Reservation.id.in_(reservation_ids), Reservation.status.in_(OPEN_STATUSES),
+               Reservation.expires_at <= now)
+    rows = db.session.execute(select(Reservation.id, Reservation.slot_id, Reservation.status).where(due)).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+    
+    db.session.execute(
+        update(Reservation)
+        .where(due)
+        .values(status=RESERVATION_EXPIRED, checked_out_at=Reservation.expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    held_slots = sorted({slot_id for _, slot_id, status in rows if status == RESERVATION_ACTIVE})
+    if held_slots:
+        db.session.execute(
+            update(ParkingSlot)
+            .where(ParkingSlot.id.in_(held_slots),
+                   ~exists().where(Reservation.slot_id == ParkingSlot.id,
+                                   Reservation.status == RESERVATION_ACTIVE))
+            .values(is_available=True)
+            .execution_options(synchronize_session=False)
+        )
+        slot_events.publish_many(held_slots, available=True)
+    db.session.commit()
+    
+    for reservation_id, slot_id, _ in rows:
+        interval_index.remove(slot_id, reservation_id)
+    for slot_id in held_slots:
+        availability_index.mark_free(slot_id)
+    return len(rows)
+
+
+def release_overdue(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    Expire every overdue reservation, batch by batch, straight from the database
+    
+    Each batch is an index range scan on ix_reservation_status_expires.
+    
+    Returns:
+        Number of reservations expired
+    """
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        ids = db.session.execute(
+            select(Reservation.id)
+            .where(Reservation.status.in_(OPEN_STATUSES), Reservation.expires_at <= now)
+            .order_by(Reservation.expires_at)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return total
+        released = release_expired(ids, now)
+        if not released:
+            return total
+        total += released
+
+
+class ExpiryScheduler:
+    """
+    Min-heap of upcoming reservation deadlines
+    
+    Deadlines inside the lookahead window are kept in a heap (filled by an
+    indexed range scan every lookahead/2 seconds, plus write-through from the
+    reservation service), so the worker sleeps until the next deadline
+    instead of polling the table. Only the process holding the lease row
+    releases anything; the others keep trying to take over. Each facility
+    has its own scheduler, thread and lease row (in its own database).
+    """
+    
+    def __init__(self):
+        self.facility = DEFAULT_FACILITY
+        self._heap = []
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.holder = make_holder_id()
+        self.enabled = False
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.lookahead = 60
+        self.lease_ttl = 30
+        self.is_leader = False
+        self._lease_renewed = 0.0
+        self._refilled = 0.0
+        self.released = 0
+        self.batches = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+    
+    def init_app(self, app):
+        """Read EXPIRY_* settings and start the in-process worker if EXPIRY_SCHEDULER is on"""
+        self.enabled = app.config.get('EXPIRY_SCHEDULER', False)
+        self.batch_size = app.config.get('EXPIRY_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.lookahead = app.config.get('EXPIRY_LOOKAHEAD', self.lookahead)
+        self.lease_ttl = app.config.get('EXPIRY_LEASE_TTL', self.lease_ttl)
+        if self.enabled and self._thread is None:
+            self.start(app)
+    
+    def schedule(self, reservation_id, deadline):
+        """
+        Queue a deadline if it falls inside the lookahead window
+        
+        Only the leader keeps a heap; everywhere else this is a no-op, and a
+        process that takes over the lease rebuilds its heap from the table.
+        """
+        if not (self.enabled and self.is_leader):
+            return
+        if deadline is None or deadline > datetime.utcnow() + timedelta(seconds=self.lookahead):
+            return
+        with self._lock:
+            if reservation_id in self._queued:
+                return
+            self._queued.add(reservation_id)
+            heapq.heappush(self._heap, (deadline, reservation_id))
+            earliest = self._heap[0][1] == reservation_id
+        if earliest:
+            self._wake.set()
+    
+    def refill(self, limit=REFILL_LIMIT):
+        """
+        Queue open reservations due within the lookahead window (index range scan)
+        
+        Returns:
+            Number of rows read; equal to limit means there may be more
+        """
+        horizon = datetime.utcnow() + timedelta(seconds=self.lookahead)
+        rows = db.session.execute(
+            select(Reservation.id, Reservation.expires_at)
+            .where(Reservation.status.in_(OPEN_STATUSES), Reservation.expires_at <= horizon)
+            .order_by(Reservation.expires_at)
+            .limit(limit)
+        ).all()
+        db.session.rollback()
+        with self._lock:
+            for reservation_id, deadline in rows:
+                if reservation_id not in self._queued:
+                    self._queued.add(reservation_id)
+                    heapq.heappush(self._heap, (deadline, reservation_id))
+        self._refilled = time.monotonic()
+        return len(rows)
+    
+    def _clear(self):
+        """Drop the heap and make the next tick refill it from the table"""
+        with self._lock:
+            self._heap = []
+            self._queued = set()
+        self._refilled = 0.0
+    
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                deadline, reservation_id = heapq.heappop(self._heap)
+                self._queued.discard(reservation_id)
+                due.append((deadline, reservation_id))
+        return due
+    
+    def release_due(self):
+        """
+        Release everything in the heap whose deadline has passed, batch by batch
+        
+        Returns:
+            Number of reservations expired
+        """
+        total = 0
+        while True:
+            now = datetime.utcnow()
+            due = self._pop_due(now)
+            if not due:
+                return total
+            released = release_expired([reservation_id for _, reservation_id in due], now)
+            lag = (now - due[0][0]).total_seconds()
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.released += released
+            self.batches += 1
+            total += released
+    
+    def seconds_until_next(self):
+        """How long the worker may sleep: next deadline, refill or lease renewal"""
+        with self._lock:
+            next_deadline = self._heap[0][0] if self._heap else None
+        waits = [self.lookahead / 2 - (time.monotonic() - self._refilled),
+                 self.lease_ttl / 3 - (time.monotonic() - self._lease_renewed)]
+        if next_deadline is not None:
+            waits.append((next_deadline - datetime.utcnow()).total_seconds())
+        return max(0.0, min(waits))
+    
+    def tick(self):
+        """One scheduler step: keep the lease, refill the heap, release what is due"""
+        if time.monotonic() - self._lease_renewed >= self.lease_ttl / 3:
+            was_leader = self.is_leader
+            self.is_leader = acquire_lease(LEASE_NAME, self.holder, self.lease_ttl)
+            self._lease_renewed = time.monotonic()
+            if self.is_leader != was_leader:
+                # Whatever was queued before a change of leadership is stale
+                self._clear()
+        if not self.is_leader:
+            return 0
+        if time.monotonic() - self._refilled >= self.lookahead / 2:
+            # Keep reading while a backlog of overdue rows fills whole pages
+            while self.refill() == REFILL_LIMIT and self.release_due():
+                pass
+        return self.release_due()
+    
+    def run(self, app):
+        """Worker loop; returns when stop() is called"""
+        while not self._stop.is_set():
+            with app.app_context(), use_facility(self.facility):
+                try:
+                    self.tick()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f'Expiry scheduler error: {str(e)}')
+                    self.is_leader = False
+                    self._lease_renewed = 0.0
+                    self._clear()
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.seconds_until_next() if self.is_leader else self.lease_ttl / 3)
+            self._wake.clear()
+        if self.is_leader:
+            with app.app_context(), use_facility(self.facility):
+                release_lease(LEASE_NAME, self.holder)
+                db.session.remove()
+            self.is_leader = False
+    
+    def start(self, app):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(app,),
+                                        name=f'reservation-expiry-{self.facility}', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def stats(self):
+        with self._lock:
+            queued = len(self._heap)
+            next_deadline = self._heap[0][0] if self._heap else None
+        return {
+            'leader': self.is_leader,
+            'queued': queued,
+            'released': self.released,
+            'batches': self.batches,
+            'last_lag_seconds': round(self.last_lag, 3),
+            'max_lag_seconds': round(self.max_lag, 3),
+            'overdue_seconds': round(max(0.0, (datetime.utcnow() - next_deadline).total_seconds()), 3)
+                               if next_deadline else 0.0,
+        }
+
+
+expiry_scheduler = FacilityLocal(ExpiryScheduler)
@@ -1,6 +1,46 @@
 """Database and extensions initialization - avoid circular imports"""
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import LoginManager
+from sqlalchemy import event
+from backend.facilities import DEFAULT_FACILITY, current_facility, is_shared
 
-db = SQLAlchemy()
+
+class FacilitySession(Session):
+    """
+    Session that sends each facility's tables to that facility's engine
+    
+    Everything but the shared tables (users) goes to the engine of the
+    current facility, which is a SQLALCHEMY_BINDS entry named after it; the
+    default facility and the shared tables use the default engine.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            facility = current_facility()
+            if facility != DEFAULT_FACILITY and not is_shared(mapper, clause):
+                return self._db.engines[facility]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': FacilitySession})
 login_manager = LoginManager()
+
+
+def facility_engine(facility=None):
+    """Engine holding the slots and reservations of the given (default: current) facility"""
+    facility = facility or current_facility()
+    return db.engine if facility == DEFAULT_FACILITY else db.engines[facility]
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMAs on every new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
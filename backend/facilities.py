@@ -0,0 +1,224 @@
+"""Facilities (parking lots) with their own database, and per-request facility routing"""
+import heapq
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import abort, current_app, g, has_app_context, request
+from sqlalchemy import inspect
+
+
+DEFAULT_FACILITY = 'main'
+
+# Tables every facility shares; they always live in the default database
+SHARED_TABLES = frozenset({'user'})
+
+# Facility names appear in URLs, headers, cursors and ticket signatures
+FACILITY_NAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+def current_facility():
+    """The facility of the current request or background job (DEFAULT_FACILITY outside one)"""
+    if has_app_context():
+        return g.get('facility', DEFAULT_FACILITY)
+    return DEFAULT_FACILITY
+
+
+def facility_names(app=None):
+    """The default facility followed by the configured FACILITY_BINDS, in name order"""
+    app = app or current_app
+    return [DEFAULT_FACILITY] + sorted(app.config.get('FACILITY_BINDS') or {})
+
+
+@contextmanager
+def use_facility(name):
+    """Route database work in the current app context to the named facility"""
+    previous = g.get('facility')
+    g.facility = name
+    try:
+        yield
+    finally:
+        if previous is None:
+            g.pop('facility', None)
+        else:
+            g.facility = previous
+
+
+def table_of(mapper=None, clause=None):
+    """The table a session operation targets, as Session.get_bind sees it (None if unknown)"""
+    if mapper is not None:
+        return inspect(mapper).local_table
+    table = getattr(clause, 'table', None)
+    if table is None and hasattr(clause, 'get_final_froms'):
+        froms = clause.get_final_froms()
+        table = froms[0] if froms else None
+    return table
+
+
+def is_shared(mapper=None, clause=None):
+    """True if the operation targets a table every facility shares (see SHARED_TABLES)"""
+    return getattr(table_of(mapper, clause), 'name', None) in SHARED_TABLES
+
+
+class FacilityRouter:
+    """
+    Resolves the facility of every request and fans reads out across facilities
+    
+    Each facility's slots and reservations live in their own database (a
+    FACILITY_BINDS entry; the default facility uses SQLALCHEMY_DATABASE_URI),
+    so one lot's write lock never stalls another. Users are shared and stay in
+    the default database. A request picks its facility with ?facility=<name>
+    or an X-Facility header; without either it gets the default one.
+    """
+    
+    def __init__(self):
+        self.names = [DEFAULT_FACILITY]
+        self.fan_outs = 0
+        self._executor = None
+    
+    def init_app(self, app):
+        """Read FACILITY_BINDS and install the resolver; register it early, before hooks that query"""
+        self.names = facility_names(app)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if len(self.names) > 1:
+            workers = app.config.get('FACILITY_FANOUT_WORKERS') or len(self.names)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='facility-fanout')
+        
+        app.before_request(self._resolve)
+        app.url_defaults(self._link_facility)
+        app.context_processor(lambda: {'facilities': self.names, 'current_facility': current_facility()})
+    
+    def _resolve(self):
+        name = request.args.get('facility') or request.headers.get('X-Facility')
+        if name:
+            if name not in self.names:
+                abort(404)
+            g.facility = name
+    
+    def _link_facility(self, endpoint, values):
+        """Links stay in the current facility unless they name another; the default one is left implicit"""
+        if endpoint in ('static', 'assets'):
+            return
+        if values.setdefault('facility', current_facility()) == DEFAULT_FACILITY:
+            del values['facility']
+    
+    @property
+    def is_multi(self):
+        return len(self.names) > 1
+    
+    def fan_out(self, fn, facilities=None):
+        """
+        Call fn() once per facility, in parallel, and collect the results
+        
+        Every call runs in its own app context routed to its facility, so each
+        gets its own session and connection; fn must not rely on request state
+        such as current_user (pass plain values in). With a single facility,
+        fn simply runs in the current context.
+        
+        Returns:
+            {facility: fn() result}, in facility order
+        """
+        names = list(facilities or self.names)
+        self.fan_outs += 1
+        if len(names) == 1 and names[0] == current_facility():
+            return {names[0]: fn()}
+        app = current_app._get_current_object()
+        
+        def call(name):
+            with app.app_context(), use_facility(name):
+                return fn()
+        
+        if self._executor is None or len(names) == 1:
+            return {name: call(name) for name in names}
+        futures = {name: self._executor.submit(call, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+    
+    def stats(self):
+        return {
+            'facilities': len(self.names),
+            'fan_outs': self.fan_outs,
+        }
+
+
+facility_router = FacilityRouter()
+
+
+def merge_newest_first(results, key, limit):
+    """
+    Merge per-facility lists that are each sorted newest first
+    
+    Args:
+        results: {facility: rows}, as returned by fan_out
+        key: Sort key of a row (larger = newer)
+        limit: Rows to take
+    
+    Returns:
+        ([(facility, row), ...] for the newest limit rows, whether rows were left over)
+    """
+    tagged = [[(key(row), facility, row) for row in rows] for facility, rows in results.items()]
+    taken = []
+    for _, facility, row in heapq.merge(*tagged, key=lambda item: item[0], reverse=True):
+        if len(taken) == limit:
+            break
+        taken.append((facility, row))
+    return taken, sum(len(rows) for rows in results.values()) > len(taken)
+
+
+class FacilityLocal:
+    """
+    One instance of a component per facility behind a single module-level name
+    
+    Attribute access goes to the instance of the current facility, so code
+    like availability_index.mark_free(slot_id) keeps working unchanged and
+    hits the index of the facility the request (or job) is routed to. Each
+    instance gets a `facility` attribute naming its facility.
+    """
+    
+    def __init__(self, factory):
+        instance = factory()
+        instance.facility = DEFAULT_FACILITY
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instances', {DEFAULT_FACILITY: instance})
+    
+    def init_app(self, app):
+        """Create an instance for every configured facility and init_app each of them"""
+        instances = {}
+        for name in facility_names(app):
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._factory()
+                instance.facility = name
+            instances[name] = instance
+        object.__setattr__(self, '_instances', instances)
+        for instance in instances.values():
+            instance.init_app(app)
+    
+    def get(self, facility=None):
+        """The instance of the given (default: current) facility"""
+        facility = facility or current_facility()
+        try:
+            return self._instances[facility]
+        except KeyError:
+            raise LookupError(f'Unknown facility {facility!r}') from None
+    
+    def items(self):
+        return list(self._instances.items())
+    
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+    
+    def stats(self):
+        """The instance's counters with one facility, else the numeric ones summed across facilities"""
+        per_facility = [instance.stats() for instance in self._instances.values()]
+        if len(per_facility) == 1:
+            return per_facility[0]
+        totals = {}
+        for values in per_facility:
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+        return totals
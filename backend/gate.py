@@ -0,0 +1,67 @@
+"""
+Gate check-in: verify scanned ticket tokens without a database lookup
+
+Gates of a facility other than the default one send `X-Facility: <name>`
+(or ?facility=<name>); tickets only verify at gates of their own facility.
+"""
+import hmac
+import time
+from datetime import datetime
+from flask import Blueprint, jsonify, request, current_app
+from backend.tickets import ticket_revocations, verify_ticket
+
+
+gate_bp = Blueprint('gate', __name__, url_prefix='/gate')
+
+
+@gate_bp.before_request
+def require_gate_key():
+    """Gates authenticate with `Authorization: Bearer <GATE_API_KEY>` when a key is configured"""
+    key = current_app.config.get('GATE_API_KEY')
+    # Bytes, since compare_digest rejects non-ASCII str
+    given = request.headers.get('Authorization', '').encode('utf-8')
+    if key and not hmac.compare_digest(given, f'Bearer {key}'.encode('utf-8')):
+        return _error('Invalid gate key', 401)
+    ticket_revocations.refresh_if_stale()
+
+
+def _error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+def _verdict(token, now):
+    ticket, reason = verify_ticket(token, now)
+    verdict = {'valid': reason is None, 'reason': reason}
+    if ticket is not None:
+        verdict.update(
+            reservation_id=ticket.reservation_id,
+            slot_id=ticket.slot_id,
+            expires_at=datetime.utcfromtimestamp(ticket.expires).isoformat(),
+            starts_at=datetime.utcfromtimestamp(ticket.starts).isoformat() if ticket.starts else None,
+        )
+    return verdict
+
+
+@gate_bp.route('/verify', methods=['POST'])
+def verify():
+    """Verify one token: 200 if the gate should open, 403 otherwise"""
+    token = (request.get_json(silent=True) or {}).get('token')
+    if not isinstance(token, str):
+        return _error('token is required', 400)
+    verdict = _verdict(token, time.time())
+    return jsonify(verdict), 200 if verdict['valid'] else 403
+
+
+@gate_bp.route('/verify/batch', methods=['POST'])
+def verify_batch():
+    """Verify buffered scans: {"tokens": [...]} -> {"results": [...]} in the same order"""
+    tokens = (request.get_json(silent=True) or {}).get('tokens')
+    if not isinstance(tokens, list):
+        return _error('tokens must be a list', 400)
+    limit = current_app.config['GATE_BATCH_MAX']
+    if len(tokens) > limit:
+        return _error(f'At most {limit} tokens per batch', 413)
+    now = time.time()
+    return jsonify({'results': [_verdict(token, now) for token in tokens]})
@@ -0,0 +1,130 @@
+"""Password hashing service - runs hashing off the request threads on a process pool"""
+import atexit
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+
+class HashingBusyError(Exception):
+    """Too many hashing jobs are already queued"""
+
+
+def canonical_method(method):
+    """Expand a Werkzeug method string with its defaults, as stored in hashes"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        hash_name = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if parts[0] == 'scrypt':
+        n, r, p = (parts[1:] + ['32768', '8', '1'][len(parts) - 1:])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    return method
+
+
+class PasswordHasher:
+    """
+    Password hashing with a configurable algorithm and cost
+    
+    With PASSWORD_HASH_WORKERS > 0 hashes run on a process pool so a login
+    spike cannot starve request threads of the GIL; at most
+    PASSWORD_HASH_MAX_PENDING jobs may be queued, beyond which callers wait
+    up to PASSWORD_HASH_TIMEOUT seconds and then get HashingBusyError.
+    With 0 workers hashing runs inline (tests, development).
+    
+    Pool workers are spawned, so like any multiprocessing user the launching
+    script must guard its entry point with `if __name__ == '__main__'`.
+    """
+    
+    def __init__(self, method=DEFAULT_METHOD, workers=0, max_pending=64, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+    
+    def init_app(self, app):
+        """Configure from PASSWORD_HASH_METHOD / _WORKERS / _MAX_PENDING / _TIMEOUT"""
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+    
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the parent may already be running threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+    
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusyError('Password hashing queue is full')
+        
+        started = time.perf_counter()
+        with self._lock:
+            self.pending += 1
+        try:
+            if self.workers:
+                return self._get_pool().submit(fn, *args).result(timeout=self.timeout)
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+            self._slots.release()
+    
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+    
+    def needs_rehash(self, pwhash):
+        """True if the hash was made with a different algorithm or cost"""
+        return pwhash.split('$', 1)[0] != canonical_method(self.method)
+    
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'method': canonical_method(self.method),
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_seconds': self.total_seconds / self.completed if self.completed else 0.0,
+                'max_seconds': self.max_seconds,
+            }
+
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
@@ -0,0 +1,151 @@
+"""Cached user identities for the Flask-Login user loader"""
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, session
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from backend.extensions import db
+from backend.models import User
+
+
+SESSION_KEY = '_identity'
+
+
+class UserIdentity(UserMixin):
+    """Minimal stand-in for User on authenticated requests (no password hash)"""
+    
+    def __init__(self, id, email):
+        self.id = id
+        self.email = email
+    
+    def __repr__(self):
+        return f'<UserIdentity {self.email}>'
+
+
+class IdentityCache:
+    """
+    Bounded, TTL-evicting cache of user identities
+    
+    Resolves the user id stored by Flask-Login to a UserIdentity, trying the
+    signed session first (when IDENTITY_IN_SESSION is on), then this cache,
+    and only then the database. Entries are dropped on logout and whenever a
+    User row is updated or deleted.
+    """
+    
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.in_session = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.session_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def init_app(self, app):
+        """Configure from IDENTITY_CACHE_SIZE / IDENTITY_CACHE_TTL / IDENTITY_IN_SESSION"""
+        self.maxsize = app.config.get('IDENTITY_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL', self.ttl)
+        self.in_session = app.config.get('IDENTITY_IN_SESSION', self.in_session)
+        self.clear()
+    
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(user_id)
+            return identity
+    
+    def put(self, identity):
+        with self._lock:
+            self._entries[identity.id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.session_hits = self.misses = self.evictions = 0
+    
+    def load(self, user_id):
+        """Resolve a user id to a UserIdentity (or None if the user is gone)"""
+        if self.in_session:
+            identity = _identity_from_session(user_id, self.ttl)
+            if identity is not None:
+                with self._lock:
+                    self.session_hits += 1
+                return identity
+        
+        identity = self.get(user_id)
+        if identity is not None:
+            with self._lock:
+                self.hits += 1
+            return identity
+        
+        with self._lock:
+            self.misses += 1
+        row = db.session.execute(select(User.id, User.email).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        identity = UserIdentity(row.id, row.email)
+        self.put(identity)
+        if self.in_session:
+            remember_identity(identity)
+        return identity
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'session_hits': self.session_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def _identity_from_session(user_id, ttl):
+    data = session.get(SESSION_KEY)
+    if not data:
+        return None
+    identity_id, email, issued_at = data
+    # Re-check the database now and then so account changes propagate
+    if identity_id != user_id or time.time() - issued_at > ttl:
+        return None
+    return UserIdentity(identity_id, email)
+
+
+def remember_identity(user):
+    """Store id/email in the signed session cookie (IDENTITY_IN_SESSION)"""
+    if current_app.config.get('IDENTITY_IN_SESSION'):
+        session[SESSION_KEY] = [user.id, user.email, int(time.time())]
+
+
+def forget_identity(user_id):
+    """Drop every cached copy of a user's identity (logout, account changes)"""
+    identity_cache.invalidate(user_id)
+    session.pop(SESSION_KEY, None)
+
+
+identity_cache = IdentityCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    identity_cache.invalidate(target.id)
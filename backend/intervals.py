@@ -0,0 +1,176 @@
+"""Per-slot booking windows in memory, for logarithmic overlap checks"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from flask import request
+from sqlalchemy import select
+from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, FacilityLocal, current_facility
+from backend.models import Reservation, RESERVATION_ACTIVE, RESERVATION_SCHEDULED
+
+
+# End of an open-ended (immediate) reservation: it holds the slot until checkout
+OPEN_END = datetime.max
+
+
+class SlotIntervals:
+    """
+    Non-overlapping [start, end) windows of one slot, sorted by start
+    
+    Because windows on a slot never overlap, ends are sorted too, so both
+    lookups are a single bisect.
+    """
+    
+    __slots__ = ('starts', 'ends', 'ids')
+    
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+    
+    def conflicts(self, start, end):
+        """True if [start, end) overlaps any stored window"""
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+    
+    def next_start(self, after):
+        """Start of the first window beginning at or after `after` (OPEN_END if none)"""
+        i = bisect_left(self.starts, after)
+        return self.starts[i] if i < len(self.starts) else OPEN_END
+    
+    def add(self, start, end, reservation_id):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, reservation_id)
+    
+    def remove(self, reservation_id):
+        if reservation_id in self.ids:
+            i = self.ids.index(reservation_id)
+            del self.starts[i], self.ends[i], self.ids[i]
+    
+    def prune(self, now):
+        """Drop windows that ended at or before now"""
+        i = bisect_right(self.ends, now)
+        if i:
+            del self.starts[:i], self.ends[:i], self.ids[:i]
+    
+    def __len__(self):
+        return len(self.starts)
+
+
+class IntervalIndex:
+    """
+    Booked windows per slot id
+    
+    Answers "does [T1, T2) conflict on slot X" in O(log n) and "which of
+    these slots are free between T1 and T2" in O(k log n) without touching
+    the database. Immediate reservations are stored as [reserved_at, OPEN_END),
+    clipped to the next booked window, which the claim was allowed to precede.
+    Like the availability index, it is advisory: the conditional INSERT in
+    the reservation service is what actually prevents double booking, and
+    periodic reloads repair drift from other workers.
+    """
+    
+    def __init__(self):
+        self.facility = DEFAULT_FACILITY
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.reload_interval = 30
+        self.last_loaded = None
+    
+    def init_app(self, app):
+        """Load lazily on first use and reload every AVAILABILITY_RECONCILE_INTERVAL seconds"""
+        self.reload_interval = app.config.get('AVAILABILITY_RECONCILE_INTERVAL', self.reload_interval)
+        self._slots = {}
+        self.last_loaded = None
+        
+        @app.before_request
+        def _reload_intervals():
+            if request.endpoint in ('static', 'assets') or current_facility() != self.facility:
+                return
+            if self.last_loaded is None or (
+                    self.reload_interval and time.monotonic() - self.last_loaded >= self.reload_interval):
+                self.load()
+    
+    def load(self):
+        """Rebuild from open reservations that have not ended yet"""
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            select(Reservation.id, Reservation.slot_id, Reservation.status,
+                   Reservation.reserved_at, Reservation.start_at, Reservation.end_at)
+            .where((Reservation.status == RESERVATION_ACTIVE) |
+                   ((Reservation.status == RESERVATION_SCHEDULED) & (Reservation.end_at > now)))
+        ).all()
+        slots = {}
+        # Windows first, so open-ended claims can be clipped to the next one
+        for reservation_id, slot_id, status, reserved_at, start_at, end_at in sorted(
+                rows, key=lambda row: row.status == RESERVATION_ACTIVE):
+            intervals = slots.setdefault(slot_id, SlotIntervals())
+            if status == RESERVATION_ACTIVE:
+                start_at = start_at or reserved_at or now
+                end_at = intervals.next_start(start_at)
+            intervals.add(start_at, end_at, reservation_id)
+        with self._lock:
+            self._slots = slots
+            self.last_loaded = time.monotonic()
+    
+    def _ensure_loaded(self):
+        if self.last_loaded is None:
+            self.load()
+    
+    def add(self, slot_id, start, end, reservation_id):
+        self._ensure_loaded()
+        with self._lock:
+            intervals = self._slots.setdefault(slot_id, SlotIntervals())
+            intervals.remove(reservation_id)
+            intervals.add(start, end or intervals.next_start(start), reservation_id)
+    
+    def remove(self, slot_id, reservation_id):
+        self._ensure_loaded()
+        with self._lock:
+            intervals = self._slots.get(slot_id)
+            if intervals is not None:
+                intervals.remove(reservation_id)
+                if not intervals:
+                    del self._slots[slot_id]
+    
+    def conflicts(self, slot_id, start, end=None):
+        """True if [start, end) overlaps a booking on the slot (end=None: open-ended)"""
+        self._ensure_loaded()
+        with self._lock:
+            intervals = self._slots.get(slot_id)
+            return intervals is not None and intervals.conflicts(start, end or OPEN_END)
+    
+    def free_slots(self, slot_ids, start, end=None, limit=None):
+        """The ids from slot_ids (in order) with nothing booked in [start, end)"""
+        self._ensure_loaded()
+        end = end or OPEN_END
+        free = []
+        with self._lock:
+            for slot_id in slot_ids:
+                intervals = self._slots.get(slot_id)
+                if intervals is None or not intervals.conflicts(start, end):
+                    free.append(slot_id)
+                    if limit and len(free) >= limit:
+                        break
+        return free
+    
+    def prune(self, now=None):
+        """Forget windows that have ended"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            for slot_id in list(self._slots):
+                self._slots[slot_id].prune(now)
+                if not self._slots[slot_id]:
+                    del self._slots[slot_id]
+    
+    def stats(self):
+        return {
+            'slots': len(self._slots),
+            'windows': sum(len(intervals) for intervals in self._slots.values()),
+        }
+
+
+interval_index = FacilityLocal(IntervalIndex)
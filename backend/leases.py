@@ -0,0 +1,56 @@
+"""Lease rows that elect one process to run a background job"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from backend.extensions import db
+from backend.models import SchedulerLease
+
+
+def make_holder_id():
+    """Identity of this process in lease rows (host:pid:random)"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire_lease(name, holder, ttl):
+    """
+    Take or renew the named lease for ttl seconds
+    
+    The conditional UPDATE succeeds only for the current holder or once the
+    previous holder's lease has run out; the first caller ever creates the
+    row, and a racing creator loses on the primary key.
+    
+    Returns:
+        True if this holder owns the lease now
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    result = db.session.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name,
+               or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now))
+        .values(holder=holder, expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        db.session.commit()
+        return True
+    
+    try:
+        db.session.execute(insert(SchedulerLease).values(name=name, holder=holder, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # The row exists and someone else holds it
+        db.session.rollback()
+        return False
+
+
+def release_lease(name, holder):
+    """Give the lease up early so another process can take over at once"""
+    db.session.execute(
+        delete(SchedulerLease).where(SchedulerLease.name == name, SchedulerLease.holder == holder)
+    )
+    db.session.commit()
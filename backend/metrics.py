@@ -0,0 +1,299 @@
+"""Request timing, SQL statement counts and a Prometheus text /metrics endpoint"""
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import Response, abort, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+
+# Upper bounds (seconds) of the latency buckets, as in the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Upper bounds of the statements-per-request buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+PREFIX = 'parking'
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by a tuple of label values
+    
+    observe() is one bisect and three additions under a lock; the
+    cumulative counts Prometheus expects are only built on export.
+    """
+    
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def snapshot(self):
+        """{label values: (per-bucket counts, sum, count)}"""
+        with self._lock:
+            return {key: (list(counts), total, n) for key, (counts, total, n) in self._series.items()}
+    
+    def reset(self):
+        with self._lock:
+            self._series = {}
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+        for label_values, (counts, total, n) in sorted(self.snapshot().items()):
+            pairs = list(zip(self.labels, label_values))
+            labels = _format_labels(pairs)
+            cumulative = 0
+            for le, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(pairs, le=le)} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {n}')
+        return lines
+
+
+class _RequestState(threading.local):
+    """Per-thread accumulators for the request being served"""
+    
+    def __init__(self):
+        self.active = False
+        self.started = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.status = None
+        self.profiler = None
+        self.render_started = []
+
+
+class RequestMetrics:
+    """
+    Per-endpoint latency and SQL histograms plus gauges from registered collectors
+    
+    Requests are timed by before/teardown hooks, statements by engine
+    cursor events, templates by Flask's render signals. Everything is
+    aggregated in memory per process; /metrics renders it in the Prometheus
+    text format. With METRICS_PROFILE_RATE > 0 a random sample of requests
+    also runs under cProfile and is dumped to METRICS_PROFILE_DIR.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self.profile_rate = 0.0
+        self.profile_dir = None
+        self.profiles_written = 0
+        self._state = _RequestState()
+        self._collectors = {}
+        self.request_seconds = Histogram(
+            f'{PREFIX}_request_duration_seconds', 'Request latency by endpoint', ('endpoint', 'method'))
+        self.request_queries = Histogram(
+            f'{PREFIX}_request_sql_statements', 'SQL statements executed per request', ('endpoint',),
+            QUERY_COUNT_BUCKETS)
+        self.request_sql_seconds = Histogram(
+            f'{PREFIX}_request_sql_duration_seconds', 'Time spent in SQL per request', ('endpoint',))
+        self.sql_seconds = Histogram(
+            f'{PREFIX}_sql_statement_duration_seconds', 'SQL statement latency by verb', ('verb',))
+        self.template_seconds = Histogram(
+            f'{PREFIX}_template_render_seconds', 'Template render time', ('template',))
+        self.operation_seconds = Histogram(
+            f'{PREFIX}_operation_duration_seconds', 'Timed application operations', ('operation',))
+        self._responses = {}
+        self._responses_lock = threading.Lock()
+    
+    @property
+    def histograms(self):
+        return (self.request_seconds, self.request_queries, self.request_sql_seconds,
+                self.sql_seconds, self.template_seconds, self.operation_seconds)
+    
+    def init_app(self, app):
+        """
+        Install the request hooks and the /metrics route if METRICS_ENABLED
+        
+        Call this before other extensions register before_request hooks so
+        their work counts towards the request.
+        """
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        self.token = app.config.get('METRICS_TOKEN')
+        self.profile_rate = app.config.get('METRICS_PROFILE_RATE', 0.0)
+        self.profile_dir = app.config.get('METRICS_PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+        if not self.enabled:
+            return
+        
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+        before_render_template.connect(self._start_render, app)
+        template_rendered.connect(self._finish_render, app)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+    
+    def instrument_engine(self, engine):
+        """Count and time every statement run on the engine"""
+        if not self.enabled or event.contains(engine, 'before_cursor_execute', self._before_cursor_execute):
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def register(self, name, collect):
+        """Export the numeric values of collect() (a stats() dict) as gauges named parking_<name>_<key>"""
+        self._collectors[name] = collect
+    
+    @contextmanager
+    def timed(self, operation):
+        """Observe the duration of the with-block under operation_duration_seconds"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.operation_seconds.observe(time.perf_counter() - started, operation)
+    
+    # Request hooks
+    
+    def _start_request(self):
+        state = self._state
+        state.active = True
+        state.queries = 0
+        state.query_seconds = 0.0
+        state.status = None
+        state.profiler = None
+        if self.profile_rate and random.random() < self.profile_rate:
+            state.profiler = cProfile.Profile()
+            state.profiler.enable()
+        state.started = time.perf_counter()
+    
+    def _record_status(self, response):
+        self._state.status = response.status_code
+        return response
+    
+    def _finish_request(self, exc=None):
+        state = self._state
+        if not state.active:
+            return
+        elapsed = time.perf_counter() - state.started
+        state.active = False
+        endpoint = request.endpoint or 'unmatched'
+        status = state.status or 500
+        
+        self.request_seconds.observe(elapsed, endpoint, request.method)
+        self.request_queries.observe(state.queries, endpoint)
+        self.request_sql_seconds.observe(state.query_seconds, endpoint)
+        with self._responses_lock:
+            key = (endpoint, str(status))
+            self._responses[key] = self._responses.get(key, 0) + 1
+        
+        if state.profiler is not None:
+            state.profiler.disable()
+            self._dump_profile(state.profiler, endpoint)
+            state.profiler = None
+    
+    def _dump_profile(self, profiler, endpoint):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        filename = f'{endpoint}-{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{random.getrandbits(32):08x}.prof'
+        profiler.dump_stats(os.path.join(self.profile_dir, filename))
+        self.profiles_written += 1
+    
+    # Engine and template hooks
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        verb = statement.lstrip()[:6].upper()
+        if verb not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            verb = 'OTHER'
+        self.sql_seconds.observe(elapsed, verb)
+        state = self._state
+        if state.active:
+            state.queries += 1
+            state.query_seconds += elapsed
+    
+    def _start_render(self, sender, template, context, **extra):
+        self._state.render_started.append(time.perf_counter())
+    
+    def _finish_render(self, sender, template, context, **extra):
+        started = self._state.render_started
+        if started:
+            self.template_seconds.observe(time.perf_counter() - started.pop(), template.name or 'string')
+    
+    # Export
+    
+    def _metrics_view(self):
+        # Constant-time; bytes, since compare_digest rejects non-ASCII str
+        given = request.headers.get('Authorization', '').encode('utf-8')
+        if self.token and not hmac.compare_digest(given, f'Bearer {self.token}'.encode('utf-8')):
+            abort(401)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+    
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        
+        name = f'{PREFIX}_responses_total'
+        lines += [f'# HELP {name} Responses by endpoint and status', f'# TYPE {name} counter']
+        with self._responses_lock:
+            responses = sorted(self._responses.items())
+        for (endpoint, status), count in responses:
+            lines.append(f'{name}{_format_labels((("endpoint", endpoint), ("status", status)))} {count}')
+        
+        for collector, collect in sorted(self._collectors.items()):
+            for key, value in collect().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                elif not isinstance(value, (int, float)):
+                    continue
+                name = f'{PREFIX}_{collector}_{key}'
+                lines += [f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+    
+    def reset(self):
+        for histogram in self.histograms:
+            histogram.reset()
+        with self._responses_lock:
+            self._responses = {}
+    
+    def stats(self):
+        return {
+            'requests': sum(n for _, _, n in self.request_seconds.snapshot().values()),
+            'statements': sum(n for _, _, n in self.sql_seconds.snapshot().values()),
+            'profiles_written': self.profiles_written,
+        }
+
+
+def _format_labels(pairs, le=None):
+    parts = [f'{name}="{_escape(value)}"' for name, value in pairs]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetrics()
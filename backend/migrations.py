@@ -0,0 +1,219 @@
+"""Versioned schema migrations and database bootstrap"""
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, func, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from backend.extensions import db, facility_engine
+from backend.facilities import facility_names, use_facility
+
+
+# Kept out of db.metadata so create_all never touches it
+version_metadata = MetaData()
+
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a schema step; steps must be idempotent against newer schemas"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _add_missing_columns(conn, model, *names):
+    """ALTER TABLE ... ADD COLUMN for model columns the live table lacks"""
+    table = model.__table__
+    existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column = table.c[name]
+            ddl = f'{name} {column.type.compile(dialect=conn.dialect)}'
+            if column.server_default is not None:
+                # Existing rows need a value before NOT NULL can hold
+                ddl += f" DEFAULT '{column.server_default.arg}'"
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+
+
+def _create_missing_indexes(conn, model, *names):
+    """
+    Create indexes declared on the model that the live table lacks
+    
+    Pass index names to limit the step to those; earlier steps must not build
+    indexes over columns that only a later step adds.
+    """
+    table = model.__table__
+    existing = {i['name'] for i in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if names and index.name not in names:
+            continue
+        if index.name not in existing:
+            index.create(conn)
+
+
+# ==================== MIGRATIONS ====================
+
+@migration(1, 'Baseline tables')
+def _baseline(conn):
+    from backend import models  # noqa: F401 - registers the tables on db.metadata
+    # Creates the current schema on an empty database; later steps then no-op
+    db.metadata.create_all(conn)
+
+
+@migration(2, 'Slot zone/level, listing indexes and one reservation per slot')
+def _slot_listing(conn):
+    from backend.models import ParkingSlot
+    _add_missing_columns(conn, ParkingSlot, 'zone', 'level')
+    _create_missing_indexes(conn, ParkingSlot,
+                            'ix_parking_slot_available_number', 'ix_parking_slot_zone_level_number')
+    # The original one-reservation-per-slot index; replaced in step 4
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_reservation_slot ON reservation (slot_id)'))
+
+
+@migration(3, 'Index reservations by user')
+def _reservation_user_index(conn):
+    from backend.models import Reservation
+    _create_missing_indexes(conn, Reservation, 'ix_reservation_user_id')
+
+
+@migration(4, 'Reservation lifecycle status and history table')
+def _reservation_lifecycle(conn):
+    from backend.models import Reservation, ReservationHistory
+    _add_missing_columns(conn, Reservation, 'status', 'checked_out_at')
+    # Uniqueness now only applies to active reservations
+    conn.execute(text('DROP INDEX IF EXISTS uq_reservation_slot'))
+    _create_missing_indexes(conn, Reservation, 'uq_reservation_active_slot', 'ix_reservation_status_checked_out')
+    ReservationHistory.__table__.create(conn, checkfirst=True)
+
+
+@migration(5, 'Daily occupancy rollup cache')
+def _occupancy_rollups(conn):
+    from backend.models import OccupancyRollup
+    OccupancyRollup.__table__.create(conn, checkfirst=True)
+
+
+@migration(6, 'Reservation time windows')
+def _reservation_windows(conn):
+    from backend.models import Reservation, ReservationHistory
+    _add_missing_columns(conn, Reservation, 'start_at', 'end_at')
+    _add_missing_columns(conn, ReservationHistory, 'start_at', 'end_at')
+    _create_missing_indexes(conn, Reservation, 'ix_reservation_slot_window')
+
+
+@migration(7, 'Reservation expiry deadlines and scheduler leases')
+def _reservation_expiry(conn):
+    from backend.models import Reservation, SchedulerLease, RESERVATION_ACTIVE, RESERVATION_SCHEDULED
+    _add_missing_columns(conn, Reservation, 'expires_at')
+    _create_missing_indexes(conn, Reservation, 'ix_reservation_status_expires')
+    SchedulerLease.__table__.create(conn, checkfirst=True)
+    
+    # Windows expire when they end; open claims made before this version get
+    # the default 24 hour lifetime from when they were made
+    table = Reservation.__table__
+    conn.execute(
+        table.update()
+        .where(table.c.status == RESERVATION_SCHEDULED, table.c.expires_at.is_(None))
+        .values(expires_at=table.c.end_at)
+    )
+    rows = conn.execute(
+        select(table.c.id, table.c.reserved_at)
+        .where(table.c.status == RESERVATION_ACTIVE, table.c.expires_at.is_(None))
+    ).all()
+    if rows:
+        conn.execute(
+            table.update().where(table.c.id == bindparam('row_id')).values(expires_at=bindparam('deadline')),
+            [{'row_id': row_id, 'deadline': (reserved_at or datetime.utcnow()) + timedelta(hours=24)}
+             for row_id, reserved_at in rows]
+        )
+
+
+@migration(8, 'Facility key on slots and reservations')
+def _facility_key(conn):
+    from backend.models import ParkingSlot, Reservation, ReservationHistory
+    _add_missing_columns(conn, ParkingSlot, 'facility')
+    _add_missing_columns(conn, Reservation, 'facility')
+    _add_missing_columns(conn, ReservationHistory, 'facility')
+
+
+@migration(9, 'Index reservations by user and booking time')
+def _reservation_user_time_index(conn):
+    from backend.models import Reservation
+    _create_missing_indexes(conn, Reservation, 'ix_reservation_user_time')
+
+
+@migration(10, 'Shared slot event log for live streams')
+def _slot_event_log(conn):
+    from backend.models import SlotEventLog
+    SlotEventLog.__table__.create(conn, checkfirst=True)
+
+# ==================== RUNNER ====================
+
+def current_version(conn):
+    version_metadata.create_all(conn)
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade(target=None):
+    """
+    Apply pending migrations to the current facility's database, each in its own transaction
+    
+    Returns:
+        List of versions applied by this call
+    """
+    engine = facility_engine()
+    with engine.begin() as conn:
+        current = current_version(conn)
+    
+    applied = []
+    for version, description, step in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version <= current or (target is not None and version > target):
+            continue
+        try:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(schema_version.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            # Another process recorded this version first
+            continue
+        applied.append(version)
+    return applied
+
+
+def seed_if_empty():
+    """Load the demo layout into an empty slot table"""
+    from backend.models import ParkingSlot
+    from backend.provisioning import default_layout, upsert_slots
+    if db.session.execute(select(ParkingSlot.id).limit(1)).first() is None:
+        # Upserts are idempotent, so racing seeders cannot duplicate slots
+        return upsert_slots(default_layout())
+    return 0
+
+
+def bootstrap():
+    """
+    Bring every facility's schema up to date and seed demo data
+    
+    Returns:
+        (versions applied, slots seeded) of the default facility; the other
+        facilities are migrated and seeded the same way
+    """
+    applied = upgrade()
+    seeded = seed_if_empty()
+    for name in facility_names()[1:]:
+        # Slot and reservation ids repeat across facilities; never share an identity map
+        db.session.remove()
+        with use_facility(name):
+            upgrade()
+            seed_if_empty()
+            db.session.remove()
+    return applied, seeded
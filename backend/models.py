@@ -1,7 +1,12 @@
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, current_facility
+from backend.hashing import password_hasher
+
+
+# Largest id a 32-bit INTEGER primary key can hold (PostgreSQL; SQLite allows more)
+MAX_ID = 2 ** 31 - 1
 
 
 class User(UserMixin, db.Model):
@@ -18,11 +23,15 @@ class User(UserMixin, db.Model):
         """Hash and set password"""
         if len(password) < 8:
             raise ValueError('Password must be at least 8 characters long')
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verify password against hash"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if the stored hash predates the configured algorithm/cost"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.email}>'
@@ -30,10 +39,21 @@ class User(UserMixin, db.Model):
 
 class ParkingSlot(db.Model):
     """Parking slot model"""
+    __table_args__ = (
+        # Keyset pagination walks slot_number within these prefixes
+        db.Index('ix_parking_slot_available_number', 'is_available', 'slot_number'),
+        db.Index('ix_parking_slot_zone_level_number', 'zone', 'level', 'slot_number'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     slot_number = db.Column(db.String(10), unique=True, nullable=False, index=True)
+    zone = db.Column(db.String(10))
+    level = db.Column(db.String(10))
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Lot the slot belongs to; its database is chosen by the facility router
+    facility = db.Column(db.String(32), nullable=False, default=current_facility,
+                         server_default=DEFAULT_FACILITY)
     
     # Relationships
     reservations = db.relationship('Reservation', backref='slot', lazy=True, cascade='all, delete-orphan')
@@ -42,13 +62,129 @@ class ParkingSlot(db.Model):
         return f'<ParkingSlot {self.slot_number}>'
 
 
+# Reservation lifecycle states: immediate claims are 'active' (open-ended,
+# the slot is marked unavailable); time-windowed bookings are 'scheduled'
+RESERVATION_ACTIVE = 'active'
+RESERVATION_SCHEDULED = 'scheduled'
+RESERVATION_CHECKED_OUT = 'checked_out'
+RESERVATION_EXPIRED = 'expired'
+OPEN_STATUSES = (RESERVATION_ACTIVE, RESERVATION_SCHEDULED)
+CLOSED_STATUSES = (RESERVATION_CHECKED_OUT, RESERVATION_EXPIRED)
+
+
 class Reservation(db.Model):
-    """Reservation model"""
+    """Reservation model (hot table: active and recently completed bookings)"""
+    __table_args__ = (
+        # At most one active reservation per slot; backstops the conditional claim
+        db.Index('uq_reservation_active_slot', 'slot_id', unique=True,
+                 sqlite_where=db.text("status = 'active'"),
+                 postgresql_where=db.text("status = 'active'")),
+        # My Reservations pages walk a user's bookings newest first
+        db.Index('ix_reservation_user_id', 'user_id', 'id'),
+        # ...and across facilities, where ids are not comparable, by booking time
+        db.Index('ix_reservation_user_time', 'user_id', 'reserved_at', 'id'),
+        # Archive sweeps pick completed rows oldest first
+        db.Index('ix_reservation_status_checked_out', 'status', 'checked_out_at'),
+        # Window overlap checks: slot_id = ? AND end_at > :start AND start_at < :end
+        db.Index('ix_reservation_slot_window', 'slot_id', 'end_at', 'start_at'),
+        # Expiry scheduler: open reservations by deadline
+        db.Index('ix_reservation_status_expires', 'status', 'expires_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     slot_id = db.Column(db.Integer, db.ForeignKey('parking_slot.id'), nullable=False)
     reserved_at = db.Column(db.DateTime, default=datetime.utcnow)
     qr_code_data = db.Column(db.Text)  # JSON string with QR payload
+    status = db.Column(db.String(20), nullable=False, default=RESERVATION_ACTIVE,
+                       server_default=RESERVATION_ACTIVE)
+    checked_out_at = db.Column(db.DateTime)
+    # Booked window [start_at, end_at); both NULL for immediate claims
+    start_at = db.Column(db.DateTime)
+    end_at = db.Column(db.DateTime)
+    # When the expiry scheduler releases the reservation if nobody checks out
+    expires_at = db.Column(db.DateTime)
+    facility = db.Column(db.String(32), nullable=False, default=current_facility,
+                         server_default=DEFAULT_FACILITY)
+    
+    @property
+    def is_active(self):
+        return self.status == RESERVATION_ACTIVE
+    
+    @property
+    def is_open(self):
+        return self.status in OPEN_STATUSES
     
     def __repr__(self):
         return f'<Reservation {self.id} - User {self.user_id} - Slot {self.slot_id}>'
+
+
+class ReservationHistory(db.Model):
+    """Append-only cold store of completed reservations, for reporting"""
+    __tablename__ = 'reservation_history'
+    __table_args__ = (
+        db.Index('ix_reservation_history_checked_out', 'checked_out_at'),
+        db.Index('ix_reservation_history_slot_time', 'slot_id', 'reserved_at'),
+        db.Index('ix_reservation_history_user_time', 'user_id', 'reserved_at'),
+    )
+    
+    # Same id as the hot reservation row; no foreign keys so hot rows can go
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    slot_id = db.Column(db.Integer, nullable=False)
+    reserved_at = db.Column(db.DateTime, nullable=False)
+    checked_out_at = db.Column(db.DateTime, nullable=False)
+    start_at = db.Column(db.DateTime)
+    end_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    facility = db.Column(db.String(32), nullable=False, default=current_facility,
+                         server_default=DEFAULT_FACILITY)
+    
+    def __repr__(self):
+        return f'<ReservationHistory {self.id} - Slot {self.slot_id}>'
+
+
+class OccupancyRollup(db.Model):
+    """Cached per-day, per-zone, per-hour occupancy aggregates (see backend/analytics.py)"""
+    __tablename__ = 'occupancy_rollup'
+    
+    day = db.Column(db.Date, primary_key=True)
+    zone = db.Column(db.String(50), primary_key=True)  # '' = unzoned, '*' = whole facility
+    hour = db.Column(db.Integer, primary_key=True)
+    capacity = db.Column(db.Integer, nullable=False)
+    occupied_seconds = db.Column(db.Float, nullable=False)
+    peak_occupancy = db.Column(db.Integer, nullable=False)
+    arrivals = db.Column(db.Integer, nullable=False)
+    dwell_seconds = db.Column(db.Float, nullable=False)
+    dwell_count = db.Column(db.Integer, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OccupancyRollup {self.day} {self.zone!r} {self.hour:02d}h>'
+
+
+class SchedulerLease(db.Model):
+    """Named lease row; only the current holder runs the matching background job"""
+    __tablename__ = 'scheduler_lease'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} held by {self.holder}>'
+
+
+class SlotEventLog(db.Model):
+    """Slot availability changes, written with the change and read by every worker's live-event streams"""
+    __tablename__ = 'slot_event_log'
+    
+    # Monotonic per facility database; doubles as the SSE event id
+    seq = db.Column(db.Integer, primary_key=True)
+    slot_id = db.Column(db.Integer, nullable=False)
+    available = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SlotEventLog {self.seq} slot {self.slot_id} available={self.available}>'
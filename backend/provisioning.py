@@ -0,0 +1,157 @@
+"""Bulk slot provisioning from facility layout files"""
+import csv
+import json
+from sqlalchemy import insert, select, update, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from backend.extensions import db
+from backend.models import ParkingSlot
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+SLOT_NUMBER_MAX_LENGTH = ParkingSlot.__table__.c.slot_number.type.length
+
+
+def default_layout():
+    """The ten demo slots A-01..A-10 seeded into an empty database"""
+    for i in range(1, 11):
+        yield {'slot_number': f'A-{i:02d}', 'zone': 'A', 'level': None}
+
+
+def iter_csv(f):
+    """Yield slot records from a CSV file with a header row"""
+    yield from csv.DictReader(f)
+
+
+def iter_json_lines(f):
+    """Yield slot records from a JSON Lines file (one object per line)"""
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_json_array(f, read_size=1 << 16):
+    """Yield the objects of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    started = False
+    while True:
+        buf = buf.lstrip()
+        if started:
+            buf = buf.lstrip(',').lstrip()
+        if not buf:
+            more = f.read(read_size)
+            if not more:
+                raise ValueError('Unexpected end of JSON layout file')
+            buf = more
+            continue
+        if not started:
+            if buf[0] != '[':
+                raise ValueError('JSON layout must be an array of slot objects')
+            buf = buf[1:]
+            started = True
+            continue
+        if buf[0] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            more = f.read(read_size)
+            if not more:
+                raise
+            buf += more
+            continue
+        yield record
+        buf = buf[end:]
+
+
+READERS = {
+    'csv': iter_csv,
+    'jsonl': iter_json_lines,
+    'json': iter_json_array,
+}
+
+
+def normalize_slot(record, position):
+    """Validate one layout record and reduce it to the slot columns"""
+    if not isinstance(record, dict):
+        raise ValueError(f'Record {position}: expected an object with slot_number, got {type(record).__name__}')
+    slot_number = str(record.get('slot_number') or '').strip()
+    if not slot_number:
+        raise ValueError(f'Record {position}: slot_number is required')
+    if len(slot_number) > SLOT_NUMBER_MAX_LENGTH:
+        raise ValueError(f'Record {position}: slot_number {slot_number!r} is longer than {SLOT_NUMBER_MAX_LENGTH}')
+    zone = str(record.get('zone') or '').strip() or None
+    level = str(record.get('level') or '').strip() or None
+    return {'slot_number': slot_number, 'zone': zone, 'level': level}
+
+
+def _upsert_chunk(rows):
+    """Insert new slots and refresh zone/level of existing ones, keyed on slot_number"""
+    dialect = db.session.get_bind().dialect.name
+    table = ParkingSlot.__table__
+    
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.slot_number],
+            set_={'zone': stmt.excluded.zone, 'level': stmt.excluded.level}
+        )
+        db.session.execute(stmt, rows)
+        return
+    
+    # Portable fallback: one lookup, one bulk insert and one bulk update per chunk
+    existing = set(db.session.execute(
+        select(table.c.slot_number).where(table.c.slot_number.in_([r['slot_number'] for r in rows]))
+    ).scalars())
+    new_rows = [r for r in rows if r['slot_number'] not in existing]
+    old_rows = [{'key': r['slot_number'], 'zone': r['zone'], 'level': r['level']}
+                for r in rows if r['slot_number'] in existing]
+    if new_rows:
+        db.session.execute(insert(table), new_rows)
+    if old_rows:
+        db.session.execute(
+            update(table).where(table.c.slot_number == bindparam('key'))
+            .values(zone=bindparam('zone'), level=bindparam('level')),
+            old_rows
+        )
+
+
+def upsert_slots(records, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """
+    Stream slot records into the database in chunks
+    
+    Each chunk is one bulk upsert and one commit, so memory stays bounded
+    by chunk_size and re-running the same layout is a no-op apart from
+    refreshing zone/level. Slot availability is never touched.
+    
+    Args:
+        records: iterable of dicts with slot_number and optional zone/level
+        chunk_size: rows per statement/transaction
+        on_chunk: optional callback(total_processed) after each commit
+    
+    Returns:
+        Number of records processed
+    """
+    processed = 0
+    chunk = {}
+    for position, record in enumerate(records, start=1):
+        row = normalize_slot(record, position)
+        # Later duplicates win; a single upsert must not touch a row twice
+        chunk[row['slot_number']] = row
+        if len(chunk) >= chunk_size:
+            _upsert_chunk(list(chunk.values()))
+            db.session.commit()
+            processed += len(chunk)
+            chunk = {}
+            if on_chunk:
+                on_chunk(processed)
+    if chunk:
+        _upsert_chunk(list(chunk.values()))
+        db.session.commit()
+        processed += len(chunk)
+        if on_chunk:
+            on_chunk(processed)
+    return processed
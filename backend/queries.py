@@ -0,0 +1,279 @@
+"""Read-side queries that return plain row tuples for rendering"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, exists, func, or_, select
+from backend.availability import availability_index
+from backend.extensions import db
+from backend.facilities import current_facility, facility_router, merge_newest_first
+from backend.models import (
+    MAX_ID, ParkingSlot, Reservation, RESERVATION_ACTIVE, RESERVATION_SCHEDULED, OPEN_STATUSES
+)
+
+
+# One card in the slot grid; reservation_id is set only for the viewer's own booking
+SlotCard = namedtuple('SlotCard', ['id', 'slot_number', 'is_available', 'reservation_id'])
+
+SlotTotals = namedtuple('SlotTotals', ['total', 'available', 'reserved'])
+
+# Optional narrowing of the slot listing; prefix matches the start of slot_number
+SlotFilter = namedtuple('SlotFilter', ['zone', 'level', 'prefix', 'available_only'])
+SlotFilter.__new__.__defaults__ = (None, None, None, False)
+
+# Cross-facility cursors carry booking times as microseconds since this epoch
+_EPOCH = datetime(1970, 1, 1)
+
+SlotPage = namedtuple('SlotPage', ['slots', 'next_cursor'])
+
+
+def _apply_filter(stmt, slot_filter):
+    """Add WHERE clauses for a SlotFilter; every branch is backed by an index"""
+    if slot_filter.available_only:
+        stmt = stmt.where(ParkingSlot.is_available.is_(True))
+    if slot_filter.zone:
+        stmt = stmt.where(ParkingSlot.zone == slot_filter.zone)
+    if slot_filter.level:
+        stmt = stmt.where(ParkingSlot.level == slot_filter.level)
+    if slot_filter.prefix:
+        # Range instead of LIKE so the slot_number index can be used
+        stmt = stmt.where(
+            ParkingSlot.slot_number >= slot_filter.prefix,
+            ParkingSlot.slot_number < slot_filter.prefix + '\uffff'
+        )
+    return stmt
+
+
+def parse_slot_cursor(after):
+    """
+    Validate a slot grid cursor (the last slot_number of the previous page)
+    
+    Returns:
+        The cursor, or None for the first page
+    
+    Raises:
+        ValueError: the cursor could not be a slot number
+    """
+    if not after:
+        return None
+    if len(after) > ParkingSlot.__table__.c.slot_number.type.length or not after.isprintable():
+        raise ValueError('Invalid cursor')
+    return after
+
+
+def get_slot_page(user_id, slot_filter=SlotFilter(), after=None, limit=100):
+    """
+    Fetch one page of the slot grid in a single query
+    
+    Pages are keyed on slot_number: `after` is the last slot_number of the
+    previous page, so each page is an index range scan no matter how deep
+    into the lot it is. The viewer's active reservations are outer-joined in,
+    so the template never has to walk slot.reservations to find a checkout link.
+    
+    Returns:
+        SlotPage of SlotCard tuples and the cursor for the next page (or None)
+    """
+    stmt = (
+        select(ParkingSlot.id, ParkingSlot.slot_number, ParkingSlot.is_available, Reservation.id)
+        .outerjoin(Reservation, and_(
+            Reservation.slot_id == ParkingSlot.id,
+            Reservation.user_id == user_id,
+            Reservation.status == RESERVATION_ACTIVE
+        ))
+        .order_by(ParkingSlot.slot_number)
+        .limit(limit + 1)
+    )
+    stmt = _apply_filter(stmt, slot_filter)
+    if after:
+        stmt = stmt.where(ParkingSlot.slot_number > after)
+    
+    slots = [SlotCard._make(row) for row in db.session.execute(stmt)]
+    next_cursor = None
+    if len(slots) > limit:
+        slots = slots[:limit]
+        next_cursor = slots[-1].slot_number
+    return SlotPage(slots, next_cursor)
+
+
+def get_slot_totals(slot_filter=SlotFilter()):
+    """
+    Count total, available and reserved slots
+    
+    Lot-wide totals come straight from the availability index; narrowed
+    totals are computed in one aggregate query.
+    """
+    if not (slot_filter.zone or slot_filter.level or slot_filter.prefix):
+        total, available = availability_index.count_total(), availability_index.count_free()
+        return SlotTotals(total, available, total - available)
+    
+    stmt = select(
+        func.count(ParkingSlot.id),
+        func.coalesce(func.sum(case((ParkingSlot.is_available.is_(True), 1), else_=0)), 0)
+    )
+    # Totals describe the whole zone/level, not just the available subset
+    total, available = db.session.execute(
+        _apply_filter(stmt, slot_filter._replace(available_only=False))
+    ).one()
+    return SlotTotals(total, available, total - available)
+
+
+ReservationRow = namedtuple('ReservationRow', [
+    'id', 'user_id', 'slot_id', 'slot_number', 'reserved_at', 'qr_code_data', 'status', 'start_at', 'end_at',
+    'facility'
+])
+
+
+def _reservation_rows():
+    return (
+        select(Reservation.id, Reservation.user_id, Reservation.slot_id,
+               ParkingSlot.slot_number, Reservation.reserved_at, Reservation.qr_code_data,
+               Reservation.status, Reservation.start_at, Reservation.end_at, Reservation.facility)
+        .join(ParkingSlot, ParkingSlot.id == Reservation.slot_id)
+    )
+
+
+def get_reservation_row(reservation_id):
+    """Fetch one reservation joined to its slot number, or None"""
+    row = db.session.execute(_reservation_rows().where(Reservation.id == reservation_id)).first()
+    return ReservationRow._make(row) if row else None
+
+
+def get_user_reservation_rows(user_id, before=None, limit=None):
+    """
+    Fetch a user's open reservations (active or scheduled), newest first, in one joined query
+    
+    Ids are assigned in booking order, so paging is a keyset on id: `before`
+    is the last id of the previous page.
+    """
+    stmt = (
+        _reservation_rows()
+        .where(Reservation.user_id == user_id, Reservation.status.in_(OPEN_STATUSES))
+        .order_by(Reservation.id.desc())
+    )
+    if before:
+        stmt = stmt.where(Reservation.id < before)
+    if limit:
+        stmt = stmt.limit(limit)
+    return [ReservationRow._make(row) for row in db.session.execute(stmt)]
+
+
+ReservationPage = namedtuple('ReservationPage', ['rows', 'next_cursor'])
+
+
+def get_user_reservation_page(user_id, before=None, limit=50):
+    """One page of a user's reservations plus the cursor for the next one"""
+    rows = get_user_reservation_rows(user_id, before=before, limit=limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return ReservationPage(rows, next_cursor)
+
+
+def get_user_reservation_rows_by_time(user_id, before=None, limit=None):
+    """
+    Like get_user_reservation_rows, but ordered by (reserved_at, id), newest first
+    
+    Ids from different facilities' databases cannot be compared, booking
+    times can, so this is the order the cross-facility merge works in.
+    `before` is the (reserved_at, id) of the last row of the previous page;
+    the keyset walks ix_reservation_user_time.
+    """
+    stmt = (
+        _reservation_rows()
+        .where(Reservation.user_id == user_id, Reservation.status.in_(OPEN_STATUSES))
+        .order_by(Reservation.reserved_at.desc(), Reservation.id.desc())
+    )
+    if before:
+        reserved_at, reservation_id = before
+        stmt = stmt.where(or_(Reservation.reserved_at < reserved_at,
+                              and_(Reservation.reserved_at == reserved_at, Reservation.id < reservation_id)))
+    if limit:
+        stmt = stmt.limit(limit)
+    return [ReservationRow._make(row) for row in db.session.execute(stmt)]
+
+
+def _format_position(position):
+    """A (reserved_at, id) keyset position as cursor text: '<epoch microseconds>-<id>'"""
+    reserved_at, reservation_id = position
+    return f'{(reserved_at - _EPOCH) // timedelta(microseconds=1)}-{reservation_id}'
+
+
+def parse_facility_cursor(cursor):
+    """
+    'main:1760000000000000-120,north:...' -> {'main': (reserved_at, 120), ...}
+    
+    Malformed, out-of-range or unknown parts are ignored.
+    """
+    positions = {}
+    for part in (cursor or '').split(','):
+        name, _, position = part.partition(':')
+        micros, _, reservation_id = position.partition('-')
+        if name not in facility_router.names or not (micros.isdigit() and reservation_id.isdigit()):
+            continue
+        try:
+            reserved_at = _EPOCH + timedelta(microseconds=int(micros))
+        except OverflowError:
+            continue
+        if int(reservation_id) <= MAX_ID:
+            positions[name] = (reserved_at, int(reservation_id))
+    return positions
+
+
+def get_user_reservations_everywhere(user_id, cursor=None, limit=50):
+    """
+    One page of a user's reservations across every facility, newest first
+    
+    Each facility's database gets its own keyset query, all in parallel (see
+    FacilityRouter.fan_out), each sorted on (reserved_at, id), and the pages
+    are merged on that same key. The cursor keeps one keyset position per
+    facility (see parse_facility_cursor). With a single facility this is
+    get_user_reservation_page, and the cursor is the plain id.
+    """
+    if not facility_router.is_multi:
+        before = int(cursor) if cursor and str(cursor).isdigit() and int(cursor) <= MAX_ID else None
+        return get_user_reservation_page(user_id, before=before, limit=limit)
+    
+    positions = parse_facility_cursor(cursor)
+    results = facility_router.fan_out(
+        lambda: get_user_reservation_rows_by_time(user_id, before=positions.get(current_facility()),
+                                                  limit=limit + 1)
+    )
+    taken, more = merge_newest_first(results, key=lambda row: (row.reserved_at, row.id), limit=limit)
+    for facility, row in taken:
+        positions[facility] = (row.reserved_at, row.id)
+    next_cursor = ','.join(f'{name}:{_format_position(position)}'
+                           for name, position in sorted(positions.items())) if more else None
+    return ReservationPage([row for _, row in taken], next_cursor)
+
+
+def get_free_slots_between(slot_filter, start, end, limit=100):
+    """
+    Slots matching the filter with nothing booked in [start, end), by slot number
+    
+    One query: the slot listing walks slot_number in index order and each
+    candidate is rejected by two NOT EXISTS probes, an overlap check on
+    ix_reservation_slot_window and an active-claim check on
+    uq_reservation_active_slot, so it stops after `limit` free slots
+    instead of reading every slot id first.
+    """
+    booked_window = exists().where(
+        Reservation.slot_id == ParkingSlot.id,
+        Reservation.status == RESERVATION_SCHEDULED,
+        Reservation.end_at > start,
+        Reservation.start_at < end,
+    )
+    # Immediate claims are open-ended, so they block every window that ends after them
+    claimed = exists().where(
+        Reservation.slot_id == ParkingSlot.id,
+        Reservation.status == RESERVATION_ACTIVE,
+        Reservation.reserved_at < end,
+    )
+    stmt = _apply_filter(
+        select(ParkingSlot.id, ParkingSlot.slot_number, ParkingSlot.zone, ParkingSlot.level),
+        slot_filter._replace(available_only=False),
+    )
+    rows = db.session.execute(
+        stmt.where(~booked_window, ~claimed)
+        .order_by(ParkingSlot.slot_number)
+        .limit(limit)
+    )
+    return [row._asdict() for row in rows]
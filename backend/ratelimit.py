@@ -0,0 +1,174 @@
+"""Admission control: per-client token buckets and per-endpoint concurrency caps"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, g, jsonify, request, session
+from werkzeug.utils import import_string
+
+
+# Only requests that do real work (hash a password, open a write transaction) are limited
+LIMITED_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+# Blueprints whose clients expect JSON errors
+JSON_BLUEPRINTS = ('api', 'gate')
+
+
+class LocalBackend:
+    """
+    Token buckets in this process's memory
+    
+    The stand-in for a shared store: each worker enforces the limits on its
+    own. To keep the configured limits per deployment rather than per
+    worker, every bucket gets 1/workers of the rate and burst (a burst never
+    drops below one request). Workers are picked round-robin by the load
+    balancer, so a client's requests spread over them and the total comes
+    out close to the limit; a client pinned to one worker gets only its
+    share. A shared backend (e.g. Redis running the same arithmetic in a
+    Lua script) only has to provide take() with the same signature and
+    gets the unscaled limits. Keys are kept in LRU order and the least
+    recently used are dropped past max_keys; a dropped bucket simply starts
+    full again.
+    """
+    
+    def __init__(self, max_keys=100000, workers=1):
+        self.max_keys = max_keys
+        self.workers = max(1, workers)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def take(self, key, rate, burst, now=None):
+        """
+        Take one token from the key's bucket
+        
+        Args:
+            rate: Tokens added per second
+            burst: Bucket size (requests allowed back to back)
+        
+        Returns:
+            (allowed, seconds until a token is available when not allowed)
+        """
+        now = time.monotonic() if now is None else now
+        rate, burst = rate / self.workers, max(1.0, burst / self.workers)
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+    
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """
+    Rejects excess requests with 429 before the view does any work
+    
+    RATE_LIMITS maps an endpoint to (requests, seconds): each client gets a
+    bucket of `requests` tokens refilled over `seconds`. Clients are the
+    logged-in user id (read straight from the session cookie, without a
+    user lookup) or else the remote address. CONCURRENCY_LIMITS caps the
+    requests to an endpoint in flight in this process; the excess is shed
+    at once instead of queueing behind a busy password-hash pool or write
+    lock. Both checks run in a before_request hook registered ahead of
+    every hook that touches the database, and rejections carry Retry-After.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.backend = LocalBackend()
+        self.limits = {}
+        self.concurrency = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+    
+    def init_app(self, app):
+        """Read RATE_LIMIT_* settings and install the admission hooks if RATE_LIMIT_ENABLED"""
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', False)
+        self.limits = dict(app.config.get('RATE_LIMITS') or {})
+        self.concurrency = dict(app.config.get('CONCURRENCY_LIMITS') or {})
+        backend = app.config.get('RATE_LIMIT_BACKEND')
+        self.backend = import_string(backend)() if backend else LocalBackend(
+            workers=app.config.get('RATE_LIMIT_WORKERS', 1))
+        self._in_flight = dict.fromkeys(self.concurrency, 0)
+        if not self.enabled:
+            return
+        
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+    
+    def client_key(self):
+        """
+        The logged-in user id from the session, else the remote address
+        
+        Behind a reverse proxy or tunnel the remote address is the proxy's;
+        set PROXY_FIX_HOPS so it is taken from X-Forwarded-For instead.
+        """
+        user_id = session.get('_user_id')
+        return f'user:{user_id}' if user_id else f'ip:{request.remote_addr}'
+    
+    def _admit(self):
+        endpoint = request.endpoint
+        if request.method not in LIMITED_METHODS:
+            return
+        
+        limit = self.limits.get(endpoint)
+        if limit is not None:
+            count, seconds = limit
+            allowed, retry_after = self.backend.take(f'{endpoint}:{self.client_key()}', count / seconds, count)
+            if not allowed:
+                with self._lock:
+                    self.rate_limited += 1
+                return self._reject('Too many requests', retry_after)
+        
+        cap = self.concurrency.get(endpoint)
+        if limit is None and cap is None:
+            return
+        with self._lock:
+            busy = cap is not None and self._in_flight[endpoint] >= cap
+            if busy:
+                self.concurrency_limited += 1
+            else:
+                self.admitted += 1
+                if cap is not None:
+                    self._in_flight[endpoint] += 1
+                    g.admitted_endpoint = endpoint
+        if busy:
+            return self._reject('Server busy', 1)
+    
+    def _release(self, exc=None):
+        endpoint = g.pop('admitted_endpoint', None)
+        if endpoint is not None:
+            with self._lock:
+                self._in_flight[endpoint] -= 1
+    
+    def _reject(self, message, retry_after):
+        """429 with Retry-After; JSON for API clients, plain text otherwise (no template, no user lookup)"""
+        retry_after = max(1, math.ceil(retry_after))
+        if request.blueprint in JSON_BLUEPRINTS or request.is_json:
+            response = jsonify({'error': message, 'retry_after': retry_after})
+        else:
+            response = Response(f'{message}, please retry in {retry_after} seconds.\n', mimetype='text/plain')
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    
+    def stats(self):
+        return {
+            'admitted': self.admitted,
+            'rate_limited': self.rate_limited,
+            'concurrency_limited': self.concurrency_limited,
+            'in_flight': sum(self._in_flight.values()),
+            'keys': len(self.backend) if hasattr(self.backend, '__len__') else 0,
+        }
+
+
+rate_limiter = RateLimiter()
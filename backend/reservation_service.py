@@ -0,0 +1,326 @@
+"""Slot reservation engine - claims parking slots atomically under concurrency"""
+import random
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import exists, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from backend.availability import availability_index
+from backend.events import slot_events
+from backend.expiry import expiry_scheduler
+from backend.extensions import db
+from backend.facilities import current_facility
+from backend.intervals import interval_index
+from backend.models import (
+    ParkingSlot, Reservation,
+    RESERVATION_ACTIVE, RESERVATION_SCHEDULED, RESERVATION_CHECKED_OUT, OPEN_STATUSES
+)
+from backend.tickets import ticket_revocations
+
+
+# Retry policy for transient lock contention (e.g. SQLite "database is locked")
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BACKOFF = 0.005
+MAX_BACKOFF = 0.2
+
+# Number of free slots sampled per round in "reserve any" mode
+DEFAULT_CANDIDATES = 16
+
+
+class ReservationError(Exception):
+    """Base class for reservation failures"""
+
+
+class SlotNotFoundError(ReservationError):
+    """The requested slot does not exist"""
+
+
+class SlotUnavailableError(ReservationError):
+    """The requested slot (or every slot) is already reserved"""
+
+
+class ReservationContentionError(ReservationError):
+    """The claim kept losing to concurrent writers and gave up"""
+
+
+class ReservationClosedError(ReservationError):
+    """The reservation has already been checked out"""
+
+
+class InvalidWindowError(ReservationError):
+    """The requested booking window is empty, in the past, too long or too far ahead"""
+
+
+def _backoff(attempt, base):
+    """Sleep with full jitter so retrying writers spread out"""
+    time.sleep(random.uniform(0, min(MAX_BACKOFF, base * (2 ** attempt))))
+
+
+def _window_overlaps(slot_id, start, end):
+    """EXISTS clause: a scheduled window on the slot overlaps [start, end)"""
+    return exists().where(
+        Reservation.slot_id == slot_id,
+        Reservation.status == RESERVATION_SCHEDULED,
+        Reservation.end_at > start,
+        Reservation.start_at < end,
+    )
+
+
+def _try_claim(slot_id, user_id):
+    """
+    Single claim attempt in one transaction
+    
+    The conditional UPDATE is the lock: only the writer that flips
+    is_available from true to false sees rowcount == 1. On PostgreSQL the
+    row lock taken by the UPDATE makes concurrent claimers re-check the WHERE
+    clause after the winner commits, so no SELECT ... FOR UPDATE is needed.
+    An immediate claim holds the slot until it expires, so it also fails
+    while a booked window overlaps [now, now + RESERVATION_TTL_HOURS).
+    
+    Returns:
+        The new Reservation, or None if the slot was not available
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(hours=current_app.config['RESERVATION_TTL_HOURS'])
+    result = db.session.execute(
+        update(ParkingSlot)
+        .where(ParkingSlot.id == slot_id, ParkingSlot.is_available.is_(True),
+               ~_window_overlaps(slot_id, now, expires_at))
+        .values(is_available=False)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        is_available = db.session.execute(
+            select(ParkingSlot.is_available).where(ParkingSlot.id == slot_id)
+        ).scalar()
+        db.session.rollback()
+        if is_available is False:
+            # Someone else holds it; make sure the index agrees
+            availability_index.mark_reserved(slot_id)
+        return None
+    
+    reservation = Reservation(user_id=user_id, slot_id=slot_id, reserved_at=now, expires_at=expires_at)
+    db.session.add(reservation)
+    slot_events.publish(slot_id, available=False)
+    db.session.commit()
+    availability_index.mark_reserved(slot_id)
+    interval_index.add(slot_id, now, None, reservation.id)
+    expiry_scheduler.schedule(reservation.id, expires_at)
+    return reservation
+
+
+def _try_book_window(slot_id, user_id, start, end):
+    """
+    Single windowed booking attempt in one transaction
+    
+    The slot row is locked first (FOR UPDATE; a no-op on SQLite, where the
+    write lock serializes bookings anyway), then the booking is inserted by
+    INSERT ... SELECT guarded by NOT EXISTS, so the overlap check and the
+    insert cannot interleave with another booking for the same slot. A slot
+    held by an open-ended immediate claim has no free windows.
+    
+    Returns:
+        The new Reservation, or None if the window conflicts
+    """
+    slot = db.session.execute(
+        select(ParkingSlot.id).where(ParkingSlot.id == slot_id).with_for_update()
+    ).first()
+    if slot is None:
+        db.session.rollback()
+        raise SlotNotFoundError(f'Slot {slot_id} not found')
+    
+    now = datetime.utcnow()
+    held = exists().where(Reservation.slot_id == slot_id, Reservation.status == RESERVATION_ACTIVE)
+    result = db.session.execute(
+        insert(Reservation).from_select(
+            ['user_id', 'slot_id', 'reserved_at', 'start_at', 'end_at', 'expires_at', 'status', 'facility'],
+            select(literal(user_id), literal(slot_id), literal(now, db.DateTime),
+                   literal(start, db.DateTime), literal(end, db.DateTime), literal(end, db.DateTime),
+                   literal(RESERVATION_SCHEDULED), literal(current_facility()))
+            .where(~_window_overlaps(slot_id, start, end), ~held)
+        )
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+    
+    # Windows on a slot never overlap, so (slot, start) finds the new row
+    reservation_id = db.session.execute(
+        select(Reservation.id).where(
+            Reservation.slot_id == slot_id,
+            Reservation.status == RESERVATION_SCHEDULED,
+            Reservation.start_at == start,
+        )
+    ).scalar_one()
+    db.session.commit()
+    interval_index.add(slot_id, start, end, reservation_id)
+    expiry_scheduler.schedule(reservation_id, end)
+    return db.session.get(Reservation, reservation_id)
+
+
+def _with_retry(attempt, max_attempts, backoff, what):
+    """Run one claim/booking attempt, retrying only on transient lock errors"""
+    for n in range(max_attempts):
+        try:
+            return attempt()
+        except IntegrityError:
+            # The partial unique index on active reservations caught a concurrent claim
+            db.session.rollback()
+            return None
+        except OperationalError:
+            db.session.rollback()
+            if n + 1 < max_attempts:
+                _backoff(n, backoff)
+    raise ReservationContentionError(f'Could not {what} after {max_attempts} attempts')
+
+
+def _claim_with_retry(slot_id, user_id, max_attempts, backoff):
+    return _with_retry(lambda: _try_claim(slot_id, user_id), max_attempts, backoff, f'claim slot {slot_id}')
+
+
+def reserve_slot(slot_id, user_id, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+    """
+    Reserve a specific slot for a user
+    
+    Raises:
+        SlotNotFoundError: the slot does not exist
+        SlotUnavailableError: the slot is already reserved
+        ReservationContentionError: retries were exhausted
+    """
+    reservation = _claim_with_retry(slot_id, user_id, max_attempts, backoff)
+    if reservation is None:
+        if db.session.get(ParkingSlot, slot_id) is None:
+            raise SlotNotFoundError(f'Slot {slot_id} not found')
+        raise SlotUnavailableError(f'Slot {slot_id} is already reserved')
+    return reservation
+
+
+def validate_window(start, end, now=None):
+    """
+    Check a requested [start, end) booking window against the configured limits
+    
+    A window that has already started is clipped to begin now.
+    
+    Returns:
+        The (start, end) to book
+    
+    Raises:
+        InvalidWindowError: the window is empty, over, too long or too far ahead
+    """
+    now = now or datetime.utcnow()
+    config = current_app.config
+    if start is None or end is None or end <= start:
+        raise InvalidWindowError('The booking must end after it starts')
+    if end <= now:
+        raise InvalidWindowError('The booking window is already over')
+    start = max(start, now)
+    if end - start > timedelta(hours=config['RESERVATION_MAX_WINDOW_HOURS']):
+        raise InvalidWindowError(f'Bookings are limited to {config["RESERVATION_MAX_WINDOW_HOURS"]} hours')
+    if start - now > timedelta(days=config['RESERVATION_HORIZON_DAYS']):
+        raise InvalidWindowError(f'Bookings open {config["RESERVATION_HORIZON_DAYS"]} days ahead')
+    return start, end
+
+
+def reserve_window(slot_id, user_id, start, end,
+                   max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+    """
+    Book a slot for the window [start, end) (naive UTC datetimes)
+    
+    Raises:
+        InvalidWindowError: the window fails validate_window
+        SlotNotFoundError: the slot does not exist
+        SlotUnavailableError: the window overlaps another booking
+        ReservationContentionError: retries were exhausted
+    """
+    start, end = validate_window(start, end)
+    if interval_index.conflicts(slot_id, start, end):
+        # Cheap early answer; the guarded INSERT below is still the authority
+        raise SlotUnavailableError(f'Slot {slot_id} is already booked in that window')
+    reservation = _with_retry(lambda: _try_book_window(slot_id, user_id, start, end),
+                              max_attempts, backoff, f'book slot {slot_id}')
+    if reservation is None:
+        raise SlotUnavailableError(f'Slot {slot_id} is already booked in that window')
+    return reservation
+
+
+def reserve_any_slot(user_id, candidates=DEFAULT_CANDIDATES,
+                     max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+    """
+    Reserve whichever free slot can be claimed first
+    
+    Each round samples up to `candidates` free slots from the availability
+    index (falling back to the database when the index has none) and tries
+    them in random order, so concurrent callers fan out across the sample
+    instead of all colliding on the lowest-numbered slot.
+    
+    Raises:
+        SlotUnavailableError: no free slots remain
+        ReservationContentionError: retries were exhausted
+    """
+    for attempt in range(max_attempts):
+        slot_ids = availability_index.first_free(candidates)
+        if not slot_ids:
+            # The index may lag behind other workers; ask the database
+            slot_ids = list(db.session.execute(
+                select(ParkingSlot.id)
+                .where(ParkingSlot.is_available.is_(True))
+                .order_by(ParkingSlot.slot_number)
+                .limit(candidates)
+            ).scalars())
+            db.session.rollback()
+        if not slot_ids:
+            raise SlotUnavailableError('No parking slots are available')
+        
+        # Free right now, but a window starting before the claim would expire blocks it
+        now = datetime.utcnow()
+        ttl = timedelta(hours=current_app.config['RESERVATION_TTL_HOURS'])
+        slot_ids = interval_index.free_slots(slot_ids, now, now + ttl) or slot_ids
+        random.shuffle(slot_ids)
+        for slot_id in slot_ids:
+            reservation = _claim_with_retry(slot_id, user_id, max_attempts, backoff)
+            if reservation is not None:
+                return reservation
+        
+        _backoff(attempt, backoff)
+    raise ReservationContentionError(f'Could not claim a free slot after {max_attempts} rounds')
+
+
+def checkout(reservation):
+    """
+    Check out (or cancel) a reservation and release its slot
+    
+    The row stays in the hot table as checked_out until the archive sweep
+    moves it to reservation_history. Only immediate claims hold the slot's
+    is_available flag; a windowed booking just gives its window back.
+    
+    Raises:
+        ReservationClosedError: the reservation was already checked out
+    """
+    slot_id = reservation.slot_id
+    status = reservation.status
+    ticket_expires_at = ticket_revocations.expiry_of(reservation)
+    if status not in OPEN_STATUSES:
+        raise ReservationClosedError(f'Reservation {reservation.id} is already checked out')
+    result = db.session.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation.id, Reservation.status == status)
+        .values(status=RESERVATION_CHECKED_OUT, checked_out_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        raise ReservationClosedError(f'Reservation {reservation.id} is already checked out')
+    
+    if status == RESERVATION_ACTIVE:
+        db.session.execute(
+            update(ParkingSlot)
+            .where(ParkingSlot.id == slot_id)
+            .values(is_available=True)
+            .execution_options(synchronize_session=False)
+        )
+        slot_events.publish(slot_id, available=True)
+    db.session.commit()
+    ticket_revocations.revoke(reservation.id, ticket_expires_at)
+    interval_index.remove(slot_id, reservation.id)
+    if status == RESERVATION_ACTIVE:
+        availability_index.mark_free(slot_id)
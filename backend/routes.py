@@ -1,9 +1,19 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from sqlalchemy.exc import IntegrityError
 from backend.extensions import db
 from backend.models import ParkingSlot, Reservation, User
-from backend.utils import generate_qr_code, get_reservation_summary
+from backend.queries import (
+    SlotFilter, get_slot_page, get_slot_totals, get_user_reservations_everywhere, parse_slot_cursor
+)
+from backend.reservation_service import (
+    reserve_slot, reserve_any_slot, reserve_window, checkout,
+    SlotNotFoundError, SlotUnavailableError, ReservationContentionError, ReservationClosedError,
+    InvalidWindowError
+)
+from backend.utils import (
+    generate_qr_code, get_reservation_summary, summarize_reservation_row, qr_cache, parse_timestamp,
+    is_legacy_qr_payload
+)
 
 
 slots_bp = Blueprint('slots', __name__, url_prefix='/slots')
@@ -12,21 +22,48 @@ reservations_bp = Blueprint('reservations', __name__, url_prefix='/reservations'
 
 # ==================== PARKING SLOTS ROUTES ====================
 
+def _render_slot_page(available_only=False):
+    """Render one keyset page of the slot grid for the current request args"""
+    slot_filter = SlotFilter(
+        zone=request.args.get('zone') or None,
+        level=request.args.get('level') or None,
+        prefix=request.args.get('prefix') or None,
+        available_only=available_only
+    )
+    limit = request.args.get('limit', current_app.config['SLOTS_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['SLOTS_MAX_PAGE_SIZE']))
+    
+    try:
+        after = parse_slot_cursor(request.args.get('after'))
+    except ValueError:
+        # Tampered page link: start over from the first page of the same listing
+        flash('Invalid page link', 'error')
+        args = request.args.to_dict()
+        args.pop('after')
+        return redirect(url_for(request.endpoint, **args))
+    
+    page = get_slot_page(current_user.id, slot_filter, after=after, limit=limit)
+    return render_template('slots.html',
+                         slots=page.slots,
+                         next_cursor=page.next_cursor,
+                         totals=get_slot_totals(slot_filter),
+                         slot_filter=slot_filter,
+                         filter_type='available' if available_only else None)
+
+
 @slots_bp.route('/')
 @slots_bp.route('/list')
 @login_required
 def list_slots():
     """List all parking slots with availability"""
-    slots = ParkingSlot.query.order_by(ParkingSlot.slot_number).all()
-    return render_template('slots.html', slots=slots)
+    return _render_slot_page()
 
 
 @slots_bp.route('/available')
 @login_required
 def available_slots():
     """List only available parking slots"""
-    slots = ParkingSlot.query.filter_by(is_available=True).order_by(ParkingSlot.slot_number).all()
-    return render_template('slots.html', slots=slots, filter_type='available')
+    return _render_slot_page(available_only=True)
 
 
 # ==================== RESERVATION ROUTES ====================
@@ -47,42 +84,32 @@ def create_reservation():
     
     # POST: Process reservation
     slot_id = request.form.get('slot_id', type=int)
+    reserve_any = request.form.get('any') == '1'
     
-    if not slot_id:
+    if not slot_id and not reserve_any:
         flash('Invalid slot selected', 'error')
         return redirect(url_for('slots.list_slots'))
     
+    # Windowed mode: book [start_at, end_at) instead of claiming the slot now
     try:
-        # Fetch slot with locking to prevent race conditions
-        slot = ParkingSlot.query.filter_by(id=slot_id).first()
-        
-        if not slot:
-            flash('Slot not found', 'error')
-            return redirect(url_for('slots.list_slots'))
-        
-        if not slot.is_available:
-            flash('This slot has already been reserved', 'error')
-            return redirect(url_for('slots.list_slots'))
-        
-        # Create reservation
-        reservation = Reservation(
-            user_id=current_user.id,
-            slot_id=slot_id
-        )
-        
-        # Mark slot as unavailable
-        slot.is_available = False
-        
-        db.session.add(reservation)
-        db.session.commit()
+        start_at = parse_timestamp(request.form.get('start_at'))
+        end_at = parse_timestamp(request.form.get('end_at'))
+    except ValueError:
+        flash('Invalid booking window', 'error')
+        return redirect(url_for('reservations.create_reservation', slot_id=slot_id))
+    windowed = bool(start_at or end_at) and not reserve_any
+    
+    try:
+        # Claim the slot atomically; concurrent requests cannot both win
+        if reserve_any:
+            reservation = reserve_any_slot(current_user.id)
+        elif windowed:
+            reservation = reserve_window(slot_id, current_user.id, start_at, end_at)
+        else:
+            reservation = reserve_slot(slot_id, current_user.id)
         
         # Generate QR code
-        qr_image_data, qr_payload = generate_qr_code(
-            reservation.id,
-            current_user.email,
-            slot.slot_number,
-            reservation.reserved_at
-        )
+        qr_image_data, qr_payload = generate_qr_code(reservation)
         
         # Store QR payload in database
         reservation.qr_code_data = qr_payload
@@ -91,9 +118,22 @@ def create_reservation():
         flash('Reservation successful!', 'success')
         return redirect(url_for('reservations.view_reservation', reservation_id=reservation.id))
     
-    except IntegrityError:
-        db.session.rollback()
-        flash('Slot already reserved. Please choose another.', 'error')
+    except SlotNotFoundError:
+        flash('Slot not found', 'error')
+        return redirect(url_for('slots.list_slots'))
+    except InvalidWindowError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reservations.create_reservation', slot_id=slot_id))
+    except SlotUnavailableError:
+        if reserve_any:
+            flash('No parking slots are available right now', 'error')
+        elif windowed:
+            flash('This slot is already booked during that window', 'error')
+        else:
+            flash('This slot has already been reserved', 'error')
+        return redirect(url_for('slots.list_slots'))
+    except ReservationContentionError:
+        flash('The system is busy. Please try again.', 'error')
         return redirect(url_for('slots.list_slots'))
     except Exception as e:
         db.session.rollback()
@@ -113,23 +153,18 @@ def view_reservation(reservation_id):
         flash('You do not have permission to view this reservation', 'error')
         return redirect(url_for('slots.list_slots'))
     
-    # Generate QR code if not already stored
-    if not reservation.qr_code_data:
-        qr_image_data, qr_payload = generate_qr_code(
-            reservation.id,
-            reservation.user.email,
-            reservation.slot.slot_number,
-            reservation.reserved_at
-        )
+    if not reservation.is_open:
+        flash('This reservation is already closed (checked out or expired)', 'error')
+        return redirect(url_for('reservations.my_reservations'))
+    
+    # Generate QR code if not already stored (or still the unsigned JSON
+    # payload), otherwise serve the cached render
+    if not reservation.qr_code_data or is_legacy_qr_payload(reservation.qr_code_data):
+        qr_image_data, qr_payload = generate_qr_code(reservation)
         reservation.qr_code_data = qr_payload
         db.session.commit()
     else:
-        qr_image_data, _ = generate_qr_code(
-            reservation.id,
-            reservation.user.email,
-            reservation.slot.slot_number,
-            reservation.reserved_at
-        )
+        qr_image_data = qr_cache.get_or_render(reservation.qr_code_data)
     
     summary = get_reservation_summary(reservation)
     
@@ -150,25 +185,31 @@ def checkout_reservation(reservation_id):
         flash('You do not have permission to checkout this reservation', 'error')
         return redirect(url_for('slots.list_slots'))
     
+    if not reservation.is_open:
+        flash('This reservation is already closed (checked out or expired)', 'error')
+        return redirect(url_for('reservations.my_reservations'))
+    
     if request.method == 'GET':
         # Show confirmation page
         return render_template('checkout_reservation.html', reservation=reservation)
     
     # POST: Process checkout
     try:
-        slot = reservation.slot
-        slot_number = slot.slot_number
+        slot_number = reservation.slot.slot_number
+        qr_payload = reservation.qr_code_data
         
-        # Mark slot as available
-        slot.is_available = True
+        # Mark slot as available and close the reservation
+        checkout(reservation)
         
-        # Delete reservation
-        db.session.delete(reservation)
-        db.session.commit()
+        # The ticket is no longer valid, so drop its rendered QR image
+        qr_cache.invalidate(qr_payload)
         
         flash(f'You have successfully checked out from slot {slot_number}. Slot is now available.', 'success')
         return redirect(url_for('slots.list_slots'))
     
+    except ReservationClosedError:
+        flash('This reservation is already closed (checked out or expired)', 'error')
+        return redirect(url_for('reservations.my_reservations'))
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Checkout error: {str(e)}')
@@ -179,11 +220,13 @@ def checkout_reservation(reservation_id):
 @reservations_bp.route('')
 @login_required
 def my_reservations():
-    """View all user's reservations"""
-    reservations = Reservation.query.filter_by(user_id=current_user.id).order_by(
-        Reservation.reserved_at.desc()
-    ).all()
+    """View all user's reservations, in every facility"""
+    limit = request.args.get('limit', current_app.config['RESERVATIONS_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['RESERVATIONS_MAX_PAGE_SIZE']))
     
-    summaries = [get_reservation_summary(r) for r in reservations]
+    # One joined, projected query per facility and page (run in parallel);
+    # QR payloads stay unparsed until shown
+    page = get_user_reservations_everywhere(current_user.id, cursor=request.args.get('before'), limit=limit)
+    summaries = [summarize_reservation_row(row, current_user.email) for row in page.rows]
     
-    return render_template('my_reservations.html', reservations=summaries)
+    return render_template('my_reservations.html', reservations=summaries, next_cursor=page.next_cursor)
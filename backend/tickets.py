@@ -0,0 +1,286 @@
+"""Compact HMAC-signed reservation tickets that gates verify without the database"""
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_, select
+from backend.extensions import db
+from backend.facilities import DEFAULT_FACILITY, FacilityLocal, current_facility
+from backend.models import Reservation, ReservationHistory, RESERVATION_CHECKED_OUT
+
+
+TICKET_VERSION = 2
+
+# version -> (body layout, truncated HMAC-SHA256 bytes). Version 2 adds the
+# minutes between the start of the booked window and the expiry (0 = valid
+# from issue) and gives up two signature bytes for it; 80 bits is still far
+# beyond what a gate can be brute-forced with. Version 1 tickets, issued
+# before windows were signed, are still accepted. Ids must fit in 32 bits.
+_LAYOUTS = {
+    1: (struct.Struct('>BIII'), 12),    # version, reservation id, slot id, expiry (unix seconds)
+    2: (struct.Struct('>BIIIH'), 10),   # ... plus window length in minutes
+}
+_BODY, SIGNATURE_BYTES = _LAYOUTS[TICKET_VERSION]
+
+# 25 bytes in base32: 40 characters from the QR alphanumeric set, no padding
+TOKEN_LENGTH = (_BODY.size + SIGNATURE_BYTES) * 8 // 5
+
+# Longest window a ticket can carry; longer ones are signed as this long
+MAX_LEAD_MINUTES = 0xFFFF
+
+# Overlap between incremental revocation reads, for clock skew between hosts
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+# starts is the unix time the booked window opens, None if valid from issue
+Ticket = namedtuple('Ticket', ['reservation_id', 'slot_id', 'expires', 'starts'])
+Ticket.__new__.__defaults__ = (None,)
+
+
+class InvalidTicketError(ValueError):
+    """The token is malformed or its signature does not match"""
+
+
+def _epoch(value):
+    """Naive UTC datetime -> unix seconds"""
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def ticket_expiry(reservation, ttl_hours=24):
+    """When a reservation's ticket stops being valid (naive UTC)"""
+    if reservation.expires_at is not None:
+        return reservation.expires_at
+    if reservation.end_at is not None:
+        return reservation.end_at
+    return (reservation.reserved_at or datetime.utcnow()) + timedelta(hours=ttl_hours)
+
+
+class TicketCodec:
+    """
+    Encode and verify ticket tokens
+    
+    A token is the packed body (ids, expiry and the start of the booked
+    window) plus a truncated HMAC-SHA256 over it, in base32. That is 40
+    characters, which QR alphanumeric mode fits in a version 2 symbol. The
+    verbose JSON payload needed version 6 or 7. The HMAC key is derived from
+    SECRET_KEY, so rotating the secret invalidates every outstanding ticket. The HMAC also covers the facility name (except
+    for the default facility, whose tickets predate facilities), so a ticket
+    only opens the gates of its own lot.
+    """
+    
+    def __init__(self, secret_key=None, start_grace=900):
+        self._key = None
+        self.start_grace = start_grace
+        if secret_key:
+            self.set_secret(secret_key)
+    
+    def init_app(self, app):
+        """Derive the key from SECRET_KEY; TICKET_START_GRACE is how early a window's ticket opens"""
+        self.set_secret(app.config['SECRET_KEY'])
+        self.start_grace = app.config.get('TICKET_START_GRACE', self.start_grace)
+    
+    def set_secret(self, secret_key):
+        if isinstance(secret_key, str):
+            secret_key = secret_key.encode('utf-8')
+        self._key = hmac.new(secret_key, b'parking-ticket-v1', hashlib.sha256).digest()
+    
+    def _sign(self, body, facility, size=SIGNATURE_BYTES):
+        if facility != DEFAULT_FACILITY:
+            body += b'@' + facility.encode('ascii')
+        return hmac.new(self._key, body, hashlib.sha256).digest()[:size]
+    
+    def encode(self, reservation_id, slot_id, expires_at, facility=None, starts_at=None):
+        """
+        Build the token for a reservation
+        
+        Args:
+            expires_at: naive UTC datetime or unix seconds
+            facility: Facility of the reservation (default: the current one)
+            starts_at: Start of the booked window (naive UTC datetime or unix
+                seconds), None for a ticket valid from issue. Stored to the
+                minute, rounded earlier.
+        
+        Raises:
+            ValueError: an id does not fit in 32 bits
+        """
+        expires = expires_at if isinstance(expires_at, int) else _epoch(expires_at)
+        lead = 0
+        if starts_at is not None:
+            starts = starts_at if isinstance(starts_at, int) else _epoch(starts_at)
+            lead = min(MAX_LEAD_MINUTES, max(1, -((starts - expires) // 60)))
+        try:
+            body = _BODY.pack(TICKET_VERSION, reservation_id, slot_id, expires, lead)
+        except struct.error as e:
+            raise ValueError(f'Cannot encode ticket for reservation {reservation_id}: {e}') from e
+        return base64.b32encode(body + self._sign(body, facility or current_facility())).decode('ascii')
+    
+    def decode(self, token, facility=None):
+        """
+        Check the signature and unpack the token (expiry is not checked here)
+        
+        The signature only matches for the facility the ticket was issued in
+        (default: the current one).
+        
+        Raises:
+            InvalidTicketError: wrong length, bad encoding, unknown version or bad signature
+        """
+        if not isinstance(token, str) or len(token.strip()) != TOKEN_LENGTH:
+            raise InvalidTicketError('Malformed ticket')
+        try:
+            raw = base64.b32decode(token.strip().upper())
+        except (binascii.Error, ValueError):
+            raise InvalidTicketError('Malformed ticket')
+        layout = _LAYOUTS.get(raw[0])
+        if layout is None:
+            raise InvalidTicketError(f'Unknown ticket version {raw[0]}')
+        body_layout, signature_bytes = layout
+        body, signature = raw[:body_layout.size], raw[body_layout.size:]
+        if not hmac.compare_digest(signature, self._sign(body, facility or current_facility(), signature_bytes)):
+            raise InvalidTicketError('Bad ticket signature')
+        _, reservation_id, slot_id, expires, *rest = body_layout.unpack(body)
+        lead = rest[0] if rest else 0
+        return Ticket(reservation_id, slot_id, expires, expires - lead * 60 if lead else None)
+
+
+ticket_codec = TicketCodec()
+
+
+class TicketRevocations:
+    """
+    Reservation ids whose tickets must be refused before they expire
+    
+    Checkout in this process adds its reservation directly. Checkouts in
+    other workers are picked up by an incremental read every
+    TICKET_REVOCATION_REFRESH seconds (ix_reservation_status_checked_out).
+    The first use loads every checked-out reservation whose ticket is still
+    valid, from both the hot table and reservation_history. Expired
+    reservations need no entry, because their ticket expiry has passed too.
+    Entries are dropped once their ticket expires, so the set stays as
+    small as the number of recent checkouts. Each facility has its own set.
+    """
+    
+    def __init__(self):
+        self.facility = DEFAULT_FACILITY
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self.refresh_interval = 10
+        self.ttl_hours = 24
+        self.last_refreshed = None
+        self._since = None
+        self.refreshes = 0
+    
+    def init_app(self, app):
+        self.refresh_interval = app.config.get('TICKET_REVOCATION_REFRESH', self.refresh_interval)
+        self.ttl_hours = app.config.get('RESERVATION_TTL_HOURS', self.ttl_hours)
+        with self._lock:
+            self._revoked = {}
+        self.last_refreshed = None
+        self._since = None
+    
+    def expiry_of(self, reservation):
+        return ticket_expiry(reservation, self.ttl_hours)
+    
+    def revoke(self, reservation_id, expires_at):
+        """Refuse the reservation's ticket until it expires (naive UTC datetime)"""
+        with self._lock:
+            self._revoked[reservation_id] = _epoch(expires_at)
+    
+    def is_revoked(self, reservation_id):
+        return reservation_id in self._revoked
+    
+    def load(self):
+        """Rebuild from every checked-out reservation with an unexpired ticket"""
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            select(Reservation.id, Reservation.expires_at)
+            .where(Reservation.status == RESERVATION_CHECKED_OUT, Reservation.expires_at > now)
+        ).all()
+        archived = db.session.execute(
+            select(ReservationHistory.id, ReservationHistory.end_at, ReservationHistory.reserved_at)
+            .where(ReservationHistory.status == RESERVATION_CHECKED_OUT,
+                   or_(ReservationHistory.end_at > now,
+                       and_(ReservationHistory.end_at.is_(None),
+                            ReservationHistory.reserved_at > now - timedelta(hours=self.ttl_hours))))
+        ).all()
+        db.session.rollback()
+        revoked = {reservation_id: _epoch(expires_at) for reservation_id, expires_at in rows}
+        for reservation_id, end_at, reserved_at in archived:
+            revoked[reservation_id] = _epoch(end_at or reserved_at + timedelta(hours=self.ttl_hours))
+        with self._lock:
+            self._revoked = revoked
+        self._since = now
+        self.last_refreshed = time.monotonic()
+        self.refreshes += 1
+    
+    def refresh(self):
+        """Add reservations checked out (by any worker) since the last read and prune expired ones"""
+        if self._since is None:
+            return self.load()
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            select(Reservation.id, Reservation.expires_at)
+            .where(Reservation.status == RESERVATION_CHECKED_OUT,
+                   Reservation.checked_out_at >= self._since - REFRESH_OVERLAP,
+                   Reservation.expires_at > now)
+        ).all()
+        db.session.rollback()
+        cutoff = time.time()
+        with self._lock:
+            for reservation_id, expires_at in rows:
+                self._revoked[reservation_id] = _epoch(expires_at)
+            self._revoked = {rid: expires for rid, expires in self._revoked.items() if expires > cutoff}
+        self._since = now
+        self.last_refreshed = time.monotonic()
+        self.refreshes += 1
+    
+    def refresh_if_stale(self):
+        """Load on first use, then refresh every refresh_interval seconds (0 = never)"""
+        if self.last_refreshed is None:
+            self.load()
+        elif self.refresh_interval and time.monotonic() - self.last_refreshed >= self.refresh_interval:
+            self.refresh()
+    
+    def stats(self):
+        return {
+            'revoked': len(self._revoked),
+            'refreshes': self.refreshes,
+        }
+
+
+ticket_revocations = FacilityLocal(TicketRevocations)
+
+
+def issue_ticket(reservation):
+    """Signed token for a reservation, as printed in its QR code"""
+    return ticket_codec.encode(reservation.id, reservation.slot_id, ticket_revocations.expiry_of(reservation),
+                               starts_at=reservation.start_at)
+
+
+def verify_ticket(token, now=None):
+    """
+    Check a scanned token: signature, then the booked window, then the revocation set
+    
+    Pure in-memory apart from the periodic revocation refresh. A window's
+    ticket opens the gate up to TICKET_START_GRACE seconds before the
+    window starts.
+    
+    Returns:
+        (Ticket or None, reason): reason is None for a valid ticket, else
+        'invalid', 'not_yet_valid', 'expired' or 'revoked'
+    """
+    try:
+        ticket = ticket_codec.decode(token)
+    except InvalidTicketError:
+        return None, 'invalid'
+    now = now if now is not None else time.time()
+    if ticket.expires <= now:
+        return ticket, 'expired'
+    if ticket.starts is not None and now < ticket.starts - ticket_codec.start_grace:
+        return ticket, 'not_yet_valid'
+    if ticket_revocations.is_revoked(ticket.reservation_id):
+        return ticket, 'revoked'
+    return ticket, None
@@ -1,8 +1,15 @@
+import os
 import json
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timezone
 import qrcode
+from backend.facilities import DEFAULT_FACILITY
+from backend.metrics import request_metrics
+from backend.tickets import issue_ticket, ticket_codec
 
 
 def validate_email(email):
@@ -21,55 +28,247 @@ def validate_password(password):
     return True
 
 
-def generate_qr_code(reservation_id, user_email, slot_number, timestamp):
+def parse_timestamp(value):
     """
-    Generate QR code as base64 PNG image
+    Parse an ISO 8601 timestamp into a naive UTC datetime
     
-    Args:
-        reservation_id: Reservation ID
-        user_email: User email
-        slot_number: Parking slot number
-        timestamp: Reservation timestamp
+    Naive input (e.g. from a datetime-local form field) is taken as UTC.
     
     Returns:
-        Base64 encoded PNG image data URI
+        datetime, or None for empty input
+    
+    Raises:
+        ValueError: the value is not ISO 8601
     """
-    payload = {
-        "reservation_id": reservation_id,
-        "user_email": user_email,
-        "slot_number": slot_number,
-        "reserved_at": timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp),
-        "app_version": "1.0"
-    }
-    
-    # Generate QR code
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'Expected an ISO 8601 string, got {value!r}')
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def render_qr_png(payload):
+    """Render a QR code payload to raw PNG bytes (uncached)"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
         box_size=10,
         border=4,
     )
-    qr.add_data(json.dumps(payload))
+    qr.add_data(payload)
     qr.make(fit=True)
     
     img = qr.make_image(fill_color="black", back_color="white")
     
-    # Convert to base64
     buffer = BytesIO()
     img.save(buffer, format='PNG')
-    buffer.seek(0)
-    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return buffer.getvalue()
+
+
+def png_data_uri(png_bytes):
+    """Wrap PNG bytes in a base64 data URI"""
+    return f"data:image/png;base64,{base64.b64encode(png_bytes).decode('utf-8')}"
+
+
+class QRCodeCache:
+    """
+    Content-addressed cache of rendered QR code images
+    
+    Entries are keyed by the SHA-256 of the QR payload, so the same payload
+    always maps to the same image. Rendered data URIs are kept in a bounded
+    in-memory LRU; when a directory is configured the PNG bytes are also
+    written to disk so they survive restarts and are shared between workers.
+    """
+    
+    def __init__(self, maxsize=256, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    def init_app(self, app):
+        """Configure the cache from QR_CACHE_SIZE / QR_CACHE_DIR"""
+        self.maxsize = app.config.get('QR_CACHE_SIZE', self.maxsize)
+        self.directory = app.config.get('QR_CACHE_DIR', self.directory)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.clear()
+    
+    @staticmethod
+    def key_for(payload):
+        """Content hash used as the cache key"""
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+    
+    def _remember(self, key, image):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def get_or_render(self, payload):
+        """
+        Return the QR data URI for a payload, rendering it only on a miss
+        
+        Timed as the `qr_code` operation, hits and misses alike.
+        """
+        with request_metrics.timed('qr_code'):
+            return self._get_or_render(payload)
+    
+    def _get_or_render(self, payload):
+        key = self.key_for(payload)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+        
+        if self.directory:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    image = png_data_uri(f.read())
+            except OSError:
+                image = None
+            if image is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, image)
+                return image
+        
+        png_bytes = render_qr_png(payload)
+        image = png_data_uri(png_bytes)
+        with self._lock:
+            self.misses += 1
+        self._remember(key, image)
+        
+        if self.directory:
+            # Write to a temp file first so readers never see a partial PNG
+            path = self._disk_path(key)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(png_bytes)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+        
+        return image
+    
+    def invalidate(self, payload):
+        """Drop the cached image for a payload from memory and disk"""
+        if not payload:
+            return
+        key = self.key_for(payload)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+    
+    def clear(self):
+        """Empty the in-memory cache and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+    
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
+
+
+qr_cache = QRCodeCache()
+
+
+def generate_qr_code(reservation):
+    """
+    Generate QR code as base64 PNG image
+    
+    The code carries the reservation's signed ticket token, which gates
+    verify offline (see backend.tickets).
+    
+    Args:
+        reservation: Reservation with id, slot and expiry set
+    
+    Returns:
+        Tuple of (base64 PNG data URI, ticket token)
+    """
+    payload = issue_ticket(reservation)
+    return qr_cache.get_or_render(payload), payload
+
+
+def is_legacy_qr_payload(qr_code_data):
+    """True for the unsigned JSON payloads stored before ticket tokens"""
+    return qr_code_data.startswith('{')
+
+
+class ReservationSummary:
+    """Formatted reservation summary; the stored QR payload is parsed only when read"""
+    
+    __slots__ = ('id', 'user_email', 'slot_number', 'reserved_at', 'window', 'facility',
+                 '_qr_code_data', '_qr_code_payload')
     
-    # Return as data URI
-    return f"data:image/png;base64,{img_base64}", json.dumps(payload)
+    def __init__(self, id, user_email, slot_number, reserved_at, qr_code_data, start_at=None, end_at=None,
+                 facility=DEFAULT_FACILITY):
+        self.id = id
+        self.user_email = user_email
+        self.slot_number = slot_number
+        self.reserved_at = reserved_at.strftime('%Y-%m-%d %H:%M:%S')
+        # Booked window for scheduled reservations, None for immediate ones
+        self.window = (f"{start_at.strftime('%Y-%m-%d %H:%M')} - {end_at.strftime('%Y-%m-%d %H:%M')} UTC"
+                       if start_at and end_at else None)
+        self.facility = facility
+        self._qr_code_data = qr_code_data
+        self._qr_code_payload = None
+    
+    @property
+    def qr_code_payload(self):
+        """The decoded ticket as a dict (the JSON payload for pre-ticket reservations)"""
+        if self._qr_code_payload is None and self._qr_code_data:
+            if is_legacy_qr_payload(self._qr_code_data):
+                self._qr_code_payload = json.loads(self._qr_code_data)
+            else:
+                self._qr_code_payload = ticket_codec.decode(self._qr_code_data, self.facility)._asdict()
+        return self._qr_code_payload
+    
+    def __getitem__(self, key):
+        # Keeps dict-style access (summary['id']) working for existing callers
+        return getattr(self, key)
 
 
 def get_reservation_summary(reservation):
     """Get formatted reservation summary"""
-    return {
-        'id': reservation.id,
-        'user_email': reservation.user.email,
-        'slot_number': reservation.slot.slot_number,
-        'reserved_at': reservation.reserved_at.strftime('%Y-%m-%d %H:%M:%S'),
-        'qr_code_payload': json.loads(reservation.qr_code_data) if reservation.qr_code_data else None
-    }
+    return ReservationSummary(
+        reservation.id,
+        reservation.user.email,
+        reservation.slot.slot_number,
+        reservation.reserved_at,
+        reservation.qr_code_data,
+        reservation.start_at,
+        reservation.end_at,
+        reservation.facility
+    )
+
+
+def summarize_reservation_row(row, user_email):
+    """Build a ReservationSummary from a projected ReservationRow, without ORM loads"""
+    return ReservationSummary(row.id, user_email, row.slot_number, row.reserved_at, row.qr_code_data,
+                              row.start_at, row.end_at, row.facility)
@@ -0,0 +1,113 @@
+"""
+Contended slot-claim benchmark
+
+Seeds a temporary database with --slots slots and --users users, then has
+--threads threads make --attempts claims each straight through the
+reservation service (every fourth one reserve_any_slot, the rest
+reserve_slot on overlapping slots), the way test_reservation_service.py
+stresses it. Reports claim attempts per second, wins and lost races as
+JSON (every free slot should be won exactly once), and exits 1 if a claim
+failed unexpectedly or a slot was won twice:
+
+    python -m benchmarks.claims --slots 200 --threads 16 --attempts 200
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.routes import make_app, seed
+
+
+def measure(app, slot_ids, user_ids, threads, attempts):
+    """Run the claim mix from `threads` threads; return stats"""
+    from backend.extensions import db
+    from backend.reservation_service import ReservationError, reserve_any_slot, reserve_slot
+    wins = []
+    lost = []
+    errors = []
+    start = threading.Barrier(threads)
+    
+    def worker(n):
+        with app.app_context():
+            start.wait()
+            for i in range(attempts):
+                user_id = user_ids[(n + i) % len(user_ids)]
+                try:
+                    if i % 4 == 0:
+                        reservation = reserve_any_slot(user_id)
+                    else:
+                        reservation = reserve_slot(slot_ids[(n * 7 + i) % len(slot_ids)], user_id)
+                    wins.append(reservation.slot_id)
+                except ReservationError:
+                    lost.append(n)
+                except Exception as e:
+                    errors.append(repr(e))
+                db.session.remove()
+    
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    total = threads * attempts
+    return {
+        'threads': threads,
+        'attempts': total,
+        'seconds': round(elapsed, 3),
+        'attempts_per_second': round(total / elapsed, 1) if elapsed else 0.0,
+        'wins': len(wins),
+        'lost_races': len(lost),
+        'double_booked': len(wins) - len(set(wins)),
+        'errors': errors[:10],
+        'error_count': len(errors),
+    }
+
+
+def run(args):
+    """Seed a temporary database and run the claim mix once"""
+    from backend.availability import availability_index
+    from backend.extensions import db
+    from backend.models import User
+    with tempfile.TemporaryDirectory(prefix='parking-bench-') as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'), args.config)
+        slot_ids, emails = seed(app, args.slots, args.users)
+        with app.app_context():
+            user_ids = db.session.execute(
+                db.select(User.id).where(User.email.in_(emails)).order_by(User.id)
+            ).scalars().all()
+            availability_index.load()
+            free = availability_index.count_free()
+        result = measure(app, slot_ids, user_ids, args.threads, args.attempts)
+        result['free_slots'] = free
+        with app.app_context():
+            db.engine.dispose()
+    return dict(result, config=args.config, slots=args.slots, users=args.users)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='production', help='App config profile')
+    parser.add_argument('--slots', type=int, default=200)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent claiming threads')
+    parser.add_argument('--attempts', type=int, default=200, help='Claims per thread')
+    parser.add_argument('--output', help='Also write the JSON result to this file')
+    args = parser.parse_args(argv)
+    
+    result = run(args)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    return 1 if result['error_count'] or result['double_booked'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
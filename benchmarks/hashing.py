@@ -0,0 +1,68 @@
+"""
+Password hashing micro-benchmark
+
+Measures password verifications (i.e. logins) per second through the
+PasswordHasher, inline and on process pools of increasing size, and reports
+the rate per worker process as JSON:
+
+    python -m benchmarks.hashing --method pbkdf2:sha256:600000 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend.hashing import PasswordHasher, canonical_method
+
+
+def measure(method, workers, seconds, clients):
+    """Run verifications from `clients` threads for `seconds`; return stats"""
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=clients)
+    pwhash = hasher.hash('correct horse battery staple')
+    hasher.verify(pwhash, 'correct horse battery staple')  # warm the pool
+    
+    deadline = time.perf_counter() + seconds
+    
+    def client():
+        done = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(pwhash, 'correct horse battery staple')
+            done += 1
+        return done
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        total = sum(executor.map(lambda _: client(), range(clients)))
+    elapsed = time.perf_counter() - started
+    stats = hasher.stats()
+    hasher.shutdown()
+    
+    rate = total / elapsed
+    return {
+        'workers': workers,
+        'clients': clients,
+        'logins': total,
+        'seconds': round(elapsed, 3),
+        'logins_per_second': round(rate, 1),
+        'logins_per_second_per_core': round(rate / max(workers, 1), 1),
+        'avg_latency_ms': round(stats['avg_seconds'] * 1000, 2),
+        'max_latency_ms': round(stats['max_seconds'] * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--method', default='pbkdf2:sha256:600000')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, os.cpu_count() or 1],
+                        help='Pool sizes to measure (0 = inline on the calling thread)')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent request threads')
+    args = parser.parse_args(argv)
+    
+    results = [measure(args.method, w, args.seconds, args.clients) for w in args.workers]
+    print(json.dumps({'method': canonical_method(args.method), 'cpu_count': os.cpu_count(),
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""
+Reservation hot-path benchmark
+
+Seeds a temporary database with --slots slots and --users users, then runs
+reserve cycles (list_slots, create_reservation, view_reservation,
+checkout_reservation) through the Flask test client and, with --http,
+through a local threaded HTTP server under --threads concurrent clients.
+Reports p50/p95/p99 latency, throughput and DB queries per request as JSON.
+With --baseline it exits 1 when a path regressed by more than --threshold:
+
+    python -m benchmarks.routes --slots 5000 --users 50 --http --output baseline.json
+    python -m benchmarks.routes --slots 5000 --users 50 --http --baseline baseline.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+PASSWORD = 'benchmark-password'
+
+# Benchmarked path -> Flask endpoint (for the per-request query counts)
+PATHS = {
+    'list_slots': 'slots.list_slots',
+    'create_reservation': 'reservations.create_reservation',
+    'view_reservation': 'reservations.view_reservation',
+    'checkout_reservation': 'reservations.checkout_reservation',
+}
+
+RESERVATION_URL = re.compile(r'/reservations/(\d+)$')
+
+# Settings applied while the app is created; logins and background rollup
+# refreshes are not what is measured
+BENCH_ENV = {
+    'ANALYTICS_REFRESH_INTERVAL': '0',
+    'DB_BOOTSTRAP_ON_START': 'False',
+    'GATE_API_KEY': 'benchmark',
+    'METRICS_ENABLED': 'True',
+    'METRICS_TOKEN': 'benchmark',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    'PASSWORD_HASH_WORKERS': '0',
+    'RATE_LIMIT_ENABLED': 'False',
+    'SECRET_KEY': 'benchmark',
+}
+
+
+@contextmanager
+def _environ(values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_app(db_path, config_name):
+    """Create the app on a fresh SQLite file and apply migrations"""
+    from app import create_app
+    from backend.migrations import bootstrap
+    with _environ(dict(BENCH_ENV, DATABASE_URL=f'sqlite:///{db_path}')):
+        app = create_app(config_name)
+    with app.app_context():
+        bootstrap()
+    return app
+
+
+def seed(app, slots, users):
+    """Add benchmark slots and users; returns (slot ids, user emails)"""
+    from backend.extensions import db
+    from backend.models import User, ParkingSlot
+    from backend.provisioning import upsert_slots
+    with app.app_context():
+        upsert_slots({'slot_number': f'B-{i:06d}', 'zone': 'B'} for i in range(slots))
+        template = User(email='template@example.com')
+        template.set_password(PASSWORD)
+        emails = [f'bench{i}@example.com' for i in range(users)]
+        db.session.execute(User.__table__.insert(), [
+            {'email': email, 'password_hash': template.password_hash} for email in emails
+        ])
+        db.session.commit()
+        slot_ids = db.session.execute(
+            db.select(ParkingSlot.id).where(ParkingSlot.slot_number.like('B-%')).order_by(ParkingSlot.id)
+        ).scalars().all()
+    return slot_ids, emails
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, -(-len(sorted_samples) * q // 100))
+    return sorted_samples[int(rank) - 1]
+
+
+def summarize(samples, errors, wall, queries):
+    """Latency percentiles (ms), throughput and queries per request for every path"""
+    paths = {}
+    for path in PATHS:
+        latencies = sorted(samples[path])
+        count = len(latencies)
+        paths[path] = {
+            'requests': count,
+            'errors': errors[path],
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            'requests_per_second': round(count / wall, 1) if wall else 0.0,
+            'queries_per_request': queries.get(path, 0.0),
+        }
+    total = sum(len(latencies) for latencies in samples.values())
+    return {
+        'seconds': round(wall, 3),
+        'requests': total,
+        'requests_per_second': round(total / wall, 1) if wall else 0.0,
+        'paths': paths,
+    }
+
+
+def _queries_per_request():
+    """Mean statements per request for each benchmarked endpoint, from the metrics histograms"""
+    from backend.metrics import request_metrics
+    snapshot = request_metrics.request_queries.snapshot()
+    queries = {}
+    for path, endpoint in PATHS.items():
+        _, total, count = snapshot.get((endpoint,), (None, 0.0, 0))
+        queries[path] = round(total / count, 2) if count else 0.0
+    return queries
+
+
+def _run_cycles(cycles, request, slot_ids, counter, samples, errors, lock):
+    """One client's reserve cycles; request(method, path, data) returns (status, location)"""
+    for _ in range(cycles):
+        results = []
+        
+        def timed(path, method, url, data=None):
+            started = time.perf_counter()
+            status, location = request(method, url, data)
+            results.append((path, time.perf_counter() - started, status >= 400))
+            return status, location
+        
+        timed('list_slots', 'GET', '/slots/')
+        slot_id = slot_ids[next(counter) % len(slot_ids)]
+        _, location = timed('create_reservation', 'POST', '/reservations/create', {'slot_id': slot_id})
+        match = RESERVATION_URL.search(urlsplit(location or '').path)
+        if match is None:
+            # Lost the slot to another client (or the claim failed)
+            results[-1] = results[-1][:2] + (True,)
+        else:
+            timed('view_reservation', 'GET', f'/reservations/{match.group(1)}')
+            timed('checkout_reservation', 'POST', f'/reservations/{match.group(1)}/checkout')
+        with lock:
+            for path, seconds, failed in results:
+                samples[path].append(seconds)
+                errors[path] += failed
+
+
+def _drive(clients, cycles, slot_ids):
+    """Run cycles spread across clients in parallel threads; returns the summary"""
+    from backend.metrics import request_metrics
+    request_metrics.reset()
+    samples = {path: [] for path in PATHS}
+    errors = dict.fromkeys(PATHS, 0)
+    lock = threading.Lock()
+    counter = itertools.count()
+    per_client = [cycles // len(clients) + (i < cycles % len(clients)) for i in range(len(clients))]
+    threads = [
+        threading.Thread(target=_run_cycles, args=(n, client, slot_ids, counter, samples, errors, lock))
+        for client, n in zip(clients, per_client)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return summarize(samples, errors, wall, _queries_per_request())
+
+
+def run_test_client(app, emails, slot_ids, cycles):
+    """Serial cycles in-process through the Flask test client (no network, no concurrency)"""
+    client = app.test_client()
+    response = client.post('/auth/login', data={'email': emails[0], 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'Benchmark login failed with {response.status_code}')
+    
+    def request(method, url, data):
+        response = client.open(url, method=method, data=data)
+        return response.status_code, response.headers.get('Location')
+    
+    return _drive([request], cycles, slot_ids)
+
+
+class HTTPClient:
+    """Keep-alive connection with a minimal cookie jar"""
+    
+    def __init__(self, host, port):
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookies = SimpleCookie()
+    
+    def __call__(self, method, url, data=None):
+        headers = {}
+        body = None
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.connection.request(method, url, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        return response.status, response.headers.get('Location')
+    
+    def close(self):
+        self.connection.close()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """No per-request access log lines"""
+    
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def run_http(app, emails, slot_ids, cycles, threads):
+    """Concurrent cycles over real HTTP against a threaded local server"""
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    clients = []
+    try:
+        for i in range(threads):
+            client = HTTPClient('127.0.0.1', server.server_port)
+            status, _ = client('POST', '/auth/login', {'email': emails[i % len(emails)], 'password': PASSWORD})
+            if status != 302:
+                raise RuntimeError(f'Benchmark login failed with {status}')
+            clients.append(client)
+        result = _drive(clients, cycles, slot_ids)
+        result['threads'] = threads
+        return result
+    finally:
+        for client in clients:
+            client.close()
+        server.shutdown()
+        server_thread.join()
+
+
+def compare(result, baseline, threshold, min_delta_ms):
+    """
+    Regressions of result against baseline
+    
+    A path regresses when its p95 grew by more than threshold (a fraction)
+    and by at least min_delta_ms, or when it issues more queries per request.
+    
+    Returns:
+        List of human-readable regression descriptions (empty if none)
+    """
+    regressions = []
+    for mode, current in result['modes'].items():
+        previous = baseline.get('modes', {}).get(mode)
+        if previous is None:
+            continue
+        for path, now in current['paths'].items():
+            before = previous['paths'].get(path)
+            if before is None:
+                continue
+            p95, old_p95 = now['p95_ms'], before['p95_ms']
+            if p95 > old_p95 * (1 + threshold) and p95 - old_p95 >= min_delta_ms:
+                regressions.append(f'{mode} {path}: p95 {old_p95:.2f}ms -> {p95:.2f}ms')
+            if now['queries_per_request'] > before['queries_per_request'] + 0.5:
+                regressions.append(f'{mode} {path}: queries/request '
+                                   f'{before["queries_per_request"]} -> {now["queries_per_request"]}')
+    return regressions
+
+
+def run(args):
+    """Seed, run every requested mode and return the JSON-ready result"""
+    with tempfile.TemporaryDirectory(prefix='parking-bench-') as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'), args.config)
+        slot_ids, emails = seed(app, args.slots, args.users)
+        modes = {'test_client': run_test_client(app, emails, slot_ids, args.cycles)}
+        if args.http:
+            modes['http'] = run_http(app, emails, slot_ids, args.cycles, args.threads)
+        with app.app_context():
+            from backend.extensions import db
+            db.engine.dispose()
+    return {
+        'config': args.config,
+        'slots': args.slots,
+        'users': args.users,
+        'cycles': args.cycles,
+        'modes': modes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', default='production', help='App config profile')
+    parser.add_argument('--slots', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--cycles', type=int, default=200,
+                        help='Reserve cycles (list, create, view, checkout) per mode')
+    parser.add_argument('--http', action='store_true', help='Also run over HTTP with concurrent clients')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent HTTP clients')
+    parser.add_argument('--output', help='Also write the JSON result to this file')
+    parser.add_argument('--baseline', help='Earlier JSON result to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed p95 growth as a fraction of the baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Ignore p95 growth smaller than this (timer noise)')
+    args = parser.parse_args(argv)
+    
+    result = run(args)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Shared fixtures: a testing app with one registered user, a client logged in as that user, and SQL counting"""
+
+import pytest
+from sqlalchemy import event
+from app import create_app
+from backend.extensions import db
+from backend.metrics import request_metrics
+from backend.models import User
+
+
+@pytest.fixture
+def app_env():
+    """Environment overrides applied before the app is created; override in a test module to change them"""
+    return {}
+
+
+@pytest.fixture
+def credentials():
+    """Login form data of the registered user"""
+    return {'email': 'driver@example.com', 'password': 'password1'}
+
+
+@pytest.fixture
+def app(app_env, credentials, monkeypatch):
+    for name, value in app_env.items():
+        monkeypatch.setenv(name, value)
+    app = create_app('testing')
+    with app.app_context():
+        user = User(email=credentials['email'])
+        user.set_password(credentials['password'])
+        db.session.add(user)
+        db.session.commit()
+    request_metrics.reset()
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def user_id(app, credentials):
+    with app.app_context():
+        return User.query.filter_by(email=credentials['email']).one().id
+
+
+@pytest.fixture
+def client(app, credentials):
+    client = app.test_client()
+    client.post('/auth/login', data=credentials)
+    return client
+
+
+@pytest.fixture
+def count_statements(client):
+    """get(path) -> (SQL statements the request ran on the default engine, response); asserts a 200"""
+    def get(path):
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        with client.application.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = client.get(path)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        assert response.status_code == 200
+        return len(statements), response
+    return get
@@ -0,0 +1,32 @@
+"""Gunicorn settings for the production profile; every value can be overridden by env"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers: requests mostly wait on SQLite/QR I/O, so threads overlap well
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# In-process rate-limit buckets take their share of the limits per worker
+os.environ.setdefault('RATE_LIMIT_WORKERS', str(workers))
+
+# Each live-event stream parks a thread for as long as it is open, so a
+# threaded worker holds one stream and leaves its other threads to ordinary
+# requests; further slot pages get a 503 and poll the slot API instead.
+# Serve the stream from gevent workers (gunicorn_events.conf.py) to hold
+# thousands of them.
+if worker_class == 'gthread':
+    os.environ.setdefault('SLOT_EVENTS_MAX_SUBSCRIBERS', '1')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,21 @@
+"""Gunicorn settings for the live-event stream process; every value can be overridden by env
+
+Run next to the web workers (`gunicorn -c gunicorn_events.conf.py wsgi:app`)
+and route /api/v1/slots/events to it at the reverse proxy. Streams of every
+process read the same event log, so clients may reconnect to either.
+"""
+import os
+
+bind = os.environ.get('EVENTS_BIND', '0.0.0.0:5001')
+
+# Cooperative workers: an open stream is a parked greenlet, not a thread
+workers = int(os.environ.get('EVENTS_WORKERS', 2))
+worker_class = os.environ.get('EVENTS_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('EVENTS_WORKER_CONNECTIONS', 2000))
+
+# Streams never finish on their own; do not hold up restarts waiting for them
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('EVENTS_GRACEFUL_TIMEOUT', 5))
+
+accesslog = '-'
+errorlog = '-'
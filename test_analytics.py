@@ -0,0 +1,157 @@
+"""Occupancy analytics: sweep-line peaks, hourly utilization and the rollup cache"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+import pytest
+from app import create_app
+from backend import analytics
+from backend.analytics import (compute_rollups, occupancy_report, refresh_rollups, slot_utilization,
+                               RollupRefresher, ALL_ZONES)
+from backend.extensions import db
+from backend.models import OccupancyRollup, ParkingSlot, ReservationHistory, User
+
+
+DAY = date(2025, 3, 1)
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.session.add_all([ParkingSlot(slot_number='Z-1', zone='Z'), ParkingSlot(slot_number='Z-2', zone='Z'),
+                            ParkingSlot(slot_number='Y-1', zone='Y')])
+        db.session.commit()
+        yield app
+
+
+def _slot(number):
+    return ParkingSlot.query.filter_by(slot_number=number).one().id
+
+
+def _history(rows):
+    at = datetime(DAY.year, DAY.month, DAY.day)
+    db.session.add_all(
+        ReservationHistory(id=i + 1, user_id=1, slot_id=_slot(number), status='checked_out',
+                           reserved_at=at + timedelta(minutes=start), checked_out_at=at + timedelta(minutes=end))
+        for i, (number, start, end) in enumerate(rows)
+    )
+    db.session.commit()
+
+
+def _row(rows, zone, hour):
+    return next(row for row in rows if row.zone == zone and row.hour == hour)
+
+
+def test_hourly_rollups(app):
+    _history([
+        ('Z-1', 9 * 60, 11 * 60),         # 09:00-11:00
+        ('Z-2', 10 * 60 + 30, 10 * 60 + 45),  # 10:30-10:45, overlaps the first
+        ('Z-2', 11 * 60, 12 * 60),        # back-to-back with the first: no overlap
+        ('Y-1', -60, 30),                 # started the day before
+    ])
+    rows = compute_rollups(DAY, DAY + timedelta(days=1))
+    
+    assert _row(rows, 'Z', 9).occupied_seconds == 3600
+    assert _row(rows, 'Z', 10).occupied_seconds == 3600 + 900
+    assert _row(rows, 'Z', 10).peak_occupancy == 2
+    assert _row(rows, 'Z', 11).peak_occupancy == 1
+    assert _row(rows, 'Z', 9).arrivals == 1 and _row(rows, 'Z', 9).dwell_seconds == 7200
+    assert _row(rows, 'Y', 0).occupied_seconds == 1800
+    assert _row(rows, 'Y', 0).arrivals == 0
+    assert _row(rows, ALL_ZONES, 10).peak_occupancy == 2
+    assert _row(rows, ALL_ZONES, 10).capacity == ParkingSlot.query.count()
+    
+    assert slot_utilization(DAY, DAY + timedelta(days=1))[0] == ('Z-1', round(2 / 24, 4))
+
+
+def test_rollups_are_cached(app):
+    _history([('Z-1', 60, 120)])
+    assert refresh_rollups(DAY, DAY + timedelta(days=2)) == 2
+    assert refresh_rollups(DAY, DAY + timedelta(days=2)) == 0
+    assert OccupancyRollup.query.filter_by(day=DAY, zone='Z', hour=1).one().occupied_seconds == 3600
+    
+    report = occupancy_report(DAY, DAY + timedelta(days=1), zone='Z')
+    assert report['zones']['Z']['peak_occupancy'] == 1
+    assert report['zones']['Z']['avg_dwell_minutes'] == 60
+
+
+def test_today_is_recomputed_until_it_ends(app):
+    today = datetime.utcnow().date()
+    yesterday = today - timedelta(days=1)
+    assert refresh_rollups(today, today + timedelta(days=3)) == 1  # later days are left out
+    assert refresh_rollups(today, today + timedelta(days=1)) == 1
+    
+    # Stored while it was still today: one more pass after midnight, then final
+    assert refresh_rollups(yesterday, today) == 1
+    OccupancyRollup.query.filter_by(day=yesterday).update(
+        {'computed_at': datetime(today.year, today.month, today.day) - timedelta(minutes=1)})
+    db.session.commit()
+    assert refresh_rollups(yesterday, today) == 1
+    assert refresh_rollups(yesterday, today) == 0
+
+
+def test_report_request_reads_stored_rollups_only(app, monkeypatch):
+    _history([('Z-1', 60, 120)])
+    refresh_rollups(DAY, DAY + timedelta(days=1))
+    user = User(email='analyst@example.com')
+    user.set_password('password1')
+    db.session.add(user)
+    db.session.commit()
+    
+    def compute(*args, **kwargs):
+        raise AssertionError('rollups computed during a request')
+    monkeypatch.setattr(analytics, 'compute_rollups', compute)
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'analyst@example.com', 'password': 'password1'})
+    response = client.get(f'/api/v1/analytics/occupancy?start={DAY}&end={DAY + timedelta(days=2)}&zone=Z')
+    
+    assert response.status_code == 200
+    assert response.get_json()['zones']['Z']['arrivals'] == 1
+    # The second day was never refreshed, so it is missing rather than computed
+    assert [point['day'] for point in response.get_json()['series']] == [DAY.isoformat()]
+
+
+def test_one_refresh_at_a_time(app, monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+    
+    def refresh(*args, **kwargs):
+        started.set()
+        finish.wait(5)
+        return 1
+    monkeypatch.setattr(analytics, 'refresh_rollups', refresh)
+    refresher = RollupRefresher()
+    worker = threading.Thread(target=refresher.refresh, args=(DAY, DAY + timedelta(days=1)))
+    worker.start()
+    assert started.wait(5)
+    
+    assert refresher.refresh(DAY, DAY + timedelta(days=1)) is None
+    finish.set()
+    worker.join()
+    assert refresher.skipped == 1
+    assert refresher.refresh(DAY, DAY + timedelta(days=1)) == 1
+
+
+def test_year_of_bookings_is_fast(app):
+    rng = np.random.default_rng(7)
+    count = 50000
+    slots = [_slot('Z-1'), _slot('Z-2'), _slot('Y-1')]
+    starts = rng.integers(0, 365 * 24 * 60, count)
+    lengths = rng.integers(10, 600, count)
+    origin = datetime(DAY.year, DAY.month, DAY.day)
+    db.session.execute(ReservationHistory.__table__.insert(), [
+        {'id': i + 1, 'user_id': 1, 'slot_id': slots[i % 3], 'status': 'checked_out', 'archived_at': origin,
+         'reserved_at': origin + timedelta(minutes=int(s)), 'checked_out_at': origin + timedelta(minutes=int(s + n))}
+        for i, (s, n) in enumerate(zip(starts, lengths))
+    ])
+    db.session.commit()
+    
+    started = time.perf_counter()
+    rows = compute_rollups(DAY, DAY + timedelta(days=365))
+    elapsed = time.perf_counter() - started
+    
+    total = sum(row.occupied_seconds for row in rows if row.zone == ALL_ZONES)
+    expected = sum(min(int(s + n), 365 * 24 * 60) - int(s) for s, n in zip(starts, lengths)) * 60
+    assert total == expected
+    assert elapsed < 5, f'{elapsed:.2f}s for {count} bookings'
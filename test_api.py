@@ -0,0 +1,126 @@
+"""JSON API contract: reservation create/checkout, input errors, ownership, and conditional GETs"""
+
+import pytest
+from backend.extensions import db
+from backend.models import ParkingSlot, User
+
+
+@pytest.fixture
+def other_client(app):
+    """A second logged-in user"""
+    with app.app_context():
+        user = User(email='other@example.com')
+        user.set_password('password2')
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'other@example.com', 'password': 'password2'})
+    return client
+
+
+def _free_slot_id(app):
+    with app.app_context():
+        return ParkingSlot.query.filter_by(is_available=True).order_by(ParkingSlot.id).first().id
+
+
+def test_create_and_checkout(client):
+    slot_id = _free_slot_id(client.application)
+    response = client.post('/api/v1/reservations', json={'slot_id': slot_id})
+    assert response.status_code == 201
+    created = response.get_json()
+    assert created['slot_id'] == slot_id and created['status'] == 'active' and created['qr_payload']
+    
+    taken = client.post('/api/v1/reservations', json={'slot_id': slot_id})
+    assert taken.status_code == 409 and 'already reserved' in taken.get_json()['error']
+    
+    assert client.get(f"/api/v1/reservations/{created['id']}").get_json() == created
+    response = client.post(f"/api/v1/reservations/{created['id']}/checkout")
+    assert response.status_code == 200
+    assert response.get_json() == {'id': created['id'], 'slot_id': slot_id, 'checked_out': True}
+    
+    again = client.post(f"/api/v1/reservations/{created['id']}/checkout")
+    assert again.status_code == 409 and 'error' in again.get_json()
+    assert client.post('/api/v1/reservations', json={'slot_id': slot_id}).status_code == 201
+
+
+@pytest.mark.parametrize('body', [
+    {}, {'slot_id': None}, {'slot_id': '1'}, {'slot_id': 1.0}, {'slot_id': True}, {'slot_id': False},
+    {'slot_id': 0}, {'slot_id': -1}, {'slot_id': 2 ** 31}, {'slot_id': 10 ** 30},
+])
+def test_bad_slot_id_is_rejected(client, body):
+    response = client.post('/api/v1/reservations', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'slot_id must be a positive integer, or pass "any": true'}
+
+
+def test_bad_requests_get_json_errors(client):
+    slot_id = _free_slot_id(client.application)
+    response = client.post('/api/v1/reservations', data='{not json', content_type='application/json')
+    assert response.status_code == 400 and 'error' in response.get_json()
+    
+    for body in ([slot_id], 'slot_id'):
+        response = client.post('/api/v1/reservations', json=body)
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Request body must be a JSON object'}
+    
+    response = client.post('/api/v1/reservations', json={'slot_id': slot_id, 'start_at': 'tomorrow'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'start_at and end_at must be ISO 8601 timestamps'}
+    
+    response = client.post('/api/v1/reservations', json={'slot_id': 1_000_000})
+    assert response.status_code == 404 and response.get_json() == {'error': 'Slot not found'}
+    
+    for path in ['/api/v1/reservations/1000000', '/api/v1/reservations/99999999999999999999']:
+        response = client.get(path)
+        assert response.status_code == 404 and response.get_json() == {'error': 'Reservation not found'}
+        assert client.post(f'{path}/checkout').status_code == 404
+
+
+def test_login_is_required(app):
+    response = app.test_client().get('/api/v1/reservations')
+    assert response.status_code == 401 and response.get_json() == {'error': 'Authentication required'}
+
+
+def test_reservations_are_private_to_their_owner(client, other_client):
+    created = client.post('/api/v1/reservations', json={'any': True}).get_json()
+    path = f"/api/v1/reservations/{created['id']}"
+    
+    assert other_client.get(path).status_code == 404
+    assert other_client.post(f'{path}/checkout').status_code == 404
+    assert other_client.get('/api/v1/reservations').get_json()['reservations'] == []
+    
+    assert client.get(path).status_code == 200
+    assert [r['id'] for r in client.get('/api/v1/reservations').get_json()['reservations']] == [created['id']]
+    assert client.post(f'{path}/checkout').status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/api/v1/slots', '/api/v1/slots/availability', '/api/v1/reservations'])
+def test_matching_if_none_match_gets_empty_304(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    
+    again = client.get(path, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+    
+    stale = client.get(path, headers={'If-None-Match': '"not-the-etag"'})
+    assert stale.status_code == 200
+    assert stale.get_json() == first.get_json()
+
+
+def test_etag_changes_when_the_data_does(client):
+    etag = client.get('/api/v1/slots/availability').headers['ETag']
+    assert client.post('/api/v1/reservations', json={'any': True}).status_code == 201
+    
+    response = client.get('/api/v1/slots/availability', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    
+    reservation_id = client.get('/api/v1/reservations').get_json()['reservations'][0]['id']
+    path = f'/api/v1/reservations/{reservation_id}'
+    etag = client.get(path).headers['ETag']
+    client.post(f'{path}/checkout')
+    assert client.get(path, headers={'If-None-Match': etag}).status_code == 200
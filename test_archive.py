@@ -0,0 +1,43 @@
+"""Reservation lifecycle: checkout keeps the row, archive moves it to history"""
+
+import pytest
+from app import create_app
+from backend.archive import archive_completed
+from backend.extensions import db
+from backend.models import User, ParkingSlot, Reservation, ReservationHistory, RESERVATION_CHECKED_OUT
+from backend.reservation_service import reserve_slot, checkout, ReservationClosedError
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        user = User(email='driver@example.com')
+        user.set_password('password1')
+        db.session.add_all([user, ParkingSlot(slot_number='H-01')])
+        db.session.commit()
+        yield app
+
+
+def test_checkout_then_archive(app):
+    user_id = User.query.one().id
+    slot_id = ParkingSlot.query.filter_by(slot_number='H-01').one().id
+    
+    first_id = reserve_slot(slot_id, user_id).id
+    checkout(db.session.get(Reservation, first_id))
+    closed = db.session.get(Reservation, first_id)
+    assert closed.status == RESERVATION_CHECKED_OUT
+    assert closed.checked_out_at is not None
+    assert db.session.get(ParkingSlot, slot_id).is_available
+    
+    with pytest.raises(ReservationClosedError):
+        checkout(closed)
+    
+    # The partial unique index only covers active rows, so the slot can be rebooked
+    second_id = reserve_slot(slot_id, user_id).id
+    
+    assert archive_completed(batch_size=1) == 1
+    assert [r.id for r in Reservation.query.all()] == [second_id]
+    history = ReservationHistory.query.one()
+    assert (history.id, history.slot_id, history.status) == (first_id, slot_id, RESERVATION_CHECKED_OUT)
+    assert archive_completed() == 0
@@ -0,0 +1,56 @@
+"""Fingerprinted, precompressed static assets"""
+
+import gzip
+import shutil
+import pytest
+from app import create_app
+from backend.assets import brotli, build_assets, static_assets
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app('testing')
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns('dist'))
+    manifest = build_assets(str(static))
+    static_assets.dist = str(static / 'dist')
+    static_assets.load()
+    client = app.test_client()
+    client.manifest = manifest
+    client.css = (static / 'style.css').read_bytes()
+    return client
+
+
+def test_pages_link_hashed_assets_served_immutable_and_precompressed(client):
+    hashed = client.manifest['style.css']['file']
+    assert hashed != 'style.css' and hashed.startswith('style.')
+    assert f'/assets/{hashed}'.encode() in client.get('/auth/login').data
+    
+    response = client.get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    assert gzip.decompress(response.data) == client.css
+    assert len(response.data) < len(client.css) / 3
+    
+    if brotli is not None:
+        response = client.get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data) == client.css
+    
+    response = client.get(f'/assets/{hashed}')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == client.css
+    
+    assert client.get('/assets/style.css').status_code == 404
+
+
+def test_build_is_reproducible_and_unbuilt_assets_fall_back(client, tmp_path):
+    assert build_assets(str(tmp_path / 'static')) == client.manifest
+    
+    static_assets.dist = str(tmp_path / 'missing')
+    static_assets.load()
+    assert b'/static/style.css' in client.get('/auth/login').data
@@ -0,0 +1,22 @@
+"""Login and registration when the password-hash pool is saturated"""
+
+from concurrent.futures import TimeoutError
+from backend.hashing import password_hasher
+
+
+def test_login_hash_timeout_returns_503(app, credentials, monkeypatch):
+    client = app.test_client()
+    
+    def timed_out(*args):
+        raise TimeoutError()
+    
+    monkeypatch.setattr(password_hasher, 'verify', timed_out)
+    response = client.post('/auth/login', data=credentials)
+    assert response.status_code == 503
+    assert b'The server is busy' in response.data
+    
+    monkeypatch.setattr(password_hasher, 'hash', timed_out)
+    response = client.post('/auth/register', data={
+        'email': 'new@example.com', 'password': 'password1', 'password_confirm': 'password1'
+    }, follow_redirects=True)
+    assert b'The server is busy' in response.data
@@ -0,0 +1,43 @@
+"""Route benchmark harness: JSON shape and baseline regression check"""
+
+import copy
+import json
+from benchmarks import claims
+from benchmarks.routes import PATHS, compare, main
+
+
+def test_benchmark_reports_every_path_and_flags_regressions(tmp_path, capsys):
+    output = tmp_path / 'baseline.json'
+    args = ['--slots', '50', '--users', '2', '--cycles', '6', '--http', '--threads', '2']
+    assert main(args + ['--output', str(output)]) == 0
+    capsys.readouterr()
+    
+    baseline = json.loads(output.read_text())
+    assert set(baseline['modes']) == {'test_client', 'http'}
+    for mode in baseline['modes'].values():
+        assert mode['requests'] == 6 * len(PATHS)
+        for path in PATHS:
+            stats = mode['paths'][path]
+            assert stats['errors'] == 0
+            assert 0 < stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms']
+            assert stats['queries_per_request'] >= 1
+    
+    assert compare(baseline, baseline, threshold=0.25, min_delta_ms=1.0) == []
+    slower = copy.deepcopy(baseline)
+    slower['modes']['test_client']['paths']['view_reservation']['p95_ms'] += 50
+    slower['modes']['http']['paths']['list_slots']['queries_per_request'] += 1
+    regressions = compare(slower, baseline, threshold=0.25, min_delta_ms=1.0)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('test_client view_reservation: p95')
+
+
+def test_claim_benchmark_wins_every_free_slot_once(tmp_path, capsys):
+    output = tmp_path / 'claims.json'
+    assert claims.main(['--slots', '20', '--users', '4', '--threads', '4', '--attempts', '15',
+                        '--output', str(output)]) == 0
+    capsys.readouterr()
+    
+    result = json.loads(output.read_text())
+    assert result['attempts'] == 4 * 15 == result['wins'] + result['lost_races']
+    assert result['wins'] == result['free_slots'] and result['double_booked'] == 0
+    assert result['attempts_per_second'] > 0
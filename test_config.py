@@ -0,0 +1,108 @@
+"""Configuration profiles, environment overrides, engine tuning and the production guard"""
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from app import create_app
+from backend.config import Config, check_production_config, load_config
+from backend.extensions import db
+
+
+PRODUCTION_SECRETS = {'SECRET_KEY': 'a-private-value', 'METRICS_TOKEN': 'scraper', 'GATE_API_KEY': 'gate-secret'}
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ('APP_CONFIG', 'SECRET_KEY', 'METRICS_TOKEN', 'METRICS_ENABLED', 'GATE_API_KEY', 'DATABASE_URL'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def _load(config_name=None, **env):
+    app = Flask(__name__)
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in env.items():
+            mp.setenv(name, value)
+        name = load_config(app, config_name)
+    return name, app.config
+
+
+def test_profile_comes_from_argument_then_app_config_then_default():
+    assert _load('testing')[0] == 'testing'
+    assert _load(APP_CONFIG='testing')[0] == 'testing'
+    assert _load('testing', APP_CONFIG='development')[0] == 'testing'
+    
+    name, cfg = _load()
+    assert name == 'development' and cfg['DEBUG'] and cfg['DB_BOOTSTRAP_ON_START']
+    
+    name, cfg = _load(APP_CONFIG='production', **PRODUCTION_SECRETS)
+    assert name == 'production' and not cfg['DEBUG'] and not cfg['DB_BOOTSTRAP_ON_START']
+    assert cfg['SQLITE_PRAGMAS']['journal_mode'] == 'WAL'
+    
+    with pytest.raises(ValueError, match='Unknown config'):
+        _load('staging')
+
+
+def test_environment_overrides_are_coerced():
+    _, cfg = _load('testing', DB_POOL_SIZE='7', SLOT_EVENTS_POLL_INTERVAL='0.25', IDENTITY_IN_SESSION='True',
+                   METRICS_ENABLED='yes', QR_CACHE_DIR='/tmp/qr', FACILITY_DATABASES='north=sqlite:///n.db, east=sqlite://')
+    assert cfg['DB_POOL_SIZE'] == 7
+    assert cfg['SLOT_EVENTS_POLL_INTERVAL'] == 0.25
+    assert cfg['IDENTITY_IN_SESSION'] is True
+    # Booleans are on only for the exact string 'True'
+    assert cfg['METRICS_ENABLED'] is False
+    assert cfg['QR_CACHE_DIR'] == '/tmp/qr'
+    assert cfg['FACILITY_BINDS'] == {'north': 'sqlite:///n.db', 'east': 'sqlite://'}
+    assert cfg['SQLALCHEMY_BINDS']['north']['url'] == 'sqlite:///n.db'
+    
+    with pytest.raises(ValueError):
+        _load('testing', DB_POOL_SIZE='many')
+    with pytest.raises(ValueError, match='Invalid facility name'):
+        _load('testing', FACILITY_DATABASES='main=sqlite:///other.db')
+
+
+def test_engine_options_per_database():
+    _, cfg = _load('testing')
+    assert cfg['SQLALCHEMY_ENGINE_OPTIONS'] == {}  # in-memory SQLite keeps its single connection
+    
+    _, cfg = _load('testing', DATABASE_URL='postgresql://db/parking', DB_POOL_TIMEOUT='3')
+    assert cfg['SQLALCHEMY_ENGINE_OPTIONS'] == {
+        'pool_size': 5, 'max_overflow': 10, 'pool_recycle': 1800, 'pool_timeout': 3, 'pool_pre_ping': True,
+    }
+
+
+def test_production_engine_gets_pool_settings_and_pragmas(tmp_path, monkeypatch):
+    for name, value in {**PRODUCTION_SECRETS, 'DATABASE_URL': f"sqlite:///{tmp_path / 'prod.db'}",
+                        'DB_POOL_SIZE': '3', 'DB_MAX_OVERFLOW': '2', 'DB_POOL_RECYCLE': '60'}.items():
+        monkeypatch.setenv(name, value)
+    app = create_app('production')
+    with app.app_context():
+        pool = db.engine.pool
+        assert (pool.size(), pool._max_overflow, pool._recycle, pool._timeout) == (3, 2, 60, 30)
+        with db.engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        db.engine.dispose()
+
+
+@pytest.mark.parametrize('missing, message', [
+    ({'SECRET_KEY': None}, 'SECRET_KEY'),
+    ({'SECRET_KEY': ''}, 'SECRET_KEY'),
+    ({'SECRET_KEY': Config.SECRET_KEY}, 'SECRET_KEY'),
+    ({'METRICS_TOKEN': None}, 'METRICS_TOKEN'),
+    ({'GATE_API_KEY': None}, 'GATE_API_KEY'),
+    ({'GATE_API_KEY': ''}, 'GATE_API_KEY'),
+])
+def test_production_guard_refuses_missing_secrets(missing, message):
+    cfg = {**PRODUCTION_SECRETS, 'METRICS_ENABLED': True, **missing}
+    with pytest.raises(ValueError, match=message):
+        check_production_config(cfg)
+    
+    with pytest.raises(ValueError, match=message):
+        _load('production', **{k: v for k, v in {**PRODUCTION_SECRETS, **missing}.items() if v is not None})
+
+
+def test_production_guard_accepts_complete_settings():
+    check_production_config({**PRODUCTION_SECRETS, 'METRICS_ENABLED': True})
+    check_production_config({'SECRET_KEY': 'a-private-value', 'GATE_API_KEY': 'gate-secret', 'METRICS_ENABLED': False})
+    _load('production', **PRODUCTION_SECRETS)
@@ -0,0 +1,155 @@
+"""Live slot events through the shared event log: delivery across processes and resume by Last-Event-ID"""
+
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import pytest
+from sqlalchemy import update
+from backend.availability import availability_index
+from backend.events import slot_events
+from backend.extensions import db
+from backend.models import ParkingSlot
+
+
+# Claims every given slot, then checks the last one out, in a separate process
+WORKER = '''
+import sys
+from app import create_app
+from backend.models import User
+from backend.reservation_service import checkout, reserve_slot
+
+app = create_app('testing')
+with app.app_context():
+    user_id = User.query.filter_by(email=sys.argv[1]).one().id
+    for slot_id in sys.argv[2].split(','):
+        reservation = reserve_slot(int(slot_id), user_id)
+    checkout(reservation)
+'''
+
+
+@pytest.fixture
+def app_env(tmp_path):
+    return {
+        'DATABASE_URL': f"sqlite:///{tmp_path / 'events.db'}",
+        'SLOT_EVENTS_HISTORY': '4',
+        'SLOT_EVENTS_POLL_INTERVAL': '0.05',
+        'SLOT_EVENTS_HEARTBEAT': '1',
+    }
+
+
+@pytest.fixture
+def free_slots(app):
+    with app.app_context():
+        return [s.id for s in ParkingSlot.query.filter_by(is_available=True).order_by(ParkingSlot.id).limit(6)]
+
+
+def _other_worker(credentials, slot_ids):
+    subprocess.run([sys.executable, '-c', WORKER, credentials['email'], ','.join(map(str, slot_ids))],
+                   check=True, env=dict(os.environ), cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def _open(client, last_event_id=None):
+    headers = {'Last-Event-ID': str(last_event_id)} if last_event_id is not None else {}
+    response = client.get('/api/v1/slots/events', headers=headers, buffered=False)
+    assert response.status_code == 200
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n\n'
+    return response, chunks
+
+
+def _read(chunks, count):
+    """The next `count` events as (event, seq, data), skipping keepalives"""
+    events = []
+    for _ in range(count + 20):
+        for block in next(chunks).decode().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if fields:
+                events.append((fields['event'], int(fields['id']), json.loads(fields['data'])))
+        if len(events) >= count:
+            return events
+    raise AssertionError(f'Got only {events}')
+
+
+def test_events_from_another_process_reach_open_streams(client, credentials, free_slots):
+    response, chunks = _open(client)
+    assert _read(chunks, 1) == [('hello', 0, {'seq': 0})]
+    
+    first, second = free_slots[:2]
+    _other_worker(credentials, [first, second])
+    try:
+        events = _read(chunks, 3)
+    finally:
+        response.close()
+    assert [(seq, data['slot_id'], data['available']) for _, seq, data in events] == [
+        (1, first, False), (2, second, False), (3, second, True),
+    ]
+
+
+def test_resume_from_last_event_id_after_another_process_published(client, credentials, free_slots, tmp_path):
+    _other_worker(credentials, free_slots[:3])  # seq 1-4
+    
+    response, chunks = _open(client, last_event_id=2)
+    try:
+        events = _read(chunks, 2)
+    finally:
+        response.close()
+    assert [(event, seq) for event, seq, _ in events] == [('slot', 3), ('slot', 4)]
+    
+    # Four more events: the log keeps the newest SLOT_EVENTS_HISTORY, so seq 2 is gone
+    _other_worker(credentials, free_slots[3:6])  # seq 5-8
+    conn = sqlite3.connect(tmp_path / 'events.db')
+    try:
+        assert [seq for seq, in conn.execute('SELECT seq FROM slot_event_log ORDER BY seq')] == [5, 6, 7, 8]
+    finally:
+        conn.close()
+    
+    response, chunks = _open(client, last_event_id=2)
+    try:
+        assert _read(chunks, 1) == [('reset', 8, {'seq': 8})]
+    finally:
+        response.close()
+    
+    response, chunks = _open(client, last_event_id=6)
+    try:
+        assert [seq for _, seq, _ in _read(chunks, 2)] == [7, 8]
+    finally:
+        response.close()
+
+
+def test_threaded_workers_cap_open_streams(client):
+    slot_events.max_subscribers = 1
+    response, _ = _open(client)
+    try:
+        busy = client.get('/api/v1/slots/events')
+        assert busy.status_code == 503 and busy.headers['Retry-After'] == '5'
+    finally:
+        response.close()
+    response, _ = _open(client)
+    response.close()
+
+
+def test_slots_page_renders_links_for_live_updates_and_a_poll_url(client, free_slots):
+    mine, taken = free_slots[:2]
+    client.post('/api/v1/reservations', json={'slot_id': mine})
+    with client.application.app_context():
+        db.session.execute(update(ParkingSlot).where(ParkingSlot.id == taken).values(is_available=False))
+        db.session.commit()
+        availability_index.load()
+    
+    # Reserved cards carry a hidden Reserve Now link for when the slot frees up
+    html = client.get('/slots/?zone=A').get_data(as_text=True)
+    cards = {int(slot_id): card for slot_id, card in re.findall(r'data-slot-id="(\d+)">(.*?)</div>\s*</div>', html, re.S)}
+    assert 'btn-reserve" style="display: none"' in cards[taken] and 'btn-checkout' not in cards[taken]
+    assert 'btn-reserve" style="display: none"' in cards[mine] and 'btn-checkout' in cards[mine]
+    assert 'btn-reserve">' in cards[free_slots[2]]
+    
+    # Pages past the stream cap poll the same listing through the API
+    html = client.get('/slots/available?zone=A&limit=5').get_data(as_text=True)
+    poll_url = re.search(r'const POLL_URL = "([^"]+)"', html).group(1)
+    assert poll_url.startswith('/api/v1/slots?') and 'available=1' in poll_url and 'zone=A' in poll_url
+    page = client.get(poll_url).get_json()
+    assert [slot['id'] for slot in page['slots']][:4] == free_slots[2:6]
+    assert len(page['slots']) == 5 and all(slot['is_available'] for slot in page['slots'])
@@ -0,0 +1,102 @@
+"""Expiry scheduler: batched release of overdue reservations under a lease"""
+
+import time
+from datetime import datetime, timedelta
+import pytest
+from app import create_app
+from backend.availability import availability_index
+from backend.expiry import ExpiryScheduler, release_overdue
+from backend.extensions import db
+from backend.leases import acquire_lease
+from backend.models import User, ParkingSlot, Reservation
+from backend.reservation_service import reserve_slot
+
+
+COUNT = 3000
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.session.add(User(email='late@example.com', password_hash='x'))
+        db.session.add_all(ParkingSlot(slot_number=f'E-{i:05d}', is_available=False) for i in range(COUNT))
+        db.session.commit()
+        yield app
+
+
+def _overdue(count, minutes=5):
+    user_id = User.query.filter_by(email='late@example.com').one().id
+    slot_ids = [s.id for s in ParkingSlot.query.filter(ParkingSlot.slot_number.like('E-%')).limit(count)]
+    deadline = datetime.utcnow() - timedelta(minutes=minutes)
+    db.session.execute(Reservation.__table__.insert(), [
+        {'user_id': user_id, 'slot_id': slot_id, 'reserved_at': deadline - timedelta(hours=24),
+         'expires_at': deadline, 'status': 'active'}
+        for slot_id in slot_ids
+    ])
+    db.session.commit()
+    return slot_ids
+
+
+def test_scheduler_releases_overdue_in_batches(app):
+    slot_ids = _overdue(COUNT)
+    availability_index.load()
+    scheduler = ExpiryScheduler()
+    
+    started = time.perf_counter()
+    released = scheduler.tick()
+    elapsed = time.perf_counter() - started
+    
+    assert released == COUNT
+    assert scheduler.is_leader and scheduler.batches == COUNT // scheduler.batch_size
+    assert scheduler.stats()['max_lag_seconds'] >= 300
+    assert ParkingSlot.query.filter(ParkingSlot.id.in_(slot_ids), ParkingSlot.is_available.is_(False)).count() == 0
+    assert Reservation.query.filter_by(status='expired').count() == COUNT
+    assert availability_index.is_free(slot_ids[0])
+    assert COUNT / elapsed > 1000, f'{COUNT / elapsed:.0f} expiries/s'
+    
+    # Another worker cannot take over while the lease is held
+    other = ExpiryScheduler()
+    assert other.tick() == 0 and not other.is_leader
+
+
+def test_expiry_skips_checked_out_and_reclaimed_slots(app):
+    slot_id = _overdue(1)[0]
+    user_id = User.query.filter_by(email='late@example.com').one().id
+    
+    # The driver checked out and someone else claimed the slot before the sweep ran
+    Reservation.query.filter_by(slot_id=slot_id).update({'status': 'checked_out'})
+    db.session.get(ParkingSlot, slot_id).is_available = True
+    db.session.commit()
+    reserve_slot(slot_id, user_id)
+    
+    assert release_overdue() == 0
+    assert not db.session.get(ParkingSlot, slot_id).is_available
+
+
+def test_lease_takeover_after_expiry(app):
+    assert acquire_lease('job', 'a', ttl=30)
+    assert not acquire_lease('job', 'b', ttl=30)
+    assert acquire_lease('job', 'a', ttl=-1)  # renewed, but already lapsed
+    assert acquire_lease('job', 'b', ttl=30)
+
+
+def test_only_the_leader_queues_deadlines(app):
+    soon = datetime.utcnow() + timedelta(seconds=5)
+    follower = ExpiryScheduler()
+    follower.enabled = True
+    assert acquire_lease('reservation-expiry', 'someone-else', ttl=30)
+    for reservation_id in range(1000):
+        follower.schedule(reservation_id, soon)
+    assert follower.tick() == 0 and not follower.is_leader
+    follower.schedule(1000, soon)
+    assert follower.stats()['queued'] == 0
+    
+    # Taking over the lease rebuilds the heap from the table
+    _overdue(3, minutes=-1)
+    assert acquire_lease('reservation-expiry', 'someone-else', ttl=-1)
+    follower._lease_renewed = 0.0
+    follower.tick()
+    assert follower.is_leader and follower.stats()['queued'] == 3
+    follower.schedule(1000, soon)
+    assert follower.stats()['queued'] == 4
@@ -0,0 +1,120 @@
+"""Facility routing: per-facility databases, fan-out reads and facility-bound tickets"""
+
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from backend.extensions import db
+from backend.facilities import use_facility
+from backend.models import ParkingSlot, Reservation
+
+
+@pytest.fixture
+def app_env(tmp_path):
+    return {'FACILITY_DATABASES': f"north=sqlite:///{tmp_path / 'north.db'}"}
+
+
+def _reserve(client, facility):
+    with client.application.app_context(), use_facility(facility):
+        slot_id = ParkingSlot.query.filter_by(is_available=True).first().id
+    response = client.post(f'/reservations/create?facility={facility}', data={'slot_id': slot_id})
+    assert response.status_code == 302
+    return int(response.headers['Location'].split('?')[0].rsplit('/', 1)[1])
+
+
+def test_each_facility_writes_its_own_database(client, tmp_path):
+    main_id = _reserve(client, 'main')
+    north_id = _reserve(client, 'north')
+    
+    # Ids are per database, and the rows carry their facility key
+    conn = sqlite3.connect(tmp_path / 'north.db')
+    try:
+        rows = conn.execute('SELECT id, facility FROM reservation').fetchall()
+        users = conn.execute('SELECT count(*) FROM user').fetchone()[0]
+    finally:
+        conn.close()
+    assert rows == [(north_id, 'north')]
+    assert users == 0
+    
+    with client.application.app_context():
+        assert [r.facility for r in Reservation.query.all()] == ['main']
+        assert db.session.get(Reservation, main_id) is not None
+    
+    response = client.get(f'/reservations/{north_id}?facility=north')
+    assert response.status_code == 200
+    assert client.get('/slots/?facility=nowhere').status_code == 404
+
+
+def test_my_reservations_merges_facilities(client):
+    booked = [(_reserve(client, facility), facility) for facility in ('main', 'north', 'main', 'north', 'north')]
+    
+    seen = []
+    cursor = ''
+    while True:
+        page = client.get(f'/api/v1/reservations?limit=2&before={cursor}').get_json()
+        seen += [(r['id'], r['facility']) for r in page['reservations']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == booked[::-1]
+    
+    html = client.get('/reservations').get_data(as_text=True)
+    assert f'/reservations/{booked[1][0]}?facility=north' in html
+
+
+def test_tickets_only_open_their_own_facility(client):
+    north_id = _reserve(client, 'north')
+    with client.application.app_context(), use_facility('north'):
+        token = db.session.get(Reservation, north_id).qr_code_data
+    
+    assert client.post('/gate/verify', json={'token': token}).get_json()['reason'] == 'invalid'
+    verdict = client.post('/gate/verify', json={'token': token}, headers={'X-Facility': 'north'})
+    assert verdict.status_code == 200
+    assert verdict.get_json()['reservation_id'] == north_id
+    
+    client.post(f'/reservations/{north_id}/checkout?facility=north')
+    verdict = client.post('/gate/verify', json={'token': token}, headers={'X-Facility': 'north'})
+    assert verdict.get_json()['reason'] == 'revoked'
+
+
+def test_merge_follows_booking_time_not_ids(client, user_id):
+    # Ids and booking times disagree, and the facilities interleave
+    booked_minutes_ago = {'main': [5, 50, 30], 'north': [40, 10, 20, 60]}
+    expected = []
+    with client.application.app_context():
+        now = datetime.utcnow()
+        for facility, minutes in booked_minutes_ago.items():
+            with use_facility(facility):
+                slot_ids = [s.id for s in ParkingSlot.query.limit(len(minutes))]
+                for slot_id, ago in zip(slot_ids, minutes):
+                    reservation = Reservation(user_id=user_id, slot_id=slot_id, status='active',
+                                              reserved_at=now - timedelta(minutes=ago), facility=facility)
+                    db.session.add(reservation)
+                    db.session.commit()
+                    expected.append((ago, reservation.id, facility))
+                db.session.remove()
+    expected = [(reservation_id, facility) for _, reservation_id, facility in sorted(expected)]
+    
+    seen = []
+    cursor = ''
+    while True:
+        page = client.get(f'/api/v1/reservations?limit=3&before={cursor}').get_json()
+        seen += [(r['id'], r['facility']) for r in page['reservations']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_tampered_merged_cursor_is_ignored(client):
+    booked = [(_reserve(client, facility), facility) for facility in ('main', 'north', 'main')]
+    first = client.get('/api/v1/reservations?limit=2').get_json()
+    assert [(r['id'], r['facility']) for r in first['reservations']] == booked[:0:-1]
+    
+    for cursor in ['garbage', 'main:' + '9' * 30 + '-1', 'north:1-' + '9' * 30, 'nowhere:1-1', ',:,', 'main:-5']:
+        page = client.get('/api/v1/reservations', query_string={'limit': 2, 'before': cursor})
+        assert page.status_code == 200 and page.get_json() == first
+    
+    # Valid parts of a partly tampered cursor still apply; north starts over
+    main, north = first['next_cursor'].split(',')
+    page = client.get('/api/v1/reservations', query_string={'limit': 2, 'before': f'{main},north:x-{"9" * 30}'})
+    assert [(r['id'], r['facility']) for r in page.get_json()['reservations']] == [booked[1], booked[0]]
@@ -0,0 +1,40 @@
+"""Cached identities are evicted when the User row changes"""
+
+from backend.extensions import db
+from backend.identity import identity_cache
+from backend.models import User
+
+
+def test_cached_identity_is_reused(client, user_id):
+    client.get('/reservations')
+    misses = identity_cache.misses
+    client.get('/reservations')
+    assert identity_cache.misses == misses
+    assert identity_cache.get(user_id).email == 'driver@example.com'
+
+
+def test_updating_the_user_evicts_the_cached_identity(client, user_id):
+    client.get('/reservations')
+    assert identity_cache.get(user_id) is not None
+    
+    with client.application.app_context():
+        db.session.get(User, user_id).email = 'renamed@example.com'
+        db.session.commit()
+    assert identity_cache.get(user_id) is None
+    
+    response = client.get('/reservations')
+    assert b'Logout (renamed@example.com)' in response.data
+
+
+def test_deleting_the_user_evicts_the_cached_identity(client, user_id):
+    client.get('/reservations')
+    assert identity_cache.get(user_id) is not None
+    
+    with client.application.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+    assert identity_cache.get(user_id) is None
+    
+    response = client.get('/reservations')
+    assert response.status_code == 302
+    assert '/auth/login' in response.headers['Location']
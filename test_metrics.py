@@ -0,0 +1,80 @@
+"""Request instrumentation exported on /metrics"""
+
+import time
+import pytest
+from app import create_app
+from backend.metrics import Histogram, request_metrics
+from backend.models import ParkingSlot
+
+
+@pytest.fixture
+def app_env(tmp_path):
+    return {'METRICS_PROFILE_DIR': str(tmp_path)}
+
+
+def test_metrics_cover_routes_sql_templates_and_qr(client):
+    with client.application.app_context():
+        slot_id = ParkingSlot.query.first().id
+    assert client.post('/reservations/create', data={'slot_id': slot_id}).status_code == 302
+    assert client.get('/slots/').status_code == 200
+    
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'parking_request_duration_seconds_count{endpoint="slots.list_slots",method="GET"} 1' in body
+    assert 'parking_request_duration_seconds_bucket{endpoint="slots.list_slots",method="GET",le="+Inf"} 1' in body
+    assert 'parking_request_sql_statements_count{endpoint="reservations.create_reservation"} 1' in body
+    assert 'parking_sql_statement_duration_seconds_count{verb="UPDATE"}' in body
+    assert 'parking_template_render_seconds_count{template="slots.html"} 1' in body
+    assert 'parking_operation_duration_seconds_count{operation="qr_code"} 1' in body
+    assert 'parking_responses_total{endpoint="reservations.create_reservation",status="302"} 1' in body
+    assert 'parking_qr_cache_misses 1' in body
+    assert 'parking_expiry_leader 0' in body
+    
+    # Viewing the reservation again is a cache hit, and is timed too
+    reservation_id = client.get('/api/v1/reservations').get_json()['reservations'][0]['id']
+    assert client.get(f'/reservations/{reservation_id}').status_code == 200
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'parking_operation_duration_seconds_count{operation="qr_code"} 2' in body
+    assert 'parking_qr_cache_hits 1' in body
+
+
+def test_production_requires_metrics_token(monkeypatch):
+    monkeypatch.setenv('SECRET_KEY', 'a-private-value')
+    monkeypatch.setenv('GATE_API_KEY', 'gate-secret')
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    with pytest.raises(ValueError, match='METRICS_TOKEN'):
+        create_app('production')
+    monkeypatch.setenv('METRICS_ENABLED', 'False')
+    create_app('production')
+
+
+def test_metrics_token_and_sampled_profiles(client, tmp_path):
+    request_metrics.token = 'secret'
+    request_metrics.profile_rate = 1.0
+    try:
+        assert client.get('/metrics').status_code == 401
+        response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        assert response.status_code == 200
+    finally:
+        request_metrics.token = None
+        request_metrics.profile_rate = 0.0
+    assert len(list(tmp_path.glob('metrics-*.prof'))) == 2
+
+
+def test_metrics_token_must_match_exactly(client):
+    request_metrics.token = 'secret'
+    try:
+        for header in ['Bearer secre', 'Bearer secret ', 'bearer secret', 'Bearer s\u00e9cret', '']:
+            assert client.get('/metrics', headers={'Authorization': header}).status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    finally:
+        request_metrics.token = None
+
+
+def test_histogram_observe_is_cheap():
+    histogram = Histogram('h', 'test', ('endpoint',))
+    started = time.perf_counter()
+    for i in range(100000):
+        histogram.observe(i / 1e5, 'x')
+    assert time.perf_counter() - started < 0.5
+    counts, total, n = histogram.snapshot()[('x',)]
+    assert n == 100000 and sum(counts) == n
@@ -0,0 +1,49 @@
+"""Query-count guard for the My Reservations page"""
+
+from backend.extensions import db
+from backend.models import ParkingSlot, Reservation
+
+
+def _book(app, user_id, count):
+    with app.app_context():
+        start = ParkingSlot.query.count()
+        slots = [ParkingSlot(slot_number=f'F-{start + i:04d}') for i in range(count)]
+        db.session.add_all(slots)
+        db.session.flush()
+        db.session.add_all(
+            Reservation(user_id=user_id, slot_id=slot.id, qr_code_data='{"reservation_id": 0}')
+            for slot in slots
+        )
+        db.session.commit()
+
+
+def test_my_reservations_query_count_is_constant(client, user_id, count_statements):
+    _book(client.application, user_id, 3)
+    client.get('/reservations')  # warm the identity cache
+    few, _ = count_statements('/reservations')
+    
+    _book(client.application, user_id, 120)
+    many, response = count_statements('/reservations')
+    
+    assert few == many == 1
+    assert b'Older' in response.data
+
+
+def test_my_reservations_pages_do_not_overlap(client, user_id):
+    _book(client.application, user_id, 7)
+    first = client.get('/api/v1/reservations?limit=4').get_json()
+    second = client.get(f"/api/v1/reservations?limit=4&before={first['next_cursor']}").get_json()
+    
+    first_ids = [r['id'] for r in first['reservations']]
+    second_ids = [r['id'] for r in second['reservations']]
+    assert len(first_ids) == 4 and len(second_ids) == 3
+    assert first_ids + second_ids == sorted(first_ids + second_ids, reverse=True)
+    assert second['next_cursor'] is None
+
+
+def test_garbage_cursor_starts_from_the_first_page(client, user_id):
+    _book(client.application, user_id, 3)
+    first = client.get('/api/v1/reservations?limit=2').get_json()
+    for cursor in ['garbage', '-1', '9' * 30]:
+        page = client.get('/api/v1/reservations', query_string={'limit': 2, 'before': cursor})
+        assert page.status_code == 200 and page.get_json() == first
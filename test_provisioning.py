@@ -0,0 +1,77 @@
+"""Re-running slot provisioning and import is a no-op apart from layout changes"""
+
+import pytest
+from backend.extensions import db
+from backend.models import ParkingSlot
+
+
+LAYOUT = 'slot_number,zone,level\nB-001,B,1\nB-002,B,1\nB-003,B,2\n'
+
+
+def _slots(app):
+    with app.app_context():
+        return {s.slot_number: (s.zone, s.level, s.is_available)
+                for s in ParkingSlot.query.filter(ParkingSlot.slot_number.like('B-%'))}
+
+
+def test_bootstrap_twice_seeds_once(app):
+    runner = app.test_cli_runner()
+    with app.app_context():
+        before = ParkingSlot.query.count()
+    
+    result = runner.invoke(args=['db', 'bootstrap'])
+    assert result.exit_code == 0, result.output
+    assert 'seeded 0 slots' in result.output
+    with app.app_context():
+        assert ParkingSlot.query.count() == before
+
+
+def test_importing_the_same_layout_twice_is_idempotent(app, tmp_path):
+    layout = tmp_path / 'layout.csv'
+    layout.write_text(LAYOUT)
+    runner = app.test_cli_runner()
+    
+    result = runner.invoke(args=['slots', 'import', str(layout), '--chunk-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 3 slots' in result.output
+    first = _slots(app)
+    assert first == {'B-001': ('B', '1', True), 'B-002': ('B', '1', True), 'B-003': ('B', '2', True)}
+    with app.app_context():
+        total = ParkingSlot.query.count()
+        db.session.execute(db.update(ParkingSlot).where(ParkingSlot.slot_number == 'B-002').values(is_available=False))
+        db.session.commit()
+    
+    result = runner.invoke(args=['slots', 'import', str(layout), '--chunk-size', '2'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert ParkingSlot.query.count() == total
+    # Availability belongs to reservations, not to the layout
+    assert _slots(app) == {**first, 'B-002': ('B', '1', False)}
+
+
+def test_reimport_refreshes_zone_and_level(app, tmp_path):
+    layout = tmp_path / 'layout.jsonl'
+    layout.write_text('{"slot_number": "B-001", "zone": "B", "level": "1"}\n')
+    runner = app.test_cli_runner()
+    runner.invoke(args=['slots', 'import', str(layout)])
+    
+    layout.write_text('{"slot_number": "B-001", "zone": "C", "level": "3"}\n'
+                      '{"slot_number": "B-002", "zone": "C"}\n')
+    result = runner.invoke(args=['slots', 'import', str(layout)])
+    assert result.exit_code == 0, result.output
+    assert _slots(app) == {'B-001': ('C', '3', True), 'B-002': ('C', None, True)}
+
+
+@pytest.mark.parametrize('name, content, kind', [
+    ('layout.json', '[{"slot_number": "B-001"}, ["B-002"]]', 'list'),
+    ('layout.json', '[{"slot_number": "B-001"}, "B-002"]', 'str'),
+    ('layout.jsonl', '{"slot_number": "B-001"}\n42\n', 'int'),
+    ('layout.jsonl', '{"slot_number": "B-001"}\nnull\n', 'NoneType'),
+])
+def test_records_that_are_not_objects_are_reported(app, tmp_path, name, content, kind):
+    layout = tmp_path / name
+    layout.write_text(content)
+    result = app.test_cli_runner().invoke(args=['slots', 'import', str(layout), '--chunk-size', '1'])
+    assert result.exit_code == 1
+    assert f'Error: Record 2: expected an object with slot_number, got {kind}' in result.output
+    assert _slots(app) == {'B-001': (None, None, True)}
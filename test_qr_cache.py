@@ -0,0 +1,53 @@
+"""QR image cache: LRU eviction, disk fallback and invalidation"""
+
+import os
+from backend.utils import QRCodeCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QRCodeCache(maxsize=2)
+    first = cache.get_or_render('ticket-1')
+    cache.get_or_render('ticket-2')
+    assert cache.get_or_render('ticket-1') == first  # now the most recent
+    
+    cache.get_or_render('ticket-3')  # evicts ticket-2
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 1, 'disk_hits': 0, 'misses': 3}
+    
+    cache.get_or_render('ticket-1')
+    cache.get_or_render('ticket-2')
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_images_on_disk_are_shared_with_a_fresh_cache(tmp_path):
+    writer = QRCodeCache(directory=str(tmp_path))
+    image = writer.get_or_render('ticket-1')
+    assert os.listdir(tmp_path) == [f"{QRCodeCache.key_for('ticket-1')}.png"]
+    
+    # Another worker, or this one after a restart, reads the PNG instead of rendering
+    reader = QRCodeCache(directory=str(tmp_path))
+    assert reader.get_or_render('ticket-1') == image
+    assert reader.get_or_render('ticket-1') == image
+    assert (reader.disk_hits, reader.hits, reader.misses) == (1, 1, 0)
+
+
+def test_unusable_directory_falls_back_to_rendering(tmp_path):
+    cache = QRCodeCache(directory=str(tmp_path / 'missing'))
+    cache.get_or_render('ticket-1')
+    assert (cache.disk_hits, cache.misses) == (0, 1)
+
+
+def test_invalidate_drops_memory_and_disk_entries(tmp_path):
+    cache = QRCodeCache(directory=str(tmp_path))
+    cache.get_or_render('ticket-1')
+    cache.get_or_render('ticket-2')
+    
+    cache.invalidate('ticket-1')
+    assert os.listdir(tmp_path) == [f"{QRCodeCache.key_for('ticket-2')}.png"]
+    assert cache.stats()['size'] == 1
+    
+    cache.get_or_render('ticket-1')
+    cache.get_or_render('ticket-2')
+    assert (cache.hits, cache.disk_hits, cache.misses) == (1, 0, 3)
+    
+    cache.invalidate(None)  # reservations without a ticket
+    assert cache.stats()['size'] == 2
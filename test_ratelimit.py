@@ -0,0 +1,88 @@
+"""Token-bucket rate limits and concurrency caps on login and reservation writes"""
+
+import pytest
+from sqlalchemy import event
+from app import create_app
+from backend.extensions import db
+from backend.ratelimit import LocalBackend, rate_limiter
+
+
+@pytest.fixture
+def app_env():
+    return {'RATE_LIMIT_ENABLED': 'True'}
+
+
+def test_token_bucket_refills_at_rate():
+    backend = LocalBackend()
+    assert all(backend.take('k', 1.0, 3, now=0.0)[0] for _ in range(3))
+    allowed, retry_after = backend.take('k', 1.0, 3, now=0.0)
+    assert not allowed and retry_after == pytest.approx(1.0)
+    assert backend.take('k', 1.0, 3, now=1.0) == (True, 0.0)
+    assert backend.take('other', 1.0, 3, now=1.0)[0]
+
+
+def test_login_is_rejected_before_any_sql(app, credentials):
+    client = app.test_client()
+    count, _ = app.config['RATE_LIMITS']['auth.login']
+    for _ in range(count):
+        client.post('/auth/login', data=dict(credentials, password='wrong-password'))
+    
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.post('/auth/login', data=credentials)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert statements == []
+    
+    # Reading the form is not limited
+    assert client.get('/auth/login').status_code == 200
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'parking_ratelimit_rate_limited 1' in metrics
+
+
+def test_concurrency_cap_sheds_with_json_429(client):
+    cap = client.application.config['CONCURRENCY_LIMITS']['api.create_reservation']
+    rate_limiter._in_flight['api.create_reservation'] = cap
+    try:
+        response = client.post('/api/v1/reservations', json={'any': True})
+    finally:
+        rate_limiter._in_flight['api.create_reservation'] = 0
+    assert response.status_code == 429
+    assert response.get_json()['retry_after'] == 1
+    
+    response = client.post('/api/v1/reservations', json={'any': True})
+    assert response.status_code == 201
+    assert rate_limiter.stats()['in_flight'] == 0
+
+
+def test_local_buckets_split_the_limit_across_workers():
+    backend = LocalBackend(workers=3)
+    assert [backend.take('k', 3.0, 6, now=0.0)[0] for _ in range(3)] == [True, True, False]
+    assert backend.take('k', 3.0, 6, now=1.0)[0]
+    # A burst smaller than the worker count still lets one request through
+    assert LocalBackend(workers=8).take('k', 1.0, 5, now=0.0)[0]
+
+
+def test_anonymous_clients_behind_a_proxy_get_their_own_buckets(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'True')
+    monkeypatch.setenv('PROXY_FIX_HOPS', '1')
+    app = create_app('testing')
+    client = app.test_client()
+    count, _ = app.config['RATE_LIMITS']['auth.login']
+    
+    def login(address):
+        return client.post('/auth/login', data={'email': 'x@example.com', 'password': 'password1'},
+                           headers={'X-Forwarded-For': address}).status_code
+    
+    statuses = [login('203.0.113.7') for _ in range(count + 1)]
+    assert statuses[-1] == 429 and 429 not in statuses[:-1]
+    assert login('198.51.100.2') != 429
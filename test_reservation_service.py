@@ -0,0 +1,100 @@
+"""Slot reservation engine: claims under concurrency and the availability index they write through to"""
+
+import threading
+import pytest
+from sqlalchemy import func
+from app import create_app
+from backend.availability import availability_index
+from backend.extensions import db
+from backend.models import User, ParkingSlot, Reservation
+from backend.reservation_service import (
+    reserve_slot, reserve_any_slot, ReservationError
+)
+
+SLOT_COUNT = 40
+USER_COUNT = 20
+THREADS = 16
+ATTEMPTS_PER_THREAD = 40
+
+
+def _make_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'stress.db'}")
+    app = create_app()
+    with app.app_context():
+        ParkingSlot.query.delete()
+        db.session.add_all(ParkingSlot(slot_number=f'S-{i:03d}') for i in range(SLOT_COUNT))
+        db.session.add_all(User(email=f'user{i}@example.com', password_hash='x') for i in range(USER_COUNT))
+        db.session.commit()
+        availability_index.load()
+    return app
+
+
+@pytest.mark.parametrize('taken', [0, 15])
+def test_concurrent_claims_never_double_book(tmp_path, monkeypatch, taken):
+    app = _make_app(tmp_path, monkeypatch)
+    with app.app_context():
+        slot_ids = [s.id for s in ParkingSlot.query.all()]
+        user_ids = [u.id for u in User.query.all()]
+        # Some slots are already held before the race starts
+        held = {reserve_slot(slot_id, user_ids[0]).slot_id for slot_id in slot_ids[:taken]}
+        free = availability_index.count_free()
+        db.session.remove()
+    assert free == SLOT_COUNT - taken
+    
+    wins = []
+    errors = []
+    start = threading.Barrier(THREADS)
+    
+    def worker(n):
+        with app.app_context():
+            start.wait()
+            for i in range(ATTEMPTS_PER_THREAD):
+                user_id = user_ids[(n + i) % len(user_ids)]
+                try:
+                    if i % 4 == 0:
+                        reservation = reserve_any_slot(user_id)
+                    else:
+                        reservation = reserve_slot(slot_ids[(n * 7 + i) % len(slot_ids)], user_id)
+                    wins.append(reservation.slot_id)
+                except ReservationError:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+                db.session.remove()
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    assert not errors
+    # Every free slot is won exactly once, and no held slot is won again
+    assert len(wins) == len(set(wins)) == free
+    assert set(wins) == set(slot_ids) - held
+    
+    with app.app_context():
+        reserved = db.session.query(func.count(ParkingSlot.id)).filter_by(is_available=False).scalar()
+        distinct_slots = db.session.query(func.count(func.distinct(Reservation.slot_id))).scalar()
+        assert Reservation.query.count() == distinct_slots == reserved == SLOT_COUNT
+        assert availability_index.count_free() == 0
+        assert availability_index.reconcile() == 0
+
+
+def test_claiming_an_unknown_slot_leaves_the_index_alone(client):
+    with client.application.app_context():
+        availability_index.load()
+        size = len(availability_index._states)
+        free, total = availability_index.count_free(), availability_index.count_total()
+    
+    response = client.post('/api/v1/reservations', json={'slot_id': 50_000_000})
+    assert response.status_code == 404
+    client.post('/reservations/create', data={'slot_id': '50000000'})
+    
+    with client.application.app_context():
+        assert len(availability_index._states) == size
+        assert (availability_index.count_free(), availability_index.count_total()) == (free, total)
+        availability_index.mark_free(-1)
+        availability_index.mark_reserved(size + 10)
+        assert len(availability_index._states) == size
+        assert availability_index.reconcile() == 0
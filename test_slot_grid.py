@@ -0,0 +1,40 @@
+"""Statement-count guard for the slot grid"""
+
+import re
+from backend.extensions import db
+from backend.models import ParkingSlot, Reservation
+
+
+def _add_slots(app, user_id, count):
+    """Add `count` slots, every other one reserved by the user"""
+    with app.app_context():
+        start = ParkingSlot.query.count()
+        slots = [ParkingSlot(slot_number=f'G-{start + i:04d}', is_available=bool(i % 2)) for i in range(count)]
+        db.session.add_all(slots)
+        db.session.flush()
+        db.session.add_all(
+            Reservation(user_id=user_id, slot_id=slot.id, qr_code_data='{"reservation_id": 0}')
+            for slot in slots if not slot.is_available
+        )
+        db.session.commit()
+
+
+def _checkout_links(response):
+    return len(re.findall(rb'/reservations/\d+/checkout', response.data))
+
+
+def test_slot_grid_statement_count_is_constant(client, user_id, count_statements):
+    _add_slots(client.application, user_id, 4)
+    client.get('/slots/?limit=500')  # warm the identity cache and availability index
+    few, response = count_statements('/slots/?limit=500')
+    assert _checkout_links(response) == 2
+    
+    _add_slots(client.application, user_id, 200)
+    client.get('/slots/?limit=500')
+    many, response = count_statements('/slots/?limit=500')
+    assert _checkout_links(response) == 102
+    
+    assert few == many <= 2
+    
+    _, response = count_statements('/slots/?prefix=G-&limit=500')
+    assert response.data.count(b'slot-number') == 204
@@ -0,0 +1,75 @@
+"""Keyset pagination and zone/level/prefix filtering of the slot listing"""
+
+import pytest
+from backend.availability import availability_index
+from backend.extensions import db
+from backend.models import ParkingSlot
+
+
+@pytest.fixture
+def slots(app):
+    """54 more slots over zones B-D and levels 1-2; every third one is taken"""
+    with app.app_context():
+        db.session.add_all(
+            ParkingSlot(slot_number=f'{zone}-{level}{i:02d}', zone=zone, level=str(level), is_available=bool(i % 3))
+            for zone in 'BCD' for level in (1, 2) for i in range(9)
+        )
+        db.session.commit()
+        availability_index.load()
+        return {s.slot_number: s for s in ParkingSlot.query.all()}
+
+
+def _walk(client, query, limit):
+    """Every page of /api/v1/slots for the query, as lists of slot numbers"""
+    pages = []
+    after = ''
+    while True:
+        page = client.get('/api/v1/slots', query_string={**query, 'limit': limit, 'after': after}).get_json()
+        pages.append([slot['slot_number'] for slot in page['slots']])
+        after = page['next_cursor']
+        if after is None:
+            return pages
+        assert after == pages[-1][-1]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ({}, lambda s: True),
+    ({'zone': 'C'}, lambda s: s.zone == 'C'),
+    ({'zone': 'B', 'level': '2'}, lambda s: s.zone == 'B' and s.level == '2'),
+    ({'prefix': 'D-1'}, lambda s: s.slot_number.startswith('D-1')),
+    ({'available': '1', 'level': '1'}, lambda s: s.is_available and s.level == '1'),
+])
+@pytest.mark.parametrize('limit', [1, 7, 9, 500])
+def test_pages_cover_every_slot_exactly_once(client, slots, query, expected, limit):
+    pages = _walk(client, query, limit)
+    seen = [number for page in pages for number in page]
+    assert seen == sorted(number for number, slot in slots.items() if expected(slot))
+    assert all(len(page) == limit for page in pages[:-1]) and 0 < len(pages[-1]) <= limit
+
+
+def test_tampered_cursor_is_rejected(client, slots):
+    for after in ['X' * 11, 'A-01\x00', '\n']:
+        response = client.get('/api/v1/slots', query_string={'after': after})
+        assert response.status_code == 400 and response.get_json() == {'error': 'Invalid cursor'}
+    
+    response = client.get('/slots/', query_string={'zone': 'B', 'after': 'X' * 500}, follow_redirects=True)
+    assert response.status_code == 200 and b'Invalid page link' in response.data
+    assert response.request.args.to_dict() == {'zone': 'B'}
+    
+    # Anything shaped like a slot number is just a position in the keyset
+    assert client.get('/api/v1/slots', query_string={'after': 'zzz'}).get_json() == {'slots': [], 'next_cursor': None}
+    page = client.get('/api/v1/slots', query_string={'after': 'C-2', 'zone': 'C'}).get_json()
+    assert page['slots'][0]['slot_number'] == 'C-200'
+
+
+@pytest.mark.parametrize('query', [{}, {'zone': 'B'}, {'zone': 'C', 'level': '1'}, {'prefix': 'D-2'}, {'level': '9'}])
+def test_filtered_totals(client, slots, query):
+    selected = [slot for slot in slots.values()
+                if slot.zone == query.get('zone', slot.zone) and slot.level == query.get('level', slot.level)
+                and slot.slot_number.startswith(query.get('prefix', ''))]
+    available = sum(slot.is_available for slot in selected)
+    totals = client.get('/api/v1/slots/availability', query_string=query).get_json()
+    assert totals == {'total': len(selected), 'available': available, 'reserved': len(selected) - available}
+    
+    # ?available=1 narrows the listing, not the totals
+    assert client.get('/api/v1/slots/availability', query_string={**query, 'available': '1'}).get_json() == totals
@@ -0,0 +1,32 @@
+"""Cold-start budget for the application factory"""
+
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app
+
+# Seconds; fast start measured at ~10ms locally
+COLD_START_BUDGET = 0.25
+
+
+def test_fast_start_skips_database_io(tmp_path, monkeypatch):
+    db_path = tmp_path / 'cold.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{db_path}')
+    monkeypatch.setenv('DB_BOOTSTRAP_ON_START', 'False')
+    
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        started = time.perf_counter()
+        create_app()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    
+    assert statements == []
+    assert not db_path.exists()
+    assert elapsed < COLD_START_BUDGET
@@ -0,0 +1,146 @@
+"""Signed ticket tokens and the gate check-in endpoints"""
+
+import base64
+import time
+from datetime import datetime, timedelta
+import pytest
+import qrcode
+from app import create_app
+from backend.extensions import db
+from backend.models import ParkingSlot, Reservation
+from backend.tickets import TOKEN_LENGTH, _LAYOUTS, ticket_codec, ticket_revocations, verify_ticket
+
+
+def _reserve(client):
+    with client.application.app_context():
+        slot_id = ParkingSlot.query.filter_by(is_available=True).first().id
+    response = client.post('/reservations/create', data={'slot_id': slot_id})
+    reservation_id = int(response.headers['Location'].rsplit('/', 1)[1])
+    with client.application.app_context():
+        return reservation_id, slot_id, db.session.get(Reservation, reservation_id).qr_code_data
+
+
+def test_ticket_is_compact_and_verified_offline(client):
+    reservation_id, slot_id, token = _reserve(client)
+    assert len(token) == TOKEN_LENGTH
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L)
+    qr.add_data(token)
+    qr.make(fit=True)
+    assert qr.version <= 2
+    
+    response = client.post('/gate/verify', json={'token': token.lower()})
+    assert response.status_code == 200
+    assert response.json['valid'] and response.json['reservation_id'] == reservation_id
+    assert response.json['slot_id'] == slot_id
+    
+    tampered = token[:5] + ('A' if token[5] != 'A' else 'B') + token[6:]
+    response = client.post('/gate/verify', json={'token': tampered})
+    assert response.status_code == 403 and response.json['reason'] == 'invalid'
+    
+    with client.application.app_context():
+        expired = ticket_codec.encode(reservation_id, slot_id, datetime.utcnow() - timedelta(seconds=1))
+    assert client.post('/gate/verify', json={'token': expired}).json['reason'] == 'expired'
+
+
+def test_checkout_revokes_ticket(client):
+    reservation_id, _, token = _reserve(client)
+    _, _, other = _reserve(client)
+    client.post(f'/reservations/{reservation_id}/checkout')
+    
+    response = client.post('/gate/verify/batch', json={'tokens': [other, token, 'garbage', 42]})
+    assert response.status_code == 200
+    assert [r['reason'] for r in response.json['results']] == [None, 'revoked', 'invalid', 'invalid']
+
+
+def test_checkouts_from_other_workers_are_picked_up(client):
+    reservation_id, _, token = _reserve(client)
+    assert client.post('/gate/verify', json={'token': token}).status_code == 200
+    
+    with client.application.app_context():
+        # Another worker checks the reservation out: only the database knows
+        Reservation.query.filter_by(id=reservation_id).update(
+            {'status': 'checked_out', 'checked_out_at': datetime.utcnow()})
+        db.session.commit()
+        assert verify_ticket(token)[1] is None
+        ticket_revocations.refresh()
+        assert verify_ticket(token)[1] == 'revoked'
+        
+        # A fresh process rebuilds the set, including archived reservations
+        from backend.archive import archive_completed
+        archive_completed()
+        ticket_revocations.load()
+        assert verify_ticket(token)[1] == 'revoked'
+
+
+def test_gate_key_and_verify_throughput(client):
+    _, _, token = _reserve(client)
+    client.application.config['GATE_API_KEY'] = 'gate-secret'
+    assert client.post('/gate/verify', json={'token': token}).status_code == 401
+    for header in ['Bearer gate-secre', 'Bearer g\u00e2te-secret']:
+        assert client.post('/gate/verify', json={'token': token}, headers={'Authorization': header}).status_code == 401
+    response = client.post('/gate/verify', json={'token': token},
+                           headers={'Authorization': 'Bearer gate-secret'})
+    assert response.status_code == 200
+    
+    started = time.perf_counter()
+    for _ in range(20000):
+        verify_ticket(token)
+    assert time.perf_counter() - started < 1.0
+
+
+def test_window_tickets_open_the_gate_only_from_the_start(client):
+    start = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(hours=2)
+    end = start + timedelta(hours=1)
+    with client.application.app_context():
+        slot_id = ParkingSlot.query.filter_by(is_available=True).first().id
+    response = client.post('/api/v1/reservations', json={
+        'slot_id': slot_id, 'start_at': start.isoformat(), 'end_at': end.isoformat()
+    })
+    token = response.json['qr_payload']
+    assert len(token) == TOKEN_LENGTH
+    
+    response = client.post('/gate/verify', json={'token': token})
+    assert response.status_code == 403 and response.json['reason'] == 'not_yet_valid'
+    assert response.json['starts_at'] == start.isoformat()
+    
+    grace = client.application.config['TICKET_START_GRACE']
+    opens = (start - datetime(1970, 1, 1)).total_seconds() - grace
+    with client.application.app_context():
+        assert verify_ticket(token, now=opens - 1)[1] == 'not_yet_valid'
+        assert verify_ticket(token, now=opens)[1] is None
+        assert verify_ticket(token, now=opens + grace + 3599)[1] is None
+        assert verify_ticket(token, now=opens + grace + 3600)[1] == 'expired'
+
+
+def test_version_1_tickets_still_verify(client):
+    reservation_id, slot_id, _ = _reserve(client)
+    body_layout, signature_bytes = _LAYOUTS[1]
+    expires = int(time.time()) + 3600
+    with client.application.app_context():
+        body = body_layout.pack(1, reservation_id, slot_id, expires)
+        token = base64.b32encode(body + ticket_codec._sign(body, 'main', signature_bytes)).decode('ascii')
+        ticket, reason = verify_ticket(token)
+    assert reason is None and ticket.starts is None and ticket.expires == expires
+
+
+def test_production_requires_a_secret_key(monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'scraper')
+    monkeypatch.setenv('GATE_API_KEY', 'gate-secret')
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    with pytest.raises(ValueError, match='SECRET_KEY'):
+        create_app('production')
+    monkeypatch.setenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    with pytest.raises(ValueError, match='SECRET_KEY'):
+        create_app('production')
+    monkeypatch.setenv('SECRET_KEY', 'a-private-value')
+    create_app('production')
+
+
+def test_production_requires_a_gate_key(monkeypatch):
+    monkeypatch.setenv('SECRET_KEY', 'a-private-value')
+    monkeypatch.setenv('METRICS_TOKEN', 'scraper')
+    monkeypatch.delenv('GATE_API_KEY', raising=False)
+    with pytest.raises(ValueError, match='GATE_API_KEY'):
+        create_app('production')
+    monkeypatch.setenv('GATE_API_KEY', 'gate-secret')
+    create_app('production')
@@ -0,0 +1,176 @@
+"""Time-windowed bookings: overlap detection in the interval index and the database"""
+
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app import create_app
+from backend.availability import availability_index
+from backend.extensions import db
+from backend.intervals import SlotIntervals, interval_index
+from backend.models import User, ParkingSlot, Reservation
+from backend.queries import SlotFilter, get_free_slots_between
+from backend.reservation_service import (
+    reserve_slot, reserve_window, checkout, InvalidWindowError, SlotUnavailableError, ReservationError
+)
+
+
+def _at(hours):
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    return now + timedelta(days=1, hours=hours)
+
+
+def test_slot_intervals_bisect():
+    intervals = SlotIntervals()
+    intervals.add(_at(2), _at(4), 1)
+    intervals.add(_at(8), _at(9), 2)
+    assert intervals.conflicts(_at(3), _at(5))
+    assert intervals.conflicts(_at(0), _at(10))
+    assert not intervals.conflicts(_at(4), _at(8))  # touching windows do not overlap
+    assert not intervals.conflicts(_at(0), _at(2))
+    intervals.prune(_at(5))
+    assert intervals.ids == [2]
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.session.add_all([User(email='w@example.com', password_hash='x'), ParkingSlot(slot_number='W-01')])
+        db.session.commit()
+        yield app
+
+
+def test_windowed_booking_lifecycle(app):
+    user_id = User.query.filter_by(email='w@example.com').one().id
+    slot_id = ParkingSlot.query.filter_by(slot_number='W-01').one().id
+    
+    first = reserve_window(slot_id, user_id, _at(1), _at(3))
+    assert first.status == 'scheduled' and db.session.get(ParkingSlot, slot_id).is_available
+    reserve_window(slot_id, user_id, _at(3), _at(4))
+    with pytest.raises(SlotUnavailableError):
+        reserve_window(slot_id, user_id, _at(2), _at(5))
+    with pytest.raises(InvalidWindowError):
+        reserve_window(slot_id, user_id, _at(5), _at(5))
+    
+    # An immediate claim now would run into the booked windows before it expires
+    app.config['RESERVATION_TTL_HOURS'] = 30
+    with pytest.raises(SlotUnavailableError):
+        reserve_slot(slot_id, user_id)
+    
+    # The database check holds even when the in-memory index is empty
+    interval_index.remove(slot_id, first.id)
+    with pytest.raises(SlotUnavailableError):
+        reserve_window(slot_id, user_id, _at(2), _at(5))
+    
+    checkout(db.session.get(Reservation, first.id))
+    assert reserve_window(slot_id, user_id, _at(0), _at(2)).start_at == _at(0)
+
+
+def test_future_window_does_not_block_a_drive_up_claim(app):
+    user_id = User.query.filter_by(email='w@example.com').one().id
+    slot_id = ParkingSlot.query.filter_by(slot_number='W-01').one().id
+    availability_index.load()
+    free = availability_index.count_free()
+    
+    reserve_window(slot_id, user_id, _at(20 * 24), _at(20 * 24 + 2))
+    reservation = reserve_slot(slot_id, user_id)
+    assert reservation.status == 'active' and not db.session.get(ParkingSlot, slot_id).is_available
+    for _ in range(2):
+        # The claim ends where the window begins, so lookups still bisect correctly
+        assert interval_index.conflicts(slot_id, _at(0), _at(1))
+        assert interval_index.conflicts(slot_id, _at(20 * 24 + 1), _at(20 * 24 + 3))
+        interval_index.load()
+    checkout(reservation)
+    
+    # A window starting before the claim would expire still blocks it, without touching the index
+    reserve_window(slot_id, user_id, _at(-20), _at(-18))
+    with pytest.raises(SlotUnavailableError):
+        reserve_slot(slot_id, user_id)
+    assert availability_index.is_free(slot_id) is True
+    assert availability_index.count_free() == free
+    assert availability_index.reconcile() == 0
+
+
+def test_free_slots_api(app):
+    client = app.test_client()
+    with app.app_context():
+        user = User.query.filter_by(email='w@example.com').one()
+        user.set_password('password1')
+        db.session.commit()
+    client.post('/auth/login', data={'email': 'w@example.com', 'password': 'password1'})
+    window = {'start': _at(1).isoformat(), 'end': _at(2).isoformat(), 'prefix': 'W-'}
+    
+    assert [s['slot_number'] for s in client.get('/api/v1/slots/free', query_string=window).json['slots']] == ['W-01']
+    slot_id = client.get('/api/v1/slots/free', query_string=window).json['slots'][0]['id']
+    response = client.post('/api/v1/reservations', json={
+        'slot_id': slot_id, 'start_at': window['start'], 'end_at': window['end'] + 'Z'
+    })
+    assert response.status_code == 201 and response.json['status'] == 'scheduled'
+    assert client.get('/api/v1/slots/free', query_string=window).json['slots'] == []
+
+
+def test_free_slot_search_is_one_indexed_query(app):
+    user_id = User.query.filter_by(email='w@example.com').one().id
+    db.session.add_all(ParkingSlot(slot_number=f'F-{i:04d}') for i in range(2000))
+    db.session.commit()
+    slots = {s.slot_number: s.id for s in ParkingSlot.query.filter(ParkingSlot.slot_number.like('F-%'))}
+    reserve_window(slots['F-0000'], user_id, _at(1), _at(3))
+    reserve_window(slots['F-0002'], user_id, _at(2), _at(4))  # starts when the search window ends
+    reserve_slot(slots['F-0001'], user_id)
+    
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+    
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        free = get_free_slots_between(SlotFilter(prefix='F-'), _at(0), _at(2), limit=3)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert [s['slot_number'] for s in free] == ['F-0002', 'F-0003', 'F-0004']
+    assert len(statements) == 1
+    
+    statement, parameters = statements[0]
+    plan = ' '.join(row[-1] for row in db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}',
+                                                                               parameters))
+    assert 'ix_reservation_slot_window' in plan and 'SCAN reservation' not in plan
+
+
+def test_concurrent_window_bookings(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'windows.db'}")
+    app = create_app()
+    with app.app_context():
+        db.session.add_all([User(email='w@example.com', password_hash='x'), ParkingSlot(slot_number='W-01')])
+        db.session.commit()
+        user_id = User.query.filter_by(email='w@example.com').one().id
+        slot_id = ParkingSlot.query.filter_by(slot_number='W-01').one().id
+    
+    wins, errors = [], []
+    barrier = threading.Barrier(8)
+    
+    def worker(n):
+        with app.app_context():
+            barrier.wait()
+            for i in range(10):
+                try:
+                    # Overlapping 2-hour windows starting on every hour
+                    wins.append(reserve_window(slot_id, user_id, _at(n + i), _at(n + i + 2)).id)
+                except ReservationError:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+                db.session.remove()
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert not errors
+    with app.app_context():
+        windows = sorted((r.start_at, r.end_at) for r in Reservation.query.filter_by(slot_id=slot_id))
+    assert len(windows) == len(wins)
+    assert all(prev_end <= start for (_, prev_end), (start, _) in zip(windows, windows[1:]))